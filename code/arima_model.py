@@ -1,48 +1,393 @@
 # arima_model.py
+# pmdarima is imported where a model is fitted, not at import time: the fast tier, the
+# backtest's closed-form models and `trendpulse --help` never pay for it (see trendpulse.py).
 import argparse
+import copy
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from concurrent.futures.process import BrokenProcessPool
 import pandas as pd
 from pathlib import Path
 import numpy as np
-from sklearn.metrics import mean_squared_error
 
-import pmdarima as pm
+from fast_forecast import TIER_THRESHOLD, fast_tier
+from features import forecast_index, forecast_to_daily, infer_freq, steps, to_native
+from instrument import count, observe, start_run, timer, verbose
+from shared_panel import PanelSeries, attach, open_panel
+from model_store import DRIFT_THRESHOLD, MAX_AGE_DAYS, STORE_DIR, ModelStore, make_entry, series_hash
+from storage import FORECASTS_CSV, forecast_path
 
-def run_arima(input_csv: str, out_csv: str, periods: int = 30):
-    df = pd.read_csv(input_csv, parse_dates=['ds'])
-    df = df.sort_values('ds')
-    ts = df.set_index('ds')['y']
+HOLDOUT_DAYS = 14   # days; a weekly series holds out its last 2 points
+MIN_HOLDOUT_TRAIN_DAYS = 30
+MAX_ATTEMPTS = 2   # a task is retried once if its worker process dies
+FORECAST_COLUMNS = ['Technology', 'ds', 'y_pred', 'y_lower', 'y_upper', 'Freq']
 
-    if len(ts) > 30:
-        train_ts = ts.iloc[:-14]
-        holdout_ts = ts.iloc[-14:]
-    else:
-        train_ts = ts
-        holdout_ts = None
 
-    model = pm.auto_arima(train_ts, seasonal=False, error_action='ignore', suppress_warnings=True,
-                          stepwise=True, max_p=5, max_q=5)
-    print(model.summary())
+def split_holdout(ts, freq='D'):
+    if len(ts) > steps(MIN_HOLDOUT_TRAIN_DAYS, freq):
+        n = steps(HOLDOUT_DAYS, freq)
+        return ts.iloc[:-n], ts.iloc[-n:]
+    return ts, None
 
+
+def forecast_frame(model, train_ts, periods, holdout_ts=None, freq='D'):
+    # Scores the model on the holdout (the len(holdout) periods after train_ts ends), then
+    # feeds the holdout to a copy of it with update(), so the forecast starts after the
+    # last observed point rather than after the training split. The model itself stays
+    # fitted on train_ts: that is what the model store caches and updates next run.
+    # `periods` are steps of the series' frequency. Returns (forecast frame, holdout rmse or None).
+    rmse, last = None, train_ts.index.max()
+    if holdout_ts is not None and len(holdout_ts):
+        rmse = holdout_rmse(np.asarray(model.predict(n_periods=len(holdout_ts))), holdout_ts)
+        model = copy.deepcopy(model)
+        model.update(holdout_ts.to_numpy(dtype=float))
+        last = holdout_ts.index.max()
     fc, conf_int = model.predict(n_periods=periods, return_conf_int=True)
+    out_df = pd.DataFrame({'ds': forecast_index(last, periods, freq), 'y_pred': np.asarray(fc),
+                           'y_lower': conf_int[:, 0], 'y_upper': conf_int[:, 1]})
+    return out_df, rmse
+
+
+def holdout_rmse(fc, holdout_ts):
+    if holdout_ts is None:
+        return None
+    err = holdout_ts.to_numpy(dtype=float) - fc[:len(holdout_ts)]
+    return float(np.sqrt(np.mean(err ** 2)))
+
+
+def search_model(train_ts):
+    import pmdarima as pm
+    return pm.auto_arima(train_ts, seasonal=False, error_action='ignore', suppress_warnings=True,
+                         stepwise=True, max_p=5, max_q=5)
+
+
+def fit_forecast(ts, periods=30, holdout_ts=None, freq='D'):
+    # Fit auto_arima on ts (holding out the last HOLDOUT_DAYS when long enough, unless
+    # a separate holdout series is given) and return (model, forecast frame, holdout rmse or None).
+    train_ts, holdout_ts = split_holdout(ts, freq) if holdout_ts is None else (ts, holdout_ts)
+    model = search_model(train_ts)
+    out_df, rmse = forecast_frame(model, train_ts, periods, holdout_ts, freq)
+    return model, out_df, rmse
+
+
+def warm_fit_forecast(ts, periods=30, entry=None, model=None,
+                      max_age_days=MAX_AGE_DAYS, drift=DRIFT_THRESHOLD, holdout_ts=None, freq='D'):
+    # Like fit_forecast, but starts from a cached model when possible:
+    #   update  - history unchanged, only new points are fed to model.update()
+    #   refit   - history was revised (e.g. Google rescaled it): refit with the cached order
+    #   search  - no/stale cache or holdout error drifted: full auto_arima search
+    # A cached model of another frequency (e.g. fitted on the old daily upsampling) is
+    # never reused. Returns (model, forecast frame, holdout rmse, new cache entry).
+    train_ts, holdout_ts = split_holdout(ts, freq) if holdout_ts is None else (ts, holdout_ts)
+    mode = 'search'
+    if entry is not None and model is not None and entry.get('freq', 'D') == freq:
+        searched_at = pd.Timestamp(entry.get('searched_at', entry['fitted_at']))
+        fresh = pd.Timestamp.now() - searched_at <= pd.Timedelta(days=max_age_days)
+        last_ts = pd.Timestamp(entry['last_ts'])
+        if fresh and train_ts.index.max() >= last_ts:
+            if series_hash(train_ts[train_ts.index <= last_ts]) == entry['data_hash']:
+                new_obs = train_ts[train_ts.index > last_ts]
+                if len(new_obs):
+                    model.update(new_obs)
+                mode = 'update'
+            else:
+                import pmdarima as pm
+                model = pm.ARIMA(order=tuple(entry['order']), suppress_warnings=True).fit(train_ts)
+                mode = 'refit'
+
+    if mode != 'search':
+        out_df, rmse = forecast_frame(model, train_ts, periods, holdout_ts, freq)
+        baseline = entry.get('baseline_rmse')
+        if rmse is not None and baseline is not None and rmse > baseline * (1 + drift):
+            mode = 'search'
+    if mode == 'search':
+        model = search_model(train_ts)
+        out_df, rmse = forecast_frame(model, train_ts, periods, holdout_ts, freq)
+    return model, out_df, rmse, make_entry(model, train_ts, rmse, mode, previous=entry, freq=freq)
 
-    last_date = train_ts.index.max()
-    idx = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=periods, freq='D')
-    out_df = pd.DataFrame({'ds': idx, 'y_pred': fc, 'y_lower': conf_int[:, 0], 'y_upper': conf_int[:, 1]})
+
+def holdout_path(input_csv):
+    # preprocessing.preprocess writes forecast_input.csv + forecast_input_holdout.csv
+    input_csv = Path(input_csv)
+    return input_csv.with_name(input_csv.stem + '_holdout.csv')
+
+
+def run_arima(input_csv: str, out_csv: str, periods: int = 30, store_dir: str = None, holdout_csv: str = None,
+              daily: bool = False):
+    df = pd.read_csv(input_csv, parse_dates=['ds'])
+    df = df.sort_values('ds')
+    ts = df.set_index('ds')['y']
+    freq = infer_freq(ts.index)
+    n_periods = steps(periods, freq)
+
+    # When preprocessing already split off a holdout, the input is the training
+    # series and the holdout file is what the forecast is scored on.
+    holdout_csv = Path(holdout_csv) if holdout_csv else holdout_path(input_csv)
+    holdout_ts = None
+    if holdout_csv.exists():
+        holdout_ts = pd.read_csv(holdout_csv, parse_dates=['ds']).sort_values('ds').set_index('ds')['y']
+        print(f"Scoring on holdout file {holdout_csv} ({len(holdout_ts)} points)")
+
+    if store_dir:
+        store = ModelStore(store_dir)
+        key = Path(input_csv).stem
+        entry, cached = store.get(key)
+        model, out_df, rmse, entry = warm_fit_forecast(ts, n_periods, entry, cached, holdout_ts=holdout_ts, freq=freq)
+        store.save_model(key, model)
+        store.put_entry(key, entry)
+        store.save()
+        print(f"Model store: {entry['mode']} (order {tuple(entry['order'])})")
+    else:
+        model, out_df, rmse = fit_forecast(ts, n_periods, holdout_ts, freq)
+    if verbose():
+        print(model.summary())
 
     out_path = Path(out_csv)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_df.to_csv(out_path, index=False)
-    print(f"ARIMA forecast saved to {out_path}")
+    (forecast_to_daily(out_df, freq) if daily else out_df).to_csv(out_path, index=False)
+    print(f"ARIMA forecast ({n_periods} x {freq}) saved to {out_path}")
 
-    if holdout_ts is not None:
-        in_sample_fc = model.predict(n_periods=len(holdout_ts))
-        rmse = np.sqrt(mean_squared_error(holdout_ts.values, in_sample_fc))
+    if rmse is not None:
         print(f"ARIMA RMSE on holdout: {rmse:.3f}")
 
-if __name__ == '__main__':
+
+# ---------------------------------------------------------------------------
+# Batch mode: one fit per technology of the long-format panel, fanned out
+# over a process pool.
+# ---------------------------------------------------------------------------
+
+class FitTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise FitTimeout()
+
+
+@contextmanager
+def time_limit(seconds):
+    # Raises FitTimeout inside the block after `seconds`. Uses SIGALRM, so it is only
+    # enforced on platforms that have it (not Windows) and only in a process's main thread.
+    use_alarm = bool(seconds) and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def run_tasks(fn, tasks, workers=None, on_result=None, max_attempts=MAX_ATTEMPTS):
+    # fn(*args) for every {key: args} of `tasks` over a process pool. A crashed worker
+    # breaks the whole pool: it is restarted and what had not finished is resubmitted,
+    # giving up on a key after max_attempts. Returns {key: result}, without the keys whose
+    # worker kept dying; on_result(key, result) is called as each result arrives.
+    results = {}
+    attempts = dict.fromkeys(tasks, 0)
+    pending = list(tasks)
+    while pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for key in pending:
+                attempts[key] += 1
+                futures[pool.submit(fn, *tasks[key])] = key
+            for fut in as_completed(futures):
+                key = futures[fut]
+                try:
+                    res = fut.result()
+                except BrokenProcessPool:
+                    continue
+                results[key] = res
+                if on_result is not None:
+                    on_result(key, res)
+        pending = [k for k in tasks if k not in results and attempts[k] < max_attempts]
+    return results
+
+
+def _fit_task(tech, panel, periods, timeout, store_dir=None, entry=None):
+    # Runs inside a worker process. Every failure is caught and reported so one
+    # bad series never takes the rest of the batch down with it (see time_limit for
+    # the timeout). `panel` is a shared_panel handle: the series is read from the
+    # shared arrays and fitted at its native frequency; `periods` is days.
+    start = time.perf_counter()
+    result = {'Technology': tech, 'Status': 'ok', 'Mode': 'search', 'RMSE': None, 'Error': '',
+              'forecast': None, 'entry': None, 'Freq': None, 'Origin': None}
+    try:
+        with time_limit(timeout):
+            shared = attach(panel)
+            dates, values = shared.series_dates(tech)
+            freq = result['Freq'] = shared.freq(tech)
+            ts = to_native(pd.Series(values, index=pd.DatetimeIndex(dates)), freq)
+            result['Origin'] = ts.index[-1]
+            if store_dir:
+                store = ModelStore(store_dir, load_index=False)
+                cached = store.load_model(tech) if entry is not None else None
+                model, out_df, rmse, new_entry = warm_fit_forecast(ts, steps(periods, freq), entry, cached, freq=freq)
+                store.save_model(tech, model)
+                result['entry'] = new_entry
+                result['Mode'] = new_entry['mode']
+            else:
+                _, out_df, rmse = fit_forecast(ts, steps(periods, freq), freq=freq)
+        result['forecast'] = out_df
+        result['RMSE'] = rmse
+    except FitTimeout:
+        result['Status'] = 'timeout'
+        result['Error'] = f"fit exceeded {timeout}s"
+    except Exception as e:
+        result['Status'] = 'failed'
+        result['Error'] = str(e)
+    result['Fit_Seconds'] = time.perf_counter() - start
+    return result
+
+
+def load_panel_series(panel_csv, techs=None, shm=False):
+    # {tech: (dates, values)} over the compact panel arrays (shared_panel.py), memory-mapped
+    # from data/ or, with shm=True, copied into shared memory (series.panel.unlink() frees it)
+    panel, handle = open_panel(panel_csv)
+    if shm:
+        panel, handle = panel.share()
+    return PanelSeries(panel, handle, techs)
+
+
+def run_arima_batch(panel_csv: str, out_dir: str, periods: int = 30, workers: int = None,
+                    timeout: float = None, techs=None, store_dir: str = None, tiered: bool = False,
+                    tier_threshold: float = TIER_THRESHOLD, shm: bool = False, daily: bool = False):
+    with timer('load_panel'):
+        series = load_panel_series(panel_csv, techs, shm)
+    try:
+        return _run_batch(series, out_dir, periods, workers, timeout, store_dir, tiered, tier_threshold, daily,
+                          partial=techs is not None)
+    finally:
+        series.panel.unlink()   # no-op for the memory-mapped panel
+
+
+def _run_batch(series, out_dir, periods, workers, timeout, store_dir, tiered, tier_threshold, daily=False,
+               partial=False):
+    store = ModelStore(store_dir) if store_dir else None
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    results = {}
+    t0 = time.perf_counter()
+    pending = list(series)
+    if tiered:
+        # Cheap tier first (fast_forecast.py): series whose best closed-form model
+        # backtests well keep its forecast, only the rest are fitted with auto_arima.
+        with timer('fast_tier'):
+            selection, fast = fast_tier(series, periods, HOLDOUT_DAYS, threshold=tier_threshold)
+        per_series = (time.perf_counter() - t0) / max(len(series), 1)
+        for row in selection.itertuples(index=False):
+            if row.Technology in fast:
+                results[row.Technology] = {'Technology': row.Technology, 'Status': 'ok', 'Mode': f"fast:{row.Model}",
+                                           'RMSE': row.RMSE, 'Error': '', 'forecast': fast[row.Technology],
+                                           'entry': None, 'Fit_Seconds': per_series, 'Freq': row.Freq,
+                                           'Origin': row.Origin}
+        pending = [t for t in series if t not in results]
+        print(f"Fast tier kept {len(results)}/{len(series)} series in {time.perf_counter() - t0:.1f}s; "
+              f"{len(pending)} go on to ARIMA")
+    print(f"Fitting {len(pending)} series with {workers or 'all'} workers")
+
+    def on_result(tech, res):
+        observe('series_fit', res['Fit_Seconds'] or 0.0, item=tech, mode=res['Mode'], status=res['Status'])
+        if verbose() or res['Error']:
+            msg = f" ({res['Error']})" if res['Error'] else ''
+            print(f"{tech}: {res['Status']} ({res['Mode']}) in {res['Fit_Seconds']:.2f}s{msg}")
+
+    t_pool = time.perf_counter()
+    tasks = {tech: (tech, series.handle, periods, timeout, store_dir, store.index.get(tech) if store else None)
+             for tech in pending}
+    results.update(run_tasks(_fit_task, tasks, workers, on_result))
+    for tech in series:
+        if tech not in results:
+            results[tech] = {'Technology': tech, 'Status': 'crashed', 'Mode': None, 'RMSE': None,
+                             'Error': 'worker process died', 'forecast': None, 'entry': None,
+                             'Fit_Seconds': None, 'Freq': series.freq(tech), 'Origin': None}
+    elapsed = time.perf_counter() - t0
+    observe('fit_pool', time.perf_counter() - t_pool)
+    t_write = time.perf_counter()
+
+    if store:
+        for tech, res in results.items():
+            if res['entry'] is not None:
+                store.put_entry(tech, res['entry'])
+        store.save()
+
+    # forecasts stay at each series' native frequency unless daily rows were asked for
+    combined = []
+    for tech in series:
+        fc = results[tech]['forecast']
+        if fc is None:
+            continue
+        freq = results[tech]['Freq']
+        if daily:
+            fc, freq = forecast_to_daily(fc, freq), 'D'
+        fc.to_csv(forecast_path(tech, out_dir), index=False)
+        combined.append(fc.assign(Technology=tech, Freq=freq)[FORECAST_COLUMNS])
+    # arima_forecast_all.csv is what the later stages read: a full run replaces it (so a
+    # technology that failed this time has no forecast, not last run's), a --techs run
+    # replaces only the rows of the technologies it fitted
+    combined_path = out_dir / FORECASTS_CSV
+    if partial and combined_path.exists():
+        old = pd.read_csv(combined_path)
+        combined.insert(0, old[~old['Technology'].astype(str).isin(list(series))])
+    combined = pd.concat(combined, ignore_index=True) if combined else pd.DataFrame(columns=FORECAST_COLUMNS)
+    combined.to_csv(combined_path, index=False)
+    print(f"Combined forecast saved to {combined_path}")
+    observe('write_outputs', time.perf_counter() - t_write)
+
+    report = pd.DataFrame([{k: v for k, v in r.items() if k not in ('forecast', 'entry')}
+                           for r in results.values()])
+    # Origin: the last observed date the forecast starts after, the same for both tiers
+    report = report[['Technology', 'Freq', 'Origin', 'Status', 'Mode', 'Fit_Seconds', 'RMSE', 'Error']]
+    report.to_csv(out_dir / 'arima_fit_report.csv', index=False)
+
+    for (status, mode), n in report.groupby(['Status', 'Mode'], dropna=False).size().items():
+        count('series', n, status=status, mode=mode)
+    n_ok = int((report['Status'] == 'ok').sum())
+    rate = len(series) / elapsed if elapsed > 0 else float('nan')
+    print(f"Fitted {n_ok}/{len(series)} series in {elapsed:.1f}s ({rate:.2f} series/sec)")
+    return report
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser()
-    parser.add_argument('--input', required=True, help='Path to forecast_input.csv')
-    parser.add_argument('--out', required=True, help='Path to save arima forecast csv')
-    parser.add_argument('--periods', type=int, default=30)
-    args = parser.parse_args()
-    run_arima(args.input, args.out, periods=args.periods)
+    parser.add_argument('--input', required=True,
+                        help='Path to forecast_input.csv (or trends_processed.csv with --batch)')
+    parser.add_argument('--out', required=True,
+                        help='Path to save arima forecast csv (output directory with --batch)')
+    parser.add_argument('--periods', type=int, default=30,
+                        help="Days ahead to forecast, emitted at each series' native frequency")
+    parser.add_argument('--daily', action='store_true',
+                        help='Write the forecasts as daily rows (for consumers that need days)')
+    parser.add_argument('--batch', action='store_true',
+                        help='Fit every technology of a long-format Date,Technology,Interest panel')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--timeout', type=float, default=None, help='Per-series fit timeout in seconds')
+    parser.add_argument('--techs', nargs='*', help='Only fit these technologies (batch mode)')
+    parser.add_argument('--model-store', default=None,
+                        help=f'Reuse cached model orders/fits from this directory (e.g. {STORE_DIR})')
+    parser.add_argument('--tiered', action='store_true',
+                        help='Forecast with cheap closed-form models first; only poorly backtesting series get ARIMA')
+    parser.add_argument('--tier-threshold', type=float, default=TIER_THRESHOLD,
+                        help='Backtest RMSE / series level above which a series goes on to ARIMA')
+    parser.add_argument('--shm', action='store_true',
+                        help='Share the panel with workers through shared memory instead of memory-mapped files')
+    parser.add_argument('--holdout', default=None,
+                        help='Holdout CSV to score on (default: <input>_holdout.csv when it exists)')
+    args = parser.parse_args(argv)
+    start_run('arima')
+    if args.batch:
+        run_arima_batch(args.input, args.out, periods=args.periods, workers=args.workers,
+                        timeout=args.timeout, techs=args.techs, store_dir=args.model_store,
+                        tiered=args.tiered, tier_threshold=args.tier_threshold, shm=args.shm, daily=args.daily)
+    else:
+        run_arima(args.input, args.out, periods=args.periods, store_dir=args.model_store,
+                  holdout_csv=args.holdout, daily=args.daily)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+# backtest.py
+# Rolling-origin backtest of the forecasters we choose between per keyword:
+#   arima          - auto_arima searched once at the first origin, then model.update()
+#                    with the points between consecutive origins (no re-search)
+#   linear         - the OLS fallback of fill_missing_forecasts.py (last REGRESSION_WINDOW points)
+#   naive, seasonal_naive, holt, trend
+#                  - the cheap tier of fast_forecast.py, the same functions the tier runs,
+#                    each origin's training window as one row of its series matrix
+# Series are backtested at their native frequency (weekly for Trends); horizon, step and
+# min_train are given in days and converted to periods (features.steps).
+# Every series is cut at `origins` points spaced `step` days apart ending `horizon` days
+# before its last date; each model forecasts `horizon` days from every cut. RMSE, MAPE
+# and 95% interval coverage per (Technology, Model) go to outputs/backtest_metrics, the
+# winner per keyword to outputs/backtest_best_model. Series run in parallel processes
+# (arima_model.run_tasks, with arima_model.time_limit as the ARIMA timeout).
+#
+#   python code/backtest.py --origins 8 --horizon 14 --workers 8
+#   python code/backtest.py --techs "Blockchain" "5G" --models naive linear
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from arima_model import HOLDOUT_DAYS, FitTimeout, load_panel_series, run_tasks, search_model, time_limit
+import fast_forecast
+from fast_forecast import SEASON_DAYS
+from features import REGRESSION_WINDOW, SEASON, steps, to_native
+from instrument import count, observe, show_table, start_run, timer, verbose
+from shared_panel import attach
+from storage import OUT_DIR, PANEL_CSV, save_table
+
+MODELS = ['arima', 'linear', 'naive', 'seasonal_naive', 'holt', 'trend']
+N_ORIGINS = 8
+MIN_TRAIN_DAYS = 180
+Z95 = 1.96
+
+
+def origins(n, horizon=HOLDOUT_DAYS, n_origins=N_ORIGINS, step=None, min_train=MIN_TRAIN_DAYS):
+    # Training lengths of the cuts, oldest first; the last cut leaves exactly `horizon` points
+    # (all arguments in points)
+    step = step or horizon
+    cuts = [n - horizon - i * step for i in range(n_origins)]
+    return np.array(sorted(c for c in cuts if c >= min_train), dtype=int)
+
+
+# Each forecaster returns (point, lower, upper) arrays of shape (len(cuts), horizon);
+# rows it cannot forecast are NaN.
+
+def linear_forecast(y, cuts, horizon, window=REGRESSION_WINDOW):
+    # Same line as features.summarize_series' Linear_Forecast (h=1), extended to h steps
+    h = np.arange(1, horizon + 1)
+    m = min(window, int(cuts.min()))
+    w = y[cuts[:, None] - m + np.arange(m)]
+    xc = np.arange(m) - (m - 1) / 2.0
+    sxx = m * (m ** 2 - 1) / 12.0
+    slope = (w @ xc) / sxx
+    mean = w.mean(axis=1)
+    point = mean[:, None] + slope[:, None] * (m + h - (m - 1) / 2.0)
+    resid = w - (mean[:, None] + slope[:, None] * xc)
+    sigma = np.sqrt((resid ** 2).sum(axis=1) / max(m - 2, 1))[:, None]
+    return point, point - Z95 * sigma, point + Z95 * sigma
+
+
+def arima_forecast(y, cuts, horizon):
+    # The order search runs once; later origins only feed the new points to update(),
+    # which re-estimates the coefficients starting from the previous fit.
+    point = np.full((len(cuts), horizon), np.nan)
+    lower, upper = point.copy(), point.copy()
+    model = search_model(y[:cuts[0]])
+    for i, cut in enumerate(cuts):
+        if i:
+            model.update(y[cuts[i - 1]:cut])
+        fc, conf_int = model.predict(n_periods=horizon, return_conf_int=True)
+        point[i], lower[i], upper[i] = np.asarray(fc), conf_int[:, 0], conf_int[:, 1]
+    return point, lower, upper
+
+
+def fast_tier_forecast(y, cuts, name, horizon, season=SEASON_DAYS):
+    # A fast_forecast.py model run on one row per origin: the training window of each cut,
+    # right-aligned over the tier's lookback of two seasons
+    width = min(int(cuts.max()), 2 * season)
+    Y = np.full((len(cuts), width), np.nan)
+    for i, cut in enumerate(cuts):
+        window = y[max(0, cut - width):cut]
+        Y[i, width - len(window):] = window
+    return fast_forecast.run_model(name, Y, horizon, season)
+
+
+FORECASTERS = {'arima': arima_forecast, 'linear': linear_forecast}
+
+
+def run_model(name, y, cuts, horizon, season=SEASON_DAYS):
+    # the season is in points of the series' frequency
+    if name in fast_forecast.FORECASTERS:
+        return fast_tier_forecast(y, cuts, name, horizon, season)
+    return FORECASTERS[name](y, cuts, horizon)
+
+
+NO_SCORE = {'Origins': 0, 'RMSE': np.nan, 'MAPE': np.nan, 'Coverage': np.nan}
+
+
+def score(actual, point, lower, upper):
+    ok = ~np.isnan(point).any(axis=1)
+    a, p, lo, hi = actual[ok], point[ok], lower[ok], upper[ok]
+    if not len(a):
+        return dict(NO_SCORE)
+    nz = a != 0   # Trends series hit 0; MAPE is taken over the non-zero actuals
+    return {
+        'Origins': int(ok.sum()),
+        'RMSE': float(np.sqrt(np.mean((a - p) ** 2))),
+        'MAPE': float(np.mean(np.abs((a[nz] - p[nz]) / a[nz])) * 100) if nz.any() else np.nan,
+        'Coverage': float(np.mean((a >= lo) & (a <= hi))),
+    }
+
+
+def _backtest_task(tech, panel, horizon, n_origins, step, min_train, models, timeout):
+    # Runs inside a worker process; one row per model. The timeout only applies to ARIMA
+    # (the other models are closed-form).
+    # horizon, step and min_train are days, converted to periods of the series' frequency.
+    start = time.perf_counter()
+    shared = attach(panel)
+    dates, values = shared.series_dates(tech)
+    freq = shared.freq(tech)
+    y = to_native(pd.Series(values, index=pd.DatetimeIndex(dates)), freq).to_numpy(dtype=float)
+    horizon = steps(horizon, freq)
+    cuts = origins(len(y), horizon, n_origins, steps(step, freq) if step else None, steps(min_train, freq))
+    rows = []
+    if not len(cuts):
+        return {'Technology': tech, 'rows': rows, 'Seconds': time.perf_counter() - start,
+                'Error': f"fewer than {steps(min_train, freq) + horizon} points ({freq})"}
+    actual = y[cuts[:, None] + np.arange(horizon)]
+    for name in models:
+        row = {'Technology': tech, 'Model': name, 'Error': ''}
+        try:
+            with time_limit(timeout if name == 'arima' else None):
+                forecast = run_model(name, y, cuts, horizon, SEASON[freq])
+            row.update(score(actual, *forecast))
+        except FitTimeout:
+            row.update(NO_SCORE, Error=f"fit exceeded {timeout}s")
+        except Exception as e:
+            row.update(NO_SCORE, Error=str(e))
+        rows.append(row)
+    return {'Technology': tech, 'rows': rows, 'Seconds': time.perf_counter() - start, 'Error': ''}
+
+
+def best_models(metrics):
+    # Lowest RMSE per keyword, with its skill against the naive forecast
+    ok = metrics.dropna(subset=['RMSE'])
+    if ok.empty:
+        return pd.DataFrame(columns=['Technology', 'Best_Model', 'RMSE', 'MAPE', 'Coverage', 'Skill_vs_Naive'])
+    best = ok.loc[ok.groupby('Technology')['RMSE'].idxmin()]
+    naive = ok[ok['Model'] == 'naive'].set_index('Technology')['RMSE']
+    best = best.rename(columns={'Model': 'Best_Model'})[['Technology', 'Best_Model', 'RMSE', 'MAPE', 'Coverage']]
+    best['Skill_vs_Naive'] = 1 - best['RMSE'] / best['Technology'].map(naive)
+    return best.reset_index(drop=True)
+
+
+def run_backtest(panel_csv=PANEL_CSV, out_dir=OUT_DIR, horizon=HOLDOUT_DAYS, n_origins=N_ORIGINS, step=None,
+                 min_train=MIN_TRAIN_DAYS, workers=None, timeout=None, techs=None, models=None):
+    models = models or MODELS
+    with timer('load_panel'):
+        series = load_panel_series(panel_csv, techs)
+    print(f"Backtesting {len(series)} series x {len(models)} models, {n_origins} origins of "
+          f"{horizon} days, with {workers or 'all'} workers")
+
+    def on_result(tech, res):
+        observe('series_backtest', res['Seconds'], item=tech)
+        if verbose() or res['Error']:
+            msg = f" ({res['Error']})" if res['Error'] else ''
+            print(f"{tech}: {len(res['rows'])} models in {res['Seconds']:.2f}s{msg}")
+
+    t0 = time.perf_counter()
+    tasks = {tech: (tech, series.handle, horizon, n_origins, step, min_train, models, timeout) for tech in series}
+    results = run_tasks(_backtest_task, tasks, workers, on_result)
+    elapsed = time.perf_counter() - t0
+
+    rows = [row for tech in series if tech in results for row in results[tech]['rows']]
+    metrics = pd.DataFrame(rows, columns=['Technology', 'Model', 'Origins', 'RMSE', 'MAPE', 'Coverage', 'Error'])
+    best = best_models(metrics)
+    for (model, failed), n in metrics.groupby(['Model', metrics['Error'] != '']).size().items():
+        count('model_scores', n, model=model, status='failed' if failed else 'ok')
+    save_table(metrics, 'backtest_metrics', out_dir, csv=True)
+    save_table(best, 'backtest_best_model', out_dir, csv=True)
+
+    summary = metrics.groupby('Model').agg(Series=('RMSE', 'count'), Mean_RMSE=('RMSE', 'mean'),
+                                           Median_MAPE=('MAPE', 'median'), Mean_Coverage=('Coverage', 'mean'))
+    summary['Wins'] = best['Best_Model'].value_counts().reindex(summary.index).fillna(0).astype(int)
+    show_table(summary.round(3).reset_index(), 'Backtest summary', head=len(summary))
+    crashed = [t for t in series if t not in results]
+    if crashed:
+        print(f"Worker process died on: {', '.join(crashed)}")
+    rate = len(series) / elapsed if elapsed > 0 else float('nan')
+    print(f"Backtested {len(results)}/{len(series)} series in {elapsed:.1f}s ({rate:.2f} series/sec)")
+    return metrics, best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default=str(PANEL_CSV), help='Long-format Date,Technology,Interest panel')
+    parser.add_argument('--out', default=str(OUT_DIR), help='Directory for the backtest tables')
+    parser.add_argument('--horizon', type=int, default=HOLDOUT_DAYS, help='Days forecast from every origin')
+    parser.add_argument('--origins', type=int, default=N_ORIGINS, help='Forecast origins per series')
+    parser.add_argument('--step', type=int, default=None, help='Days between origins (default: horizon)')
+    parser.add_argument('--min-train', type=int, default=MIN_TRAIN_DAYS, help='Shortest training window')
+    parser.add_argument('--models', nargs='*', choices=MODELS, default=None)
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--timeout', type=float, default=None, help='Per-series ARIMA timeout in seconds')
+    parser.add_argument('--techs', nargs='*', help='Only backtest these technologies')
+    args = parser.parse_args(argv)
+    start_run('backtest')
+    run_backtest(args.input, args.out, args.horizon, args.origins, args.step, args.min_train,
+                 args.workers, args.timeout, args.techs, args.models)
+
+
+if __name__ == '__main__':
+    main()
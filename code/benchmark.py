@@ -0,0 +1,218 @@
+# benchmark.py
+# Benchmarks the pipeline stages on synthetic Trends-like panels.
+#
+# A Date,Technology,Interest panel of the requested scale is generated in a scratch
+# project directory and every stage script is run there as its own process, so the
+# numbers include start-up and I/O exactly as in production. For each stage the wall
+# time, peak RSS and series/sec are appended to outputs/benchmarks/history.json.
+#
+#   python code/benchmark.py --series 500 --years 5 --freq W
+#   python code/benchmark.py --series 50000 --arima-sample 20 --compare
+#   python code/benchmark.py --compare-only          # last two runs of each config
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+CODE_DIR = Path(__file__).resolve().parent
+HISTORY = Path('outputs/benchmarks/history.json')
+SCALES = {'small': 5, 'medium': 500, 'large': 50_000}
+REGRESSION_THRESHOLD = 0.20   # flag stages that got >20% slower or bigger
+
+
+def synthetic_panel(n_series, years=5, freq='W', seed=0):
+    # Trends-like series: trend + yearly seasonality + noise + occasional spikes,
+    # each scaled to a 0-100 integer range like Google normalises them.
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=pd.Timestamp('2025-11-09'), periods=int(years * (52 if freq == 'W' else 365)),
+                          freq='W-SUN' if freq == 'W' else 'D')
+    t = np.arange(len(dates), dtype=float)[None, :]
+    period = 52.0 if freq == 'W' else 365.0
+    level = rng.uniform(5, 60, (n_series, 1))
+    slope = rng.normal(0, 0.3, (n_series, 1)) * (52.0 / period)
+    season = rng.uniform(0, 10, (n_series, 1)) * np.sin(2 * np.pi * t / period + rng.uniform(0, 6.3, (n_series, 1)))
+    noise = rng.normal(0, 1, (n_series, len(dates))) * rng.uniform(1, 8, (n_series, 1))
+    spikes = (rng.random((n_series, len(dates))) < 0.01) * rng.uniform(10, 40, (n_series, len(dates)))
+    y = np.clip(level + slope * t + season + noise + spikes, 0, None)
+    y = np.round(100 * y / np.maximum(y.max(axis=1, keepdims=True), 1e-9))
+    names = [f"Tech {i:05d}" for i in range(n_series)]
+    return pd.DataFrame({
+        'Date': np.tile(dates.strftime('%Y-%m-%d').values, n_series),
+        'Technology': np.repeat(names, len(dates)),
+        'Interest': y.ravel().astype(int),
+    })
+
+
+def write_synthetic_forecasts(panel, out_dir, periods=30):
+    # Stand-in outputs/arima_forecast_all.csv so table assembly runs at full scale
+    out_dir.mkdir(parents=True, exist_ok=True)
+    last = panel.groupby('Technology', sort=False).agg(Date=('Date', 'last'), Interest=('Interest', 'last'))
+    start = pd.to_datetime(last['Date']).to_numpy() + np.timedelta64(1, 'D')
+    y = np.repeat(last['Interest'].to_numpy(dtype=float) + 1.0, periods)
+    pd.DataFrame({
+        'Technology': np.repeat(last.index.to_numpy(), periods),
+        'ds': (np.repeat(start, periods) + np.tile(np.arange(periods), len(last)).astype('timedelta64[D]')),
+        'y_pred': y, 'y_lower': y - 5, 'y_upper': y + 5, 'Freq': 'D',
+    }).to_csv(out_dir / 'arima_forecast_all.csv', index=False)
+
+
+def run_timed(cmd, cwd):
+    # (returncode, wall seconds, peak RSS MB or None, stderr tail) for one child process
+    t0 = time.perf_counter()
+    with tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=err)
+        if hasattr(os, 'wait4'):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+        else:
+            proc.wait()
+            rss = None
+        wall = time.perf_counter() - t0
+        err.seek(0)
+        tail = err.read()[-1500:].decode('utf-8', 'replace')
+    return proc.returncode, wall, rss, tail
+
+
+def stage_commands(sample):
+    # (stage, script + args, series processed); sample = technologies ARIMA is fitted on
+    py = sys.executable
+    return [
+        ('preprocess', [py, str(CODE_DIR / 'preprocessing.py'), '--panel', '--input', 'data/trends_processed.csv',
+                        '--out', 'data/trends_features.csv'], None),
+        ('run_arima', [py, str(CODE_DIR / 'arima_model.py'), '--batch', '--input', 'data/trends_processed.csv',
+                       '--out', 'outputs', '--techs'] + sample, len(sample)),
+        ('trend_strength', [py, str(CODE_DIR / 'generate_trend_strength.py')], None),
+        ('yearly_ranking', [py, str(CODE_DIR / 'generate_yearly_ranking.py')], None),
+        ('forecast_table', [py, str(CODE_DIR / 'make_final_forecast_table_all_fix.py')], None),
+        ('dashboard_merge', [py, str(CODE_DIR / 'generate_dashboard_master.py')], None),
+    ]
+
+
+def run_benchmark(n_series, years=5, freq='W', arima_sample=10, stages=None, workdir=None, label=None):
+    config = {'series': n_series, 'years': years, 'freq': freq, 'arima_sample': arima_sample}
+    print(f"Benchmark config: {config}")
+    with tempfile.TemporaryDirectory(prefix='trendpulse-bench-', dir=workdir) as tmp:
+        root = Path(tmp)
+        t0 = time.perf_counter()
+        panel = synthetic_panel(n_series, years, freq)
+        (root / 'data').mkdir()
+        panel.to_csv(root / 'data' / 'trends_processed.csv', index=False)
+        write_synthetic_forecasts(panel, root / 'outputs')
+        sample = list(panel['Technology'].drop_duplicates().iloc[:arima_sample])
+        del panel
+        # the dashboard merge needs the sentiment table; not timed
+        subprocess.run([sys.executable, str(CODE_DIR / 'generate_sentiment.py')], cwd=root,
+                       stdout=subprocess.DEVNULL, check=True)
+        print(f"Generated {n_series} series in {time.perf_counter() - t0:.1f}s")
+
+        results = {}
+        for name, cmd, processed in stage_commands(sample):
+            if stages and name not in stages:
+                continue
+            code, wall, rss, tail = run_timed(cmd, root)
+            n = processed if processed is not None else n_series
+            results[name] = {'ok': code == 0, 'wall_s': round(wall, 3),
+                             'peak_rss_mb': round(rss, 1) if rss is not None else None,
+                             'series_per_s': round(n / wall, 2) if wall > 0 else None}
+            rss_txt = f"{rss:.0f} MB" if rss is not None else 'n/a'
+            print(f"{name:<16}{'ok' if code == 0 else 'FAILED':<8}{wall:>9.2f}s {rss_txt:>9} "
+                  f"{results[name]['series_per_s']:>10} series/s")
+            if code != 0:
+                print(tail)
+
+    return {'timestamp': pd.Timestamp.now().isoformat(timespec='seconds'), 'revision': git_revision(),
+            'label': label, 'config': config, 'results': results}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=CODE_DIR, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def load_history(path=HISTORY):
+    path = Path(path)
+    return json.loads(path.read_text()) if path.exists() else []
+
+
+def append_history(record, path=HISTORY):
+    path = Path(path)
+    history = load_history(path)
+    history.append(record)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(history, indent=1))
+
+
+def compare(history, threshold=REGRESSION_THRESHOLD):
+    # Compare the latest run of every config with the run before it; returns the regressions
+    latest = {}
+    previous = {}
+    for rec in history:
+        key = json.dumps(rec['config'], sort_keys=True)
+        if key in latest:
+            previous[key] = latest[key]
+        latest[key] = rec
+    regressions = []
+    if not previous:
+        print("No config has two runs to compare yet.")
+    for key, cur in latest.items():
+        if key not in previous:
+            continue
+        prev = previous[key]
+        print(f"\n{cur['config']}: {prev.get('revision')} ({prev['timestamp']}) -> "
+              f"{cur.get('revision')} ({cur['timestamp']})")
+        for stage, now in cur['results'].items():
+            before = prev['results'].get(stage)
+            if not before or not before['ok'] or not now['ok']:
+                continue
+            for metric in ('wall_s', 'peak_rss_mb'):
+                if before.get(metric) and now.get(metric) is not None:
+                    change = now[metric] / before[metric] - 1
+                    flag = change > threshold
+                    print(f"  {stage:<16}{metric:<12}{before[metric]:>10}{now[metric]:>10}  {change:+.0%}"
+                          f"{'  REGRESSION' if flag else ''}")
+                    if flag:
+                        regressions.append((cur['config'], stage, metric, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--series', default='small',
+                        help=f"Number of series or a preset: {', '.join(f'{k}={v}' for k, v in SCALES.items())}")
+    parser.add_argument('--years', type=float, default=5)
+    parser.add_argument('--freq', choices=['W', 'D'], default='W')
+    parser.add_argument('--arima-sample', type=int, default=10, help='Series fitted in the run_arima stage')
+    parser.add_argument('--stages', nargs='*', help='Only run these stages')
+    parser.add_argument('--workdir', default=None, help='Where to create the scratch project')
+    parser.add_argument('--label', default=None, help='Free-text note stored with the run')
+    parser.add_argument('--history', default=str(HISTORY))
+    parser.add_argument('--compare', action='store_true', help='Compare with the previous run of this config')
+    parser.add_argument('--compare-only', action='store_true', help='Only compare the stored history')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if not args.compare_only:
+        n = SCALES[args.series] if args.series in SCALES else int(args.series)
+        record = run_benchmark(n, args.years, args.freq, args.arima_sample, args.stages, args.workdir, args.label)
+        append_history(record, args.history)
+        print(f"Recorded run in {args.history}")
+    if args.compare or args.compare_only:
+        found = compare(load_history(args.history), args.threshold)
+        return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# breakouts.py
+# Online breakout detection over new Trends points, for "what just took off" alerts.
+# Every technology carries a fixed-size state (O(1), no history is kept or re-read):
+#   level, trend     damped Holt one-step-ahead forecast (HOLT_PHI from fast_forecast.py)
+#   scale            exponentially weighted mean |residual|, the robust residual scale
+#   cusum_up/down    two-sided CUSUM of the standardized residuals
+#   n, last_day      points seen, day number of the last one
+# Each new point y: residual r = y - forecast, z = r / (1.25 * scale) (E|r| = 0.8 sigma for
+# normal residuals). The level is updated with r clipped at CLIP_Z scales, so one spike does
+# not drag the baseline. Alerts (after WARMUP points):
+#   breakout / breakdown   CUSUM above CUSUM_H (sustained shift); that side is then reset
+#   spike_up / spike_down  |z| above SPIKE_Z on a single point
+# Points are processed in order one at a time per series, vectorised across series: step j
+# updates every technology that has a j-th new point. State lives in
+# outputs/breakout_state/; new alerts are appended to breakout_alerts (CSV for Power BI, next
+# to dashboard_master.csv).
+#
+#   python code/breakouts.py              # process points newer than the saved state
+#   python code/breakouts.py --reset      # start over from the full history
+
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fast_forecast import HOLT_PHI
+from instrument import count, show_table, start_run, timer
+from ranking_index import panel_fingerprint
+from shared_panel import open_panel
+from storage import OUT_DIR, PANEL_CSV, load_table, save_table, table_path
+
+STATE_DIR = Path('outputs/breakout_state')
+ALPHA = 0.3           # Holt level smoothing
+BETA = 0.05           # Holt trend smoothing
+SCALE_DECAY = 0.1     # weight of the newest |residual| in the scale
+MIN_SCALE = 1.0       # Trends points are integers: never standardize by less than one point
+CLIP_Z = 3.0
+CUSUM_K = 0.5         # allowance, in standardized units
+CUSUM_H = 5.0         # decision interval
+SPIKE_Z = 4.0
+WARMUP = 8
+STATE_ARRAYS = ['level', 'trend', 'scale', 'cusum_up', 'cusum_down', 'n', 'last_day']
+ALERT_COLUMNS = ['Date', 'Technology', 'Alert', 'Interest', 'Expected', 'Z', 'CUSUM']
+
+
+def empty_state(techs):
+    n = len(techs)
+    return {'techs': list(techs), 'level': np.zeros(n), 'trend': np.zeros(n), 'scale': np.full(n, MIN_SCALE),
+            'cusum_up': np.zeros(n), 'cusum_down': np.zeros(n), 'n': np.zeros(n, dtype=np.int64),
+            'last_day': np.full(n, np.iinfo(np.int32).min, dtype=np.int64), 'source': None}
+
+
+def add_techs(state, techs):
+    # New technologies start with an empty state (and so get their whole history)
+    new = [t for t in techs if t not in set(state['techs'])]
+    if new:
+        fresh = empty_state(new)
+        for name in STATE_ARRAYS:
+            state[name] = np.concatenate([state[name], fresh[name]])
+        state['techs'] = state['techs'] + new
+    return len(new)
+
+
+def step(state, rows, y, day, names):
+    # One point for each of `rows`: update their state in place, return the alert rows
+    level, trend, scale = state['level'][rows], state['trend'][rows], state['scale'][rows]
+    n = state['n'][rows]
+    first = n == 0
+    expected = np.where(first, y, level + HOLT_PHI * trend)
+    r = y - expected
+    z = r / (1.25 * scale)
+    warm = n >= WARMUP
+
+    up = np.maximum(0.0, state['cusum_up'][rows] + z - CUSUM_K)
+    down = np.maximum(0.0, state['cusum_down'][rows] - z - CUSUM_K)
+    alert = np.full(len(rows), '', dtype=object)
+    alert[warm & (z > SPIKE_Z)] = 'spike_up'
+    alert[warm & (z < -SPIKE_Z)] = 'spike_down'
+    alert[warm & (up > CUSUM_H)] = 'breakout'
+    alert[warm & (down > CUSUM_H)] = 'breakdown'
+    cusum = np.where(alert == 'breakdown', -down, up)
+    up[up > CUSUM_H] = 0.0
+    down[down > CUSUM_H] = 0.0
+
+    # robust update: the level follows at most CLIP_Z scales of a surprise
+    r_clip = np.clip(r, -CLIP_Z * 1.25 * scale, CLIP_Z * 1.25 * scale)
+    new_level = np.where(first, y, expected + ALPHA * r_clip)
+    state['trend'][rows] = np.where(first, 0.0, BETA * (new_level - level) + (1 - BETA) * HOLT_PHI * trend)
+    state['level'][rows] = new_level
+    state['scale'][rows] = np.where(first, scale, np.maximum(MIN_SCALE, (1 - SCALE_DECAY) * scale
+                                                             + SCALE_DECAY * np.abs(r)))
+    state['cusum_up'][rows] = up
+    state['cusum_down'][rows] = down
+    state['n'][rows] = n + 1
+    state['last_day'][rows] = day
+
+    hit = alert != ''
+    return pd.DataFrame({'Date': day[hit].astype('datetime64[D]'), 'Technology': names[rows[hit]],
+                         'Alert': alert[hit], 'Interest': y[hit], 'Expected': expected[hit].round(2),
+                         'Z': z[hit].round(2), 'CUSUM': cusum[hit].round(2)})
+
+
+def new_points(panel, state):
+    # Per technology, the points after its last_day: (rows, days matrix, values matrix),
+    # left-aligned with NaN/-1 padding so column j holds every series' j-th new point
+    index = {t: i for i, t in enumerate(state['techs'])}
+    spans = []
+    for tech in panel.techs:
+        days, values = panel.series(tech)
+        start = np.searchsorted(days, state['last_day'][index[tech]], side='right')
+        if start < len(days):
+            spans.append((index[tech], days[start:], values[start:]))
+    width = max((len(d) for _, d, _ in spans), default=0)
+    D = np.full((len(spans), width), -1, dtype=np.int64)
+    Y = np.full((len(spans), width), np.nan)
+    for k, (_, d, v) in enumerate(spans):
+        D[k, :len(d)] = d
+        Y[k, :len(v)] = v
+    return np.array([i for i, _, _ in spans], dtype=np.int64), D, Y
+
+
+def detect(state, rows, D, Y):
+    names = np.asarray(state['techs'], dtype=object)
+    alerts = []
+    for j in range(D.shape[1]):
+        has = D[:, j] >= 0
+        if has.any():
+            alerts.append(step(state, rows[has], Y[has, j], D[has, j], names))
+    return pd.concat(alerts, ignore_index=True) if alerts else pd.DataFrame(columns=ALERT_COLUMNS)
+
+
+def save_state(state, root=STATE_DIR):
+    # written to a sibling directory and swapped in, like correlation.save_state
+    root = Path(root)
+    tmp = root.with_name(f'{root.name}.tmp-{os.getpid()}')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    np.savez(tmp / 'state.npz', **{name: state[name] for name in STATE_ARRAYS})
+    (tmp / 'meta.json').write_text(json.dumps({'techs': state['techs'], 'source': state['source']}))
+    old = root.with_name(f'{root.name}.old-{os.getpid()}')
+    if root.exists():
+        os.replace(root, old)
+    os.replace(tmp, root)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def load_state(root=STATE_DIR):
+    root = Path(root)
+    if not (root / 'meta.json').exists():
+        return None
+    state = json.loads((root / 'meta.json').read_text())
+    with np.load(root / 'state.npz') as arrays:
+        state.update({name: arrays[name] for name in STATE_ARRAYS})
+    return state
+
+
+def run_breakouts(panel_csv=PANEL_CSV, out_dir=OUT_DIR, root=STATE_DIR, reset=False):
+    panel, _ = open_panel(panel_csv)
+    state = None if reset else load_state(root)
+    history = table_path('breakout_alerts', out_dir)
+    if state is not None:
+        now = panel_fingerprint(panel_csv, state['source']['length'])
+        if now['size'] < state['source']['size'] or now['head'] != state['source']['head']:
+            print("Panel was rewritten, not appended to: starting the detector over")
+            state = None
+    if state is None:
+        state = empty_state(panel.techs)
+        previous = pd.DataFrame(columns=ALERT_COLUMNS)
+    else:
+        previous = load_table('breakout_alerts', out_dir=out_dir) if history.exists() else \
+            pd.DataFrame(columns=ALERT_COLUMNS)
+        added = add_techs(state, panel.techs)
+        if added:
+            print(f"{added} new technologies start with an empty state")
+
+    t0 = time.perf_counter()
+    with timer('read_new'):
+        rows, D, Y = new_points(panel, state)
+    with timer('detect'):
+        alerts = detect(state, rows, D, Y)
+    n_points = int((D >= 0).sum())
+    state['source'] = panel_fingerprint(panel_csv)
+    save_state(state, root)
+    for kind, n in alerts['Alert'].value_counts().items():
+        count('alerts', int(n), kind=kind)
+    count('points', n_points)
+
+    frames = [f for f in (previous, alerts) if len(f)]
+    table = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=ALERT_COLUMNS)
+    out = save_table(table[ALERT_COLUMNS], 'breakout_alerts', out_dir)
+    elapsed = time.perf_counter() - t0
+    rate = n_points / elapsed if elapsed > 0 else float('nan')
+    print(f"Processed {n_points} new points of {len(rows)} series in {elapsed:.2f}s ({rate:.0f} points/sec): "
+          f"{len(alerts)} new alerts -> {out}")
+    return alerts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default=str(PANEL_CSV))
+    parser.add_argument('--out', default=str(OUT_DIR))
+    parser.add_argument('--state', default=str(STATE_DIR))
+    parser.add_argument('--reset', action='store_true', help='Forget the saved state and start from the full history')
+    args = parser.parse_args(argv)
+    start_run('breakouts')
+    alerts = run_breakouts(args.input, args.out, args.state, args.reset)
+    show_table(alerts.sort_values('Date', ascending=False), 'New alerts', head=10)
+
+
+if __name__ == '__main__':
+    main()
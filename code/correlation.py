@@ -0,0 +1,276 @@
+# correlation.py
+# Lagged co-movement between technologies at catalogue scale, kept as a top-K neighbour index
+# instead of the dense T x T matrix the EDA heatmap builds.
+#  - series are aligned on the panel's date grid (shared_panel arrays), forward-filled and
+#    differenced (--levels correlates the levels instead, like notebooks/03_eda.py)
+#  - correlations are computed from raw sums: n, sum x, sum x^2 per series and, per lag L,
+#    S_L[a, b] = sum_t x_a[t] * x_b[t + L], so new periods only add terms. The full pass
+#    picks candidates on the standardized matrix BLOCK rows at a time against all columns
+#    (float32 BLAS), so memory is BLOCK x T, never T x T.
+#  - each technology keeps its N_CANDIDATES best neighbours (max correlation over the lags)
+#    with their lag sums. New weeks update those sums exactly and re-rank the top K among
+#    them; a full pass reselects the candidates after REBUILD_EVERY new periods, when
+#    technologies come or go, or when the panel was rewritten rather than appended to.
+#  - Lag > 0 means the neighbour moves Lag periods after the technology.
+# State: outputs/correlation_index/; table: tech_neighbours (Technology, Rank, Neighbour,
+# Correlation, Lag).
+#
+#   python code/correlation.py                      # update, or build on the first run
+#   python code/correlation.py --rebuild -k 20 --max-lag 8
+#   python code/correlation.py --tech "Generative AI"
+
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from instrument import count, show_table, start_run, timer
+from ranking_index import panel_fingerprint
+from shared_panel import open_panel
+from storage import OUT_DIR, PANEL_CSV, load_table, save_table
+
+INDEX_DIR = Path('outputs/correlation_index')
+TOP_K = 10
+N_CANDIDATES = 30
+MAX_LAG = 4
+BLOCK = 512
+REBUILD_EVERY = 13   # periods (a quarter of weekly data) between full passes
+STATE_ARRAYS = ['n', 's1', 's2', 'last_level', 'tail', 'cand', 'S']
+
+
+def _ffill(M):
+    # forward-fill NaNs along each row
+    idx = np.where(np.isnan(M), 0, np.arange(M.shape[1]))
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return M[np.arange(M.shape[0])[:, None], idx]
+
+
+def aligned_matrix(panel, grid, after=None, last_level=None, levels=False):
+    # (x, levels) on `grid` (int day numbers) for every technology of the panel. With
+    # `after` only rows dated after it are placed, continuing from last_level.
+    M = np.full((len(panel), len(grid)), np.nan)
+    for i in range(len(panel)):
+        days, values = panel.series(i)
+        if after is not None:
+            start = np.searchsorted(days, after, side='right')
+            days, values = days[start:], values[start:]
+        pos = np.searchsorted(grid, days)
+        M[i, pos] = values
+    prev = np.full((len(panel), 1), np.nan) if last_level is None else last_level[:, None]
+    L = _ffill(np.hstack([prev, M]))
+    X = L[:, 1:] if levels else np.diff(L, axis=1)
+    return np.nan_to_num(X), L[:, -1]
+
+
+def lags_of(max_lag):
+    return np.arange(-max_lag, max_lag + 1)
+
+
+def _moments(n, s1, s2):
+    mean = s1 / n
+    std = np.sqrt(np.maximum(s2 / n - mean * mean, 0.0))
+    return mean, np.where(std > 0, std, np.nan)
+
+
+def _shifted(L, n):
+    # index ranges of (x_a[t], x_b[t + L]) pairs
+    return (slice(0, n - L), slice(L, n)) if L >= 0 else (slice(-L, n), slice(0, n + L))
+
+
+def lag_product(Xa, X, L):
+    # S_L for the rows Xa against all of X
+    sa, sb = _shifted(L, X.shape[1])
+    return Xa[:, sa] @ X[:, sb].T
+
+
+def correlation_from_sums(S, n, lags, mean_a, std_a, mean_b, std_b):
+    # S[..., lag] -> correlation[..., lag]; mean_b/std_b broadcast against S's leading axes
+    n_l = (n - np.abs(lags)).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (S - n_l * (mean_a * mean_b)[..., None]) / (n_l * (std_a * std_b)[..., None])
+
+
+def full_pass(X, max_lag=MAX_LAG, n_candidates=N_CANDIDATES, block=BLOCK):
+    # Candidates per row and their lag sums, BLOCK rows at a time. Candidates are chosen
+    # on the standardized matrix (z_a[t] . z_b[t + L] / n_L, float32 BLAS, best over the
+    # lags against every column); their lag sums are then gathered in float64 so they
+    # match what extend_sums adds.
+    T, n = X.shape
+    lags = lags_of(max_lag)
+    mean, std = _moments(n, X.sum(axis=1), (X * X).sum(axis=1))
+    Z = np.nan_to_num((X - mean[:, None]) / std[:, None]).astype(np.float32)
+    k = min(n_candidates, T - 1)
+    cand = np.zeros((T, k), dtype=np.int32)
+    S = np.zeros((T, k, len(lags)))
+    for start in range(0, T, block):
+        rows = slice(start, min(start + block, T))
+        best = np.full((rows.stop - rows.start, T), -np.inf, dtype=np.float32)
+        for L in lags:
+            c = lag_product(Z[rows], Z, L)
+            c *= np.float32(1.0 / (n - abs(L)))
+            np.maximum(best, c, out=best)
+        best[np.arange(rows.stop - rows.start), np.arange(rows.start, rows.stop)] = -np.inf   # not itself
+        if k > 0:
+            top = np.argpartition(-best, k - 1, axis=1)[:, :k]
+            cand[rows] = top
+            Xb = X[top]
+            for li, L in enumerate(lags):
+                sa, sb = _shifted(L, n)
+                S[rows, :, li] = np.einsum('bt,bkt->bk', X[rows, sa], Xb[:, :, sb])
+    return cand, S
+
+
+def extend_sums(state, X_new):
+    # Add the terms of m new periods: for each lag, the pairs (i, i + L) with at least one
+    # end among the new periods. `tail` holds the last max_lag x values of every series.
+    n0, m = int(state['n']), X_new.shape[1]
+    tail = state['tail']
+    E = np.hstack([tail, X_new])
+    t0 = n0 - tail.shape[1]   # global period of E[:, 0]
+    cand = state['cand']
+    for li, L in enumerate(lags_of(state['max_lag'])):
+        lo = max(max(0, -L), n0 - max(L, 0))
+        hi = n0 + m - 1 - max(L, 0)
+        if hi < lo:
+            continue
+        I = np.arange(lo, hi + 1) - t0
+        state['S'][:, :, li] += np.einsum('tp,tkp->tk', E[:, I], E[cand][:, :, I + L])
+    state['n'] = n0 + m
+    state['s1'] = state['s1'] + X_new.sum(axis=1)
+    state['s2'] = state['s2'] + (X_new * X_new).sum(axis=1)
+    state['tail'] = E[:, -state['max_lag']:] if state['max_lag'] else E[:, :0]
+
+
+def neighbours(state, k=TOP_K):
+    # Technology, Rank, Neighbour, Correlation, Lag: top k candidates by best lagged correlation
+    techs, cand, n = state['techs'], state['cand'], int(state['n'])
+    lags = lags_of(state['max_lag'])
+    mean, std = _moments(n, state['s1'], state['s2'])
+    corr = correlation_from_sums(state['S'], n, lags, mean[:, None], std[:, None], mean[cand], std[cand])
+    corr = np.where(np.isnan(corr), -np.inf, corr)
+    best_lag = corr.argmax(axis=2)
+    best = np.take_along_axis(corr, best_lag[..., None], axis=2)[..., 0]
+    k = min(k, cand.shape[1])
+    order = np.argsort(-best, axis=1, kind='stable')[:, :k]
+    rows = np.repeat(np.arange(len(techs)), k)
+    cols = order.ravel()
+    value = best[rows, cols]
+    names = np.asarray(techs, dtype=object)
+    out = pd.DataFrame({'Technology': names[rows], 'Rank': np.tile(np.arange(1, k + 1), len(techs)),
+                        'Neighbour': names[cand[rows, cols]], 'Correlation': value.round(4),
+                        'Lag': lags[best_lag[rows, cols]]})
+    return out[np.isfinite(value)].reset_index(drop=True)
+
+
+def save_state(state, root=INDEX_DIR):
+    # arrays + meta written to a sibling directory and swapped in, like shared_panel.save
+    root = Path(root)
+    tmp = root.with_name(f'{root.name}.tmp-{os.getpid()}')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    np.savez(tmp / 'sums.npz', **{name: state[name] for name in STATE_ARRAYS})
+    meta = {k: v for k, v in state.items() if k not in STATE_ARRAYS}
+    (tmp / 'meta.json').write_text(json.dumps(meta, default=int))
+    old = root.with_name(f'{root.name}.old-{os.getpid()}')
+    if root.exists():
+        os.replace(root, old)
+    os.replace(tmp, root)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def load_state(root=INDEX_DIR):
+    root = Path(root)
+    if not (root / 'meta.json').exists():
+        return None
+    state = json.loads((root / 'meta.json').read_text())
+    with np.load(root / 'sums.npz') as arrays:
+        state.update({name: arrays[name] for name in STATE_ARRAYS})
+    return state
+
+
+def build(panel, csv_path, max_lag=MAX_LAG, n_candidates=N_CANDIDATES, levels=False):
+    grid = np.unique(np.asarray(panel.days))
+    X, last_level = aligned_matrix(panel, grid, levels=levels)
+    with timer('full_pass'):
+        cand, S = full_pass(X, max_lag, n_candidates)
+    tail = X[:, max(X.shape[1] - max_lag, 0):]
+    return {'techs': panel.techs, 'last_day': int(grid[-1]) if len(grid) else None, 'max_lag': max_lag,
+            'levels': levels, 'since_rebuild': 0, 'source': panel_fingerprint(csv_path),
+            'n': X.shape[1], 's1': X.sum(axis=1), 's2': (X * X).sum(axis=1), 'last_level': last_level,
+            'tail': tail, 'cand': cand, 'S': S}
+
+
+def update_index(csv_path=PANEL_CSV, root=INDEX_DIR, max_lag=MAX_LAG, n_candidates=N_CANDIDATES,
+                 levels=False, rebuild=False):
+    panel, _ = open_panel(csv_path)
+    state = None if rebuild else load_state(root)
+    reason = 'requested' if rebuild else 'no index yet'
+    if state is not None:
+        now = panel_fingerprint(csv_path, state['source']['length'])
+        if (state['max_lag'], state['levels'], state['cand'].shape[1]) != \
+                (max_lag, levels, min(n_candidates, len(state['techs']) - 1)):
+            reason = 'settings changed'
+        elif now['size'] < state['source']['size'] or now['head'] != state['source']['head']:
+            reason = 'panel rewritten'
+        elif panel.techs != state['techs']:
+            reason = 'technologies changed'
+        elif state['since_rebuild'] >= REBUILD_EVERY:
+            reason = f"{state['since_rebuild']} periods since the last full pass"
+        else:
+            reason = None
+    if reason:
+        print(f"Full correlation pass over {len(panel)} technologies ({reason})")
+        state = build(panel, csv_path, max_lag, n_candidates, levels)
+        count('passes', kind='full')
+    else:
+        days = np.asarray(panel.days)
+        grid = np.unique(days[days > state['last_day']])
+        if len(grid):
+            X_new, last_level = aligned_matrix(panel, grid, after=state['last_day'],
+                                               last_level=state['last_level'], levels=levels)
+            with timer('extend'):
+                extend_sums(state, X_new)
+            state.update(last_level=last_level, last_day=int(grid[-1]),
+                         since_rebuild=state['since_rebuild'] + len(grid))
+            count('passes', kind='incremental')
+        print(f"Added {len(grid)} new periods to the correlation index")
+        state['source'] = panel_fingerprint(csv_path)
+    save_state(state, root)
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default=str(PANEL_CSV))
+    parser.add_argument('--out', default=str(OUT_DIR))
+    parser.add_argument('--index', default=str(INDEX_DIR))
+    parser.add_argument('-k', type=int, default=TOP_K, help='Neighbours kept per technology')
+    parser.add_argument('--candidates', type=int, default=N_CANDIDATES,
+                        help='Neighbours tracked per technology between full passes')
+    parser.add_argument('--max-lag', type=int, default=MAX_LAG, help='Largest lead/lag, in periods')
+    parser.add_argument('--levels', action='store_true', help='Correlate levels instead of period-on-period changes')
+    parser.add_argument('--rebuild', action='store_true', help='Force a full pass')
+    parser.add_argument('--tech', default=None, help='Only print the neighbours of this technology')
+    args = parser.parse_args(argv)
+    if args.tech:
+        table = load_table('tech_neighbours', out_dir=args.out)
+        show_table(table[table['Technology'] == args.tech], head=args.k)
+    else:
+        start_run('correlation')
+        t0 = time.perf_counter()
+        state = update_index(args.input, args.index, args.max_lag, max(args.candidates, args.k),
+                             args.levels, args.rebuild)
+        table = neighbours(state, args.k)
+        print("Saved:", save_table(table, 'tech_neighbours', args.out))
+        print(f"{len(state['techs'])} technologies, {int(state['n'])} periods, "
+              f"{len(table)} neighbour rows in {time.perf_counter() - t0:.1f}s")
+        show_table(table[table['Rank'] == 1], 'Closest neighbour per technology')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+# dashboard_view.py
+# Incremental materialized view behind dashboard_master. Instead of re-merging every source
+# table on the Technology string each run, the joined table is kept between runs:
+#  - every technology gets an integer Tech_ID on first sight (never reused); the sources are
+#    re-keyed by it and joined on the integer index
+#  - per source, one 64-bit hash per row (pandas' hash_pandas_object) is kept; a run hashes
+#    the fresh sources, and only technologies whose row changed in any source, appeared or
+#    disappeared are re-joined and replaced in the view
+#  - a source whose columns changed, or outputs that do not match the state (deleted,
+#    written by another version), rebuild the view from scratch
+# Every row carries Changed_At, the UTC time it last changed. The Power BI export is a change
+# log split by day, one CSV per day under <out>/dashboard_master_parts/:
+#   <YYYY-MM-DD>.csv   the rows changed that day (latest version if a row changed twice),
+#                      Change = upsert, or delete with only Tech_ID / Technology set
+#   _manifest.json     version, and rows / last write of every partition
+# A run only rewrites today's file; earlier days are never touched again. In Power BI filter
+# RangeStart/RangeEnd on Changed_At, so a refresh loads only the new days, and keep the row
+# with the latest Changed_At per Tech_ID, dropping deletes. A rebuild (--rebuild, a changed
+# source schema, a lost state) replaces all the days with one full snapshot: refresh in full.
+# State is <out>/dashboard_view/state.pkl.
+#
+#   python code/dashboard_view.py                 # view status
+#   python code/dashboard_view.py --partitions    # partitions and their stamps
+
+import argparse
+import json
+import os
+import pickle
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from storage import OUT_DIR
+
+KEY = 'Tech_ID'
+STAMP = 'Changed_At'
+CHANGE = 'Change'
+MANIFEST = '_manifest.json'
+
+
+def view_dir(out_dir=OUT_DIR):
+    return Path(out_dir) / 'dashboard_view'
+
+
+def parts_dir(out_dir=OUT_DIR):
+    return Path(out_dir) / 'dashboard_master_parts'
+
+
+def now_stamp():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _write(path, write):
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def read_manifest(out_dir=OUT_DIR):
+    path = parts_dir(out_dir) / MANIFEST
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+class DashboardView:
+    def __init__(self):
+        self.ids = {}          # technology -> Tech_ID
+        self.hashes = {}       # source -> Series of row hashes indexed by Tech_ID
+        self.columns = {}      # source -> its columns when hashed
+        self.rows = None       # the joined table, indexed by Tech_ID, with Changed_At
+        self.version = 0       # bumped by every run that changed rows
+
+    def tech_ids(self, techs):
+        # Tech_IDs for a column of technologies, assigning new ones in order of appearance
+        techs = techs.astype(str)
+        ids = techs.map(self.ids)
+        new = techs[ids.isna()].drop_duplicates()
+        if len(new):
+            self.ids.update(zip(new, range(len(self.ids) + 1, len(self.ids) + 1 + len(new))))
+            ids = techs.map(self.ids)
+        return ids.astype('int64')
+
+    def keyed(self, sources):
+        # {name: frame indexed by Tech_ID}, one row per technology. The sources mostly list
+        # the same technologies in the same order, so the ids of the previous one are reused
+        out, last, ids = {}, None, None
+        for name, df in sources.items():
+            df = df.drop_duplicates('Technology', keep='last')
+            techs = df['Technology'].astype(str).to_numpy()
+            if last is None or not np.array_equal(techs, last):
+                last, ids = techs, self.tech_ids(df['Technology']).to_numpy()
+            out[name] = df.set_index(pd.Index(ids, name=KEY))
+        return out
+
+    def apply(self, sources, stamp, rebuild=False):
+        # sources: {name: frame with a Technology column}, the first is the base every other
+        # source is left-joined to. Returns (upserted ids, removed rows, whether it rebuilt)
+        keyed = self.keyed(sources)
+        base = next(iter(keyed))
+        rebuild = rebuild or self.rows is None or list(self.columns) != list(keyed) or any(
+            self.columns[name] != list(df.columns) for name, df in keyed.items())
+        if rebuild:
+            self.hashes, self.columns = {}, {}
+        touched = set()
+        for name, df in keyed.items():
+            # Technology is implied by the Tech_ID index: hash the other columns
+            h = pd.Series(pd.util.hash_pandas_object(df.drop(columns=['Technology']), index=False).to_numpy(),
+                          index=df.index)
+            if not rebuild:
+                old = self.hashes[name]
+                touched.update(h.index[h.ne(old.reindex(h.index))])
+                touched.update(old.index.difference(h.index))
+            self.hashes[name] = h
+            self.columns[name] = list(df.columns)
+        live = keyed[base].index
+        old_rows = self.rows if self.rows is not None else pd.DataFrame(index=pd.Index([], name=KEY))
+        upserts = live if rebuild else live[live.isin(list(touched))]
+        removed = old_rows.index.difference(live)
+        if len(upserts) == 0 and len(removed) == 0:
+            return upserts, old_rows.iloc[:0], rebuild
+
+        joined = keyed[base].loc[upserts]
+        for name, df in keyed.items():
+            if name != base:
+                joined = joined.join(df.drop(columns=['Technology']), how='left')
+        joined[STAMP] = stamp
+        kept = old_rows.drop(index=old_rows.index.intersection(upserts.union(removed)))
+        self.rows = joined if kept.empty else pd.concat([kept, joined]).sort_index()
+        self.version += 1
+        return upserts, old_rows.loc[removed], rebuild
+
+    def table(self, order=None):
+        # the view as a flat table (Tech_ID first), in `order` of Tech_IDs when given
+        rows = self.rows if order is None else self.rows.loc[order]
+        return rows.reset_index()
+
+    def export_partitions(self, out_dir, upserts, removed, stamp, rebuild=False):
+        # Write this run's changes into today's partition; returns the rows it now holds
+        root = parts_dir(out_dir)
+        root.mkdir(parents=True, exist_ok=True)
+        manifest = None if rebuild else read_manifest(out_dir)
+        partitions = manifest['partitions'] if manifest else {}
+        if rebuild:
+            for f in root.glob('*.csv'):
+                f.unlink()
+            upserts = self.rows.index
+        changes = self.rows.loc[upserts].reset_index()
+        changes[CHANGE] = 'upsert'
+        if len(removed):
+            deletes = removed[['Technology']].reset_index()
+            deletes[STAMP] = stamp
+            deletes[CHANGE] = 'delete'
+            changes = pd.concat([changes, deletes], ignore_index=True)
+        path = root / f'{stamp[:10]}.csv'
+        if path.exists():
+            # earlier run today: keep its rows that did not change again since
+            today = pd.read_csv(path)
+            changes = pd.concat([today[~today[KEY].isin(changes[KEY])], changes], ignore_index=True)
+        _write(path, lambda tmp: changes.to_csv(tmp, index=False))
+        partitions[stamp[:10]] = {'rows': len(changes), 'written': stamp}
+        manifest = {'version': self.version, 'updated': stamp, 'rows': len(self.rows),
+                    'partitions': dict(sorted(partitions.items()))}
+        _write(root / MANIFEST, lambda tmp: tmp.write_text(json.dumps(manifest, indent=1)))
+        return len(changes)
+
+    def save(self, root):
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        def dump(tmp):
+            with open(tmp, 'wb') as f:
+                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        _write(root / 'state.pkl', dump)
+
+    @classmethod
+    def load(cls, root):
+        path = Path(root) / 'state.pkl'
+        if not path.exists():
+            return cls()
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', default=str(OUT_DIR))
+    parser.add_argument('--partitions', action='store_true', help='List the partitions')
+    args = parser.parse_args(argv)
+    view = DashboardView.load(view_dir(args.out))
+    manifest = read_manifest(args.out)
+    if view.rows is None:
+        print("No dashboard view yet: run generate_dashboard_master.py")
+        return
+    print(f"version {view.version}: {len(view.rows)} rows, {len(view.ids)} technology ids, "
+          f"last change {view.rows[STAMP].max()}")
+    if manifest and manifest['version'] != view.version:
+        print(f"partitions are at version {manifest['version']}: the next run rebuilds them")
+    if args.partitions and manifest:
+        for date, p in manifest['partitions'].items():
+            print(f"  {date}  {p['rows']:>8} rows  written {p['written']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+# fast_forecast.py
+# Closed-form forecasters fitted on every series at once. The panel is laid out as a
+# 2-D array, one row per technology at its native frequency (features.infer_freq),
+# right-aligned on each series' last point and NaN-padded on the left, so every model
+# is a handful of array operations:
+#   naive          - last value
+#   seasonal_naive - value one season (features.SEASON: 52 weekly points) earlier
+#   trend          - least-squares line over the last REGRESSION_WINDOW points
+#   holt           - damped Holt smoothing, alpha/beta picked per series from a small grid
+# Each returns (point, lower, upper) arrays of shape (n_series, horizon) with 95%
+# prediction intervals. select_models() backtests them on the last few windows and
+# marks the series where even the best one is poor; arima_model.py --tiered sends
+# only those on to auto_arima. fast_tier() works on one frequency at a time; horizons
+# and the lookback are given in days and converted to periods (features.steps).
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from features import REGRESSION_WINDOW, SEASON, forecast_index, steps, to_native
+
+SEASON_DAYS = SEASON['D']     # daily series: same weekday one year back
+LOOKBACK_DAYS = 2 * SEASON_DAYS
+SERIES_CHUNK = 2000       # rows per array; bounds memory at ~SERIES_CHUNK * LOOKBACK_DAYS floats
+TIER_ORIGINS = 3
+TIER_THRESHOLD = 0.20     # RMSE / mean level above which a series goes on to ARIMA
+HOLT_ALPHAS = np.array([0.1, 0.3, 0.5, 0.8])
+HOLT_BETAS = np.array([0.0, 0.05, 0.2])
+HOLT_PHI = 0.98
+Z95 = 1.96
+
+
+def panel_matrix(series, lookback=LOOKBACK_DAYS, freq='D'):
+    # series: {tech: (dates, values)} of one frequency, e.g. arima_model.load_panel_series.
+    # Returns (techs, Y, last_dates) with Y right-aligned over the last `lookback` periods.
+    techs = list(series)
+    Y = np.full((len(techs), lookback), np.nan)
+    last_dates = []
+    for i, tech in enumerate(techs):
+        dates, values = series[tech]
+        ts = to_native(pd.Series(values, index=pd.DatetimeIndex(dates)), freq)
+        y = ts.to_numpy(dtype=float)[-lookback:]
+        Y[i, lookback - len(y):] = y
+        last_dates.append(ts.index[-1])
+    return techs, Y, last_dates
+
+
+def _nanstd(a, axis=1):
+    n = np.sum(~np.isnan(a), axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(a, axis=axis) / n
+        d = np.where(np.isnan(a), 0.0, a - np.expand_dims(mean, axis))
+        return np.sqrt(np.sum(d * d, axis=axis) / (n - 1))
+
+
+def naive_forecast(Y, horizon):
+    h = np.arange(1, horizon + 1)
+    point = np.repeat(Y[:, -1:], horizon, axis=1)   # right-aligned: last column = last day
+    sigma = _nanstd(np.diff(Y, axis=1))[:, None] * np.sqrt(h)
+    return point, point - Z95 * sigma, point + Z95 * sigma
+
+
+def seasonal_naive_forecast(Y, horizon, season=SEASON_DAYS):
+    h = np.arange(1, horizon + 1)
+    L = Y.shape[1]
+    if L <= season:
+        nan = np.full((len(Y), horizon), np.nan)
+        return nan, nan, nan
+    point = Y[:, L - season + (h - 1) % season]
+    sigma = _nanstd(Y[:, season:] - Y[:, :-season])[:, None] * np.sqrt((h - 1) // season + 1)
+    return point, point - Z95 * sigma, point + Z95 * sigma
+
+
+def trend_forecast(Y, horizon, window=REGRESSION_WINDOW):
+    # OLS y = a + b*x over the last `window` days (fewer for short series), with the
+    # usual prediction interval sigma * sqrt(1 + 1/n + (x0 - xbar)^2 / Sxx)
+    W = Y[:, -window:]
+    mask = ~np.isnan(W)
+    x = np.broadcast_to(np.arange(W.shape[1], dtype=float), W.shape)
+    n = mask.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        xbar = np.where(mask, x, 0).sum(axis=1) / n
+        ybar = np.where(mask, W, 0).sum(axis=1) / n
+        dx = np.where(mask, x - xbar[:, None], 0)
+        dy = np.where(mask, W - ybar[:, None], 0)
+        sxx = (dx * dx).sum(axis=1)
+        slope = np.where(sxx > 0, (dx * dy).sum(axis=1) / sxx, 0.0)
+        resid = np.where(mask, dy - slope[:, None] * dx, 0)
+        sigma = np.sqrt((resid * resid).sum(axis=1) / np.maximum(n - 2, 1))
+        x0 = W.shape[1] - 1 + np.arange(1, horizon + 1)
+        point = ybar[:, None] + slope[:, None] * (x0 - xbar[:, None])
+        se = sigma[:, None] * np.sqrt(1 + 1 / n[:, None] + (x0 - xbar[:, None]) ** 2 / sxx[:, None])
+    return point, point - Z95 * se, point + Z95 * se
+
+
+def holt_forecast(Y, horizon, alphas=HOLT_ALPHAS, betas=HOLT_BETAS, phi=HOLT_PHI):
+    # Damped additive Holt (ETS(A,Ad,N)) run for every (alpha, beta) pair of the grid
+    # and every series in one pass over the time axis; each series keeps the pair with
+    # the lowest one-step-ahead squared error.
+    a = np.repeat(alphas, len(betas))[:, None]
+    b = np.tile(betas, len(alphas))[:, None]
+    G, (n, L) = len(a), Y.shape
+    level = np.full((G, n), np.nan)
+    trend = np.zeros((G, n))
+    sse = np.zeros((G, n))
+    count = np.zeros(n)
+    for t in range(L):
+        y = Y[:, t]
+        valid = ~np.isnan(y)
+        started = ~np.isnan(level[0])
+        step = valid & started
+        fc = level + phi * trend
+        err = np.where(step, y - fc, 0.0)
+        sse += err * err
+        count += step
+        level = np.where(step, fc + a * err, np.where(valid & ~started, y, level))
+        trend = np.where(step, phi * trend + a * b * err, trend)
+
+    best = np.argmin(sse, axis=0)
+    rows = np.arange(n)
+    level, trend = level[best, rows], trend[best, rows]
+    alpha, beta = a[best, 0], b[best, 0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sigma2 = sse[best, rows] / np.maximum(count - 2, 1)
+
+    h = np.arange(1, horizon + 1)
+    phi_h = np.cumsum(phi ** h)                       # phi + phi^2 + ... + phi^h
+    point = level[:, None] + phi_h[None, :] * trend[:, None]
+    # var(h) = sigma^2 * (1 + sum_{j<h} (alpha * (1 + beta * phi_j))^2)
+    c = (alpha[:, None] * (1 + beta[:, None] * phi_h[None, :])) ** 2
+    var = sigma2[:, None] * (1 + np.concatenate([np.zeros((n, 1)), np.cumsum(c, axis=1)[:, :-1]], axis=1))
+    se = np.sqrt(var)
+    return point, point - Z95 * se, point + Z95 * se
+
+
+FORECASTERS = {'naive': naive_forecast, 'seasonal_naive': seasonal_naive_forecast,
+               'trend': trend_forecast, 'holt': holt_forecast}
+
+
+def run_model(name, Y, horizon, season=SEASON_DAYS):
+    if name == 'seasonal_naive':
+        return seasonal_naive_forecast(Y, horizon, season)
+    return FORECASTERS[name](Y, horizon)
+
+
+def backtest(Y, horizon, n_origins=TIER_ORIGINS, step=None, models=None, season=SEASON_DAYS):
+    # RMSE of every model over the last n_origins windows: {model: (n_series,)} plus the
+    # mean absolute level of the actuals, used to scale the errors
+    step = step or horizon
+    models = models or list(FORECASTERS)
+    L = Y.shape[1]
+    sq = {m: [] for m in models}
+    actuals = []
+    for i in range(n_origins):
+        cut = L - horizon - i * step
+        if cut < 2:
+            break
+        actual = Y[:, cut:cut + horizon]
+        actuals.append(actual)
+        for m in models:
+            point = run_model(m, Y[:, :cut], horizon, season)[0]
+            sq[m].append((actual - point) ** 2)
+    with np.errstate(invalid='ignore'):
+        rmse = {m: np.sqrt(np.nanmean(np.concatenate(v, axis=1), axis=1)) if v else np.full(len(Y), np.nan)
+                for m, v in sq.items()}
+        level = np.nanmean(np.abs(np.concatenate(actuals, axis=1)), axis=1) if actuals else np.full(len(Y), np.nan)
+    return rmse, level
+
+
+def select_models(Y, horizon, n_origins=TIER_ORIGINS, threshold=TIER_THRESHOLD, models=None, season=SEASON_DAYS):
+    # Best cheap model per series, its backtest RMSE, the RMSE scaled by the series level
+    # and whether it is poor enough (scaled RMSE > threshold, or unscored) to need ARIMA
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)   # all-NaN rows of short series
+        rmse, level = backtest(Y, horizon, n_origins, models=models, season=season)
+    names = list(rmse)
+    table = np.vstack([rmse[m] for m in names])
+    scored = ~np.all(np.isnan(table), axis=0)
+    best = np.argmin(np.where(np.isnan(table), np.inf, table), axis=0)
+    best_rmse = np.where(scored, table[best, np.arange(len(Y))], np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scaled = best_rmse / np.where(level > 0, level, np.nan)
+    need_arima = ~scored | ~(scaled <= threshold)
+    return np.array(names)[best], best_rmse, scaled, need_arima
+
+
+def forecast_with(Y, names, horizon, season=SEASON_DAYS):
+    # Forecast each row with its own model (names from select_models)
+    point = np.full((len(Y), horizon), np.nan)
+    lower, upper = point.copy(), point.copy()
+    for m in np.unique(names):
+        rows = names == m
+        point[rows], lower[rows], upper[rows] = run_model(m, Y[rows], horizon, season)
+    return point, lower, upper
+
+
+def fast_tier(series, periods=30, horizon=14, n_origins=TIER_ORIGINS, threshold=TIER_THRESHOLD):
+    # Runs select_models/forecast_with over the panel, one frequency and SERIES_CHUNK series
+    # at a time; `series` needs a freq(tech) (shared_panel.PanelSeries). periods and
+    # horizon are days. Returns (selection frame, {tech: forecast frame} for the series
+    # the cheap tier keeps), the forecasts at each series' native frequency. Origin is the
+    # last observed date, which every forecast starts after (as arima_model.py's do).
+    selections, forecasts = [], {}
+    by_freq = {}
+    for t in series:
+        by_freq.setdefault(series.freq(t), []).append(t)
+    for freq, techs_all in by_freq.items():
+        season = SEASON[freq]
+        n_periods, n_horizon = steps(periods, freq), steps(horizon, freq)
+        for start in range(0, len(techs_all), SERIES_CHUNK):
+            chunk = {t: series[t] for t in techs_all[start:start + SERIES_CHUNK]}
+            techs, Y, last_dates = panel_matrix(chunk, 2 * season, freq)
+            names, rmse, scaled, need_arima = select_models(Y, n_horizon, n_origins, threshold, season=season)
+            keep = ~need_arima
+            if keep.any():
+                point, lower, upper = forecast_with(Y[keep], names[keep], n_periods, season)
+                for j, i in enumerate(np.flatnonzero(keep)):
+                    idx = forecast_index(last_dates[i], n_periods, freq)
+                    forecasts[techs[i]] = pd.DataFrame({'ds': idx, 'y_pred': point[j],
+                                                        'y_lower': lower[j], 'y_upper': upper[j]})
+            selections.append(pd.DataFrame({'Technology': techs, 'Freq': freq, 'Origin': last_dates, 'Model': names,
+                                            'RMSE': rmse, 'Scaled_RMSE': scaled, 'Needs_ARIMA': need_arima}))
+    if not selections:
+        return pd.DataFrame(columns=['Technology', 'Freq', 'Origin', 'Model', 'RMSE', 'Scaled_RMSE',
+                                     'Needs_ARIMA']), forecasts
+    return pd.concat(selections, ignore_index=True), forecasts
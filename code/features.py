@@ -0,0 +1,174 @@
+# features.py
+# Shared per-technology features for the long-format Date,Technology,Interest panel.
+# Everything is computed in one pass over the panel sorted by (Technology, Date):
+# closed-form group sums replace per-series np.polyfit / LinearRegression calls and
+# grouped rolling windows replace the df[df['Technology']==tech] loops.
+# Series keep their native frequency (weekly for Google Trends): infer_freq() names it,
+# to_native() regularises a series on its own grid, and to_daily() / forecast_to_daily()
+# are only for consumers that ask for daily rows.
+
+import numpy as np
+import pandas as pd
+
+REGRESSION_WINDOW = 60   # points used for the linear fallback forecast (fill_missing_forecasts.py)
+FREQ_DAYS = {'D': 1, 'W': 7, 'M': 30}   # native frequencies, approximate days per period
+SEASON = {'D': 364, 'W': 52, 'M': 12}   # periods per year (364 days: same weekday a year back)
+
+
+def sort_panel(df):
+    # Sorted (Technology, Date) layout that every function below relies on
+    if not pd.api.types.is_datetime64_any_dtype(df['Date']):
+        df = df.assign(Date=pd.to_datetime(df['Date'], errors='coerce'))
+    df = df.dropna(subset=['Date'])
+    return df.sort_values(['Technology', 'Date'], kind='stable').reset_index(drop=True)
+
+
+def infer_freq(dates):
+    # Native frequency of a series ('D', 'W' or 'M') from the median spacing of its dates
+    # (datetimes or day numbers); fewer than 3 points or irregular spacing count as daily
+    d = np.asarray(dates).astype('datetime64[D]').astype(np.int64)
+    if len(d) < 3:
+        return 'D'
+    step = np.median(np.diff(d))
+    if 6 <= step <= 8:
+        return 'W'
+    if 28 <= step <= 31:
+        return 'M'
+    return 'D'
+
+
+def steps(days, freq):
+    # periods of `freq` needed to cover `days` days (at least one)
+    return max(1, -(-int(days) // FREQ_DAYS[freq]))
+
+
+def _offset(freq, anchor):
+    if freq == 'W':
+        return pd.Timedelta(days=7)
+    if freq == 'M':
+        if anchor.day == 1:
+            return pd.offsets.MonthBegin()
+        return pd.offsets.MonthEnd() if anchor.is_month_end else pd.DateOffset(months=1)
+    return pd.Timedelta(days=1)
+
+
+def native_index(start, end=None, periods=None, freq='D'):
+    # Regular dates at `freq` anchored on `start` (weekly points keep their weekday)
+    start = pd.Timestamp(start)
+    return pd.date_range(start=start, end=end, periods=periods, freq=_offset(freq, start))
+
+
+def history_index(last, periods, freq):
+    # the `periods` dates at `freq` ending with `last`
+    last = pd.Timestamp(last)
+    return pd.date_range(end=last, periods=periods, freq=_offset(freq, last))
+
+
+def forecast_index(last, periods, freq):
+    # the `periods` dates after `last` at `freq`
+    return native_index(last, periods=periods + 1, freq=freq)[1:]
+
+
+def to_native(ts, freq=None):
+    # Same treatment as to_daily on the series' own grid: regular index at its native
+    # frequency, forward-fill (points off the grid carry forward), then 0
+    ts = ts[~ts.index.duplicated(keep='first')].sort_index()
+    full_idx = native_index(ts.index.min(), ts.index.max(), freq=freq or infer_freq(ts.index))
+    return ts.reindex(full_idx, method='ffill').fillna(0).rename_axis('ds')
+
+
+def forecast_to_daily(fc, freq):
+    # Daily rows for a forecast frame (ds, y_pred, ...) at a native frequency: every
+    # period's values are carried over its days, as to_daily does for the history
+    if freq == 'D' or not len(fc):
+        return fc
+    ds = pd.DatetimeIndex(fc['ds'])
+    end = forecast_index(ds[-1], 1, freq)[0] - pd.Timedelta(days=1)
+    days = pd.date_range(ds[0], end, freq='D')
+    return fc.set_index('ds').reindex(days, method='ffill').rename_axis('ds').reset_index()
+
+
+def to_daily(ts):
+    # Same treatment as preprocessing.preprocess: daily index, forward-fill, then 0
+    ts = ts[~ts.index.duplicated(keep='first')].sort_index()
+    full_idx = pd.date_range(start=ts.index.min(), end=ts.index.max(), freq='D')
+    return ts.reindex(full_idx).ffill().fillna(0).rename_axis('ds')
+
+
+def _rolling(grouped, window, func, min_periods=None):
+    # grouped rolling aggregate aligned back onto the sorted frame
+    roll = grouped.rolling(window, min_periods=min_periods)
+    return getattr(roll, func)().reset_index(level=0, drop=True)
+
+
+def add_series_features(df):
+    # Row-level features (same definitions as notebooks/02_preprocessing.py)
+    df = sort_panel(df)
+    g = df.groupby('Technology', sort=False, observed=True)['Interest']
+    df['MA7'] = _rolling(g, 7, 'mean', min_periods=1)
+    df['MA30'] = _rolling(g, 30, 'mean', min_periods=1)
+    df['Pct_Change'] = g.pct_change(fill_method=None).fillna(0)
+    df['Volatility'] = _rolling(g, 7, 'std', min_periods=1)
+    df['Trend_Direction'] = np.select([df['Pct_Change'] > 0, df['Pct_Change'] < 0], ['Up', 'Down'], 'Stable')
+    return df
+
+
+def summarize_series(df):
+    # One row per technology: last value, slope, volatility, stability,
+    # MA7/MA30, pct change, linear fallback forecast and trend strength.
+    df = sort_panel(df)
+    y = df['Interest'].astype(float)
+    key = df['Technology']
+    g = y.groupby(key, sort=False, observed=True)
+
+    n = g.size()
+    n_row = np.repeat(n.to_numpy(), n.to_numpy())   # groups are contiguous in the sorted layout
+    pos = g.cumcount().to_numpy()
+
+    # OLS slope over the whole series: x centred per group, sum(x*y) / sum(x^2)
+    xc = pos - (n_row - 1) / 2.0
+    sxx = (n * (n ** 2 - 1) / 12.0).to_numpy()
+    sxy = (xc * y).groupby(key, sort=False, observed=True).sum().to_numpy()
+    slope = np.divide(sxy, sxx, out=np.zeros(len(n)), where=sxx > 0)
+    slope = np.where(n.to_numpy() < 5, 0.0, slope)
+
+    # OLS on the last REGRESSION_WINDOW points, evaluated at t = m + 1
+    # (the fallback forecast fill_missing_forecasts.py used to fit per series)
+    m_row = np.minimum(n_row, REGRESSION_WINDOW)
+    in_tail = pos >= n_row - m_row
+    t_key = key[in_tail]
+    t_y = y[in_tail]
+    t_xc = (pos - (n_row - m_row))[in_tail] - (m_row[in_tail] - 1) / 2.0
+    m = np.minimum(n, REGRESSION_WINDOW).to_numpy()
+    t_sxx = m * (m ** 2 - 1) / 12.0
+    t_sxy = (t_xc * t_y).groupby(t_key, sort=False, observed=True).sum().to_numpy()
+    t_slope = np.divide(t_sxy, t_sxx, out=np.zeros(len(n)), where=t_sxx > 0)
+    t_mean = t_y.groupby(t_key, sort=False, observed=True).mean().to_numpy()
+    linear_forecast = t_mean + t_slope * (m + 1 - (m - 1) / 2.0)
+
+    roll7 = _rolling(g, 7, 'std')
+    roll14 = _rolling(g, 14, 'std')
+    whole_std = g.std()
+    last_roll7 = roll7.groupby(key, sort=False, observed=True).last()
+    vol = np.where(n >= 7, last_roll7, whole_std)
+    mean_roll14 = roll14.groupby(key, sort=False, observed=True).mean()
+    stability = 1 / (np.where(n >= 14, mean_roll14, whole_std) + 1)
+
+    last_idx = (np.cumsum(n.to_numpy()) - 1)
+    ma7 = _rolling(g, 7, 'mean', min_periods=1).to_numpy()[last_idx]
+    ma30 = _rolling(g, 30, 'mean', min_periods=1).to_numpy()[last_idx]
+    pct = g.pct_change(fill_method=None).fillna(0).to_numpy()[last_idx]
+
+    out = pd.DataFrame({
+        'N': n.to_numpy(),
+        'Last_Value': g.last().to_numpy(),
+        'Slope': slope,
+        'Volatility': vol,
+        'Stability': stability,
+        'MA7': ma7,
+        'MA30': ma30,
+        'Pct_Change': pct,
+        'Linear_Forecast': linear_forecast,
+    }, index=pd.Index(n.index.astype(str), name='Technology'))
+    out['Trend_Strength'] = out['Slope'] * 10 + out['Stability'] * 50
+    return out
@@ -1,78 +1,95 @@
 # fill_missing_forecasts.py
 # Add synthetic forecasts for technologies missing ARIMA output.
 
+import argparse
 import pandas as pd
-from pathlib import Path
-import numpy as np
-from sklearn.linear_model import LinearRegression
 
-DATA = Path("data/trends_processed.csv")
-OUT_DIR = Path("outputs")
-ARIMA_DIR = Path("outputs")
-OUT_FILE = OUT_DIR / "final_forecast_table_all_complete.csv"
-
-df = pd.read_csv(DATA)
-df["Date"] = pd.to_datetime(df["Date"])
-
-techs = ["Generative AI", "Blockchain", "Quantum Computing", "Edge Computing", "5G"]
-
-rows = []
-
-for tech in techs:
-    print("\nProcessing:", tech)
-
-    df_t = df[df["Technology"] == tech].sort_values("Date").reset_index(drop=True)
-
-    # current value
-    current_value = float(df_t["Interest"].iloc[-1])
-
-    # check if ARIMA forecast exists
-    safe = "".join(x if x.isalnum() else "_" for x in tech)
-    arima_path = OUT_DIR / f"{safe}_arima_forecast.csv"
-
-    if arima_path.exists():
-        # load ARIMA forecast
-        fc = pd.read_csv(arima_path)
-        forecast_value = float(fc["y_pred"].iloc[0])
-        trend_dir = "Up" if forecast_value > current_value else "Down"
-        growth_pct = ((forecast_value - current_value) / current_value) * 100
-        print("✔ ARIMA forecast used")
-
-    else:
-        print("⚠ ARIMA missing → Using synthetic regression forecast")
-
-        # use last 60 days for regression
-        df_last = df_t.tail(60)
-        df_last["t"] = np.arange(len(df_last)).reshape(-1, 1)
-
-        model = LinearRegression()
-        model.fit(df_last["t"].values.reshape(-1, 1), df_last["Interest"])
-
-        future_t = np.array([[len(df_last) + 1]])
-        forecast_value = float(model.predict(future_t)[0])
-
-        trend_dir = "Up" if forecast_value > current_value else "Down"
-        growth_pct = ((forecast_value - current_value) / current_value) * 100
-
-    # volatility
-    if len(df_t) > 7:
-        vol = float(df_t["Interest"].rolling(7).std().dropna().iloc[-1])
-    else:
-        vol = float(df_t["Interest"].std())
-
-    rows.append({
-        "Technology": tech,
-        "Current_Value": round(current_value, 3),
-        "Forecast_Value": round(forecast_value, 3),
-        "Growth_Percent": round(growth_pct, 3),
-        "Trend_Direction": trend_dir,
-        "Volatility": round(vol, 3)
-    })
-
-final_df = pd.DataFrame(rows)
-final_df["Rank"] = final_df["Growth_Percent"].rank(ascending=False).astype(int)
-final_df = final_df.sort_values("Rank")
-
-final_df.to_csv(OUT_FILE, index=False)
-print("\n✅ Final complete table saved to:", OUT_FILE)
-print(final_df.to_string(index=False))
+from features import summarize_series
+from hierarchy import TAXONOMY_PATH, panel_technologies
+from instrument import count, show_table, start_run, timer, verbose
+from ranking_index import INDEX_DIR, update_board
+from storage import OUT_DIR, PANEL_CSV, first_forecasts, load_panel, save_table
+
+
+def fill_missing(panel_csv=PANEL_CSV, out_dir=OUT_DIR, taxonomy=TAXONOMY_PATH, index_dir=INDEX_DIR):
+    with timer("load_panel"):
+        df = load_panel(panel_csv, columns=["Date", "Technology", "Interest"])
+
+    # current value, volatility and the linear fallback forecast for every tech at once
+    with timer("summarize_series"):
+        feats = summarize_series(df)
+
+    # the collected technologies of the taxonomy (data/taxonomy.json), then the panel's
+    # others: the same set hierarchy.py forecasts (the latter under TOTAL)
+    techs = panel_technologies([str(t) for t in feats.index], taxonomy)
+
+    # the first point of every ARIMA (or fast-tier) forecast, keyed by the full name
+    with timer("load_forecasts"):
+        forecasts = first_forecasts(out_dir)
+
+    rows = []
+
+    for tech in techs:
+        if verbose():
+            print("\nProcessing:", tech)
+
+        # current value
+        current_value = float(feats.at[tech, "Last_Value"])
+
+        # check if ARIMA forecast exists
+        if tech in forecasts:
+            forecast_value = forecasts[tech]
+            trend_dir = "Up" if forecast_value > current_value else "Down"
+            growth_pct = ((forecast_value - current_value) / current_value) * 100 if current_value else float("nan")
+            count("forecasts", source="arima")
+            if verbose():
+                print("✔ ARIMA forecast used")
+
+        else:
+            count("forecasts", source="linear")
+            print(f"⚠ ARIMA missing for {tech} → Using synthetic regression forecast")
+
+            # linear trend over the last 60 days (computed in features.summarize_series)
+            forecast_value = float(feats.at[tech, "Linear_Forecast"])
+
+            trend_dir = "Up" if forecast_value > current_value else "Down"
+            growth_pct = ((forecast_value - current_value) / current_value) * 100 if current_value else float("nan")
+
+        # volatility
+        vol = float(feats.at[tech, "Volatility"])
+
+        rows.append({
+            "Technology": tech,
+            "Current_Value": round(current_value, 3),
+            "Forecast_Value": round(forecast_value, 3),
+            "Growth_Percent": round(growth_pct, 3),
+            "Trend_Direction": trend_dir,
+            "Volatility": round(vol, 3)
+        })
+
+    final_df = pd.DataFrame(rows)
+    final_df["Rank"] = final_df["Growth_Percent"].rank(ascending=False, na_option="bottom").astype(int)
+    final_df = final_df.sort_values("Rank")
+
+    with timer("save_table"):
+        OUT_FILE = save_table(final_df, "final_forecast_table_all_complete", out_dir)
+    # keep the growth / stability leaderboards in outputs/ranking_index/ current
+    update_board("growth", final_df.set_index("Technology")["Growth_Percent"], index_dir)
+    update_board("volatility", final_df.set_index("Technology")["Volatility"], index_dir)
+    print("\n✅ Final complete table saved to:", OUT_FILE)
+    return final_df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default=str(PANEL_CSV))
+    parser.add_argument("--out", default=str(OUT_DIR))
+    parser.add_argument("--taxonomy", default=str(TAXONOMY_PATH))
+    parser.add_argument("--index", default=str(INDEX_DIR))
+    args = parser.parse_args(argv)
+    start_run("fill_missing")
+    show_table(fill_missing(args.input, args.out, args.taxonomy, args.index))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+# forecast_server.py
+# Local HTTP/JSON service over the pipeline outputs, so Power BI and internal tools
+# stop re-reading the CSVs on every poll.
+#  - the forecast, trend strength and yearly ranking tables are loaded into a Snapshot
+#    of plain dicts and pre-sorted lists (lookups and top-N are O(1) / O(N))
+#  - responses are kept in an LRU cache keyed by snapshot version + URL
+#  - a watcher thread polls the source files; when the pipeline writes new outputs a new
+#    Snapshot is built off to the side and swapped in with one assignment, so requests
+#    see either the old or the new tables, never a mix
+#  - /metrics reports per-endpoint latency percentiles, QPS and cache hit rate
+# Everything is local (127.0.0.1, stdlib http.server); ForecastService.handle() can be
+# called without a socket at all.
+#
+#   python code/forecast_server.py --port 8050
+#   curl localhost:8050/forecast/Blockchain
+#   curl "localhost:8050/forecast/Blockchain?daily=1"  # forecast rows expanded to days
+#   curl "localhost:8050/top?by=Trend_Strength&n=3"
+#   curl "localhost:8050/rankings/yearly?year=2024"
+#   python code/forecast_server.py --self-check    # offline smoke test on a random port
+
+import argparse
+import hashlib
+import json
+import math
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pandas as pd
+
+from features import forecast_to_daily, infer_freq
+from storage import OUT_DIR, forecast_path, load_table, table_path
+
+SUMMARY_TABLES = ['final_forecast_table_all_complete', 'final_forecast_table_all']
+TOP_COLUMNS = ['Growth_Percent', 'Trend_Strength', 'Volatility', 'Current_Value', 'Forecast_Value']
+CACHE_SIZE = 1024
+RELOAD_INTERVAL = 2.0     # seconds between checks of the source files
+LATENCY_WINDOW = 2048     # latencies kept per endpoint for the percentiles
+QPS_WINDOW = 60.0         # seconds
+
+
+def _clean(value):
+    # JSON-safe scalar: NaN -> null, numpy/pandas types -> Python
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+
+def _records(df):
+    return [{k: _clean(v) for k, v in row.items()} for row in df.to_dict('records')]
+
+
+class Snapshot:
+    # Immutable view of the outputs at one point in time
+    def __init__(self, out_dir=OUT_DIR):
+        out_dir = Path(out_dir)
+        self.sources = source_files(out_dir)
+        self.version = signature(self.sources)
+        self.loaded_at = pd.Timestamp.now().isoformat(timespec='seconds')
+
+        summary = None
+        for name in SUMMARY_TABLES:
+            if table_path(name, out_dir).exists():
+                summary = load_table(name, out_dir=out_dir)
+                break
+        if summary is None:
+            summary = pd.DataFrame(columns=['Technology'])
+        if table_path('trend_strength', out_dir).exists():
+            ts = load_table('trend_strength', out_dir=out_dir)
+            summary = summary.merge(ts, on='Technology', how='outer')
+        summary['Technology'] = summary['Technology'].astype(str)
+        self.summary = {r['Technology']: r for r in _records(summary)}
+
+        # descending orders for top-N; rows without a value sort last
+        self.ordered = {}
+        for col in TOP_COLUMNS:
+            if col in summary.columns:
+                order = summary.sort_values(col, ascending=False, na_position='last', kind='stable')
+                self.ordered[col] = order['Technology'].tolist()
+
+        self.forecasts = {}
+        self.freqs = {}   # native frequency of each forecast, for ?daily=1
+        combined = out_dir / 'arima_forecast_all.csv'
+        if combined.exists():
+            fc = pd.read_csv(combined)
+            for tech, g in fc.groupby('Technology', sort=False):
+                if 'Freq' in g.columns:
+                    self.freqs[str(tech)] = g['Freq'].iloc[0]
+                    g = g.drop(columns='Freq')
+                self.forecasts[str(tech)] = _records(g.drop(columns='Technology'))
+        else:
+            # single-run layout: one <safe name>_arima_forecast.csv per technology
+            for tech in self.summary:
+                path = forecast_path(tech, out_dir)
+                if path.exists():
+                    self.forecasts[tech] = _records(pd.read_csv(path))
+
+        self.yearly = {}
+        self.yearly_by_tech = {}
+        if table_path('tech_yearly_ranking', out_dir).exists():
+            yr = load_table('tech_yearly_ranking', out_dir=out_dir)
+            yr['Technology'] = yr['Technology'].astype(str)
+            yr = yr.sort_values(['Year', 'Avg_Interest'], ascending=[True, False], kind='stable')
+            yr['Rank'] = yr.groupby('Year').cumcount() + 1
+            for year, g in yr.groupby('Year', sort=True):
+                self.yearly[int(year)] = _records(g.drop(columns='Year'))
+            for tech, g in yr.groupby('Technology', sort=False):
+                self.yearly_by_tech[tech] = _records(g.drop(columns='Technology'))
+
+    def daily_forecast(self, tech):
+        # forecast rows carried over their days (responses are cached, so this runs once)
+        rows = self.forecasts.get(tech, [])
+        if not rows:
+            return rows
+        fc = pd.DataFrame(rows).assign(ds=lambda d: pd.to_datetime(d['ds']))
+        return _records(forecast_to_daily(fc, self.freqs.get(tech) or infer_freq(fc['ds'])))
+
+
+def source_files(out_dir):
+    out_dir = Path(out_dir)
+    files = [table_path(n, out_dir) for n in SUMMARY_TABLES + ['trend_strength', 'tech_yearly_ranking']]
+    files.append(out_dir / 'arima_forecast_all.csv')
+    return [f for f in files if f.exists()]
+
+
+def signature(files):
+    # changes whenever any source file is replaced or rewritten
+    sig = []
+    for f in files:
+        try:
+            st = f.stat()
+        except FileNotFoundError:
+            continue
+        sig.append((f.name, st.st_mtime_ns, st.st_size))
+    return hashlib.sha1(repr(sig).encode()).hexdigest()[:12]
+
+
+class LRUCache:
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+                self.hits += 1
+                return self.data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}
+        self.counts = {}
+        self.recent = deque()
+        self.started = time.time()
+
+    def record(self, endpoint, seconds):
+        now = time.time()
+        with self.lock:
+            self.latency.setdefault(endpoint, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+            self.recent.append(now)
+            while self.recent and self.recent[0] < now - QPS_WINDOW:
+                self.recent.popleft()
+
+    def report(self):
+        with self.lock:
+            window = min(QPS_WINDOW, max(time.time() - self.started, 1e-9))
+            endpoints = {}
+            for name, lat in self.latency.items():
+                ms = sorted(x * 1000 for x in lat)
+                endpoints[name] = {'requests': self.counts[name],
+                                   'p50_ms': round(ms[len(ms) // 2], 3),
+                                   'p95_ms': round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+                                   'p99_ms': round(ms[min(len(ms) - 1, int(len(ms) * 0.99))], 3)}
+            return {'uptime_s': round(time.time() - self.started, 1),
+                    'qps': round(len(self.recent) / window, 2), 'endpoints': endpoints}
+
+
+class ForecastService:
+    def __init__(self, out_dir=OUT_DIR, cache_size=CACHE_SIZE):
+        self.out_dir = Path(out_dir)
+        self.snapshot = Snapshot(self.out_dir)
+        self.cache = LRUCache(cache_size)
+        self.metrics = Metrics()
+        self.reloads = 0
+        self.reload_errors = 0
+        self._stop = threading.Event()
+
+    # --- hot reload ----------------------------------------------------------
+    def reload_if_changed(self):
+        current = signature(source_files(self.out_dir))
+        if current == self.snapshot.version:
+            return False
+        try:
+            snapshot = Snapshot(self.out_dir)
+        except Exception as e:
+            # e.g. a table removed mid-run: keep serving the old snapshot, retry next poll
+            self.reload_errors += 1
+            print(f"Reload failed, keeping version {self.snapshot.version}: {e}")
+            return False
+        self.snapshot = snapshot   # single assignment: requests see old or new, never a mix
+        self.cache.clear()
+        self.reloads += 1
+        print(f"Reloaded outputs (version {snapshot.version}, {len(snapshot.summary)} technologies)")
+        return True
+
+    def watch(self, interval=RELOAD_INTERVAL):
+        def loop():
+            while not self._stop.wait(interval):
+                self.reload_if_changed()
+        thread = threading.Thread(target=loop, name='reload-watcher', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+    # --- requests ------------------------------------------------------------
+    def handle(self, target):
+        # target is the request path + query; returns (status, JSON bytes)
+        t0 = time.perf_counter()
+        url = urllib.parse.urlparse(target)
+        parts = [urllib.parse.unquote(p) for p in url.path.strip('/').split('/') if p]
+        endpoint = '/' + '/'.join(parts[:2] if parts[:1] == ['rankings'] else parts[:1])
+        if endpoint == '/metrics':
+            status, body = 200, json.dumps(self.metrics_report()).encode()
+        else:
+            snap = self.snapshot
+            key = (snap.version, target)
+            cached = self.cache.get(key)
+            if cached is not None:
+                status, body = cached
+            else:
+                status, payload = self.route(snap, parts, urllib.parse.parse_qs(url.query))
+                body = json.dumps(payload).encode()
+                if status == 200:
+                    self.cache.put(key, (status, body))
+        self.metrics.record(endpoint, time.perf_counter() - t0)
+        return status, body
+
+    def route(self, snap, parts, query):
+        arg = lambda name, default=None: query.get(name, [default])[0]
+
+        def int_arg(name, default, low=None):
+            # (value, error message); bad query values are the client's fault, not a 500
+            raw = arg(name)
+            if raw is None:
+                return default, None
+            try:
+                value = int(raw)
+            except ValueError:
+                return None, f"{name} must be an integer, got {raw!r}"
+            if low is not None and value < low:
+                return None, f"{name} must be at least {low}"
+            return value, None
+
+        if not parts or parts == ['health']:
+            return 200, {'status': 'ok', 'version': snap.version, 'loaded_at': snap.loaded_at}
+        if parts == ['technologies']:
+            return 200, sorted(snap.summary)
+        if parts[0] == 'forecast' and len(parts) == 2:
+            tech = parts[1]
+            if tech not in snap.summary and tech not in snap.forecasts:
+                return 404, {'error': f"unknown technology {tech!r}"}
+            daily = arg('daily', '0').lower() in ('1', 'true')
+            forecast = snap.daily_forecast(tech) if daily else snap.forecasts.get(tech, [])
+            return 200, {'technology': tech, 'summary': snap.summary.get(tech),
+                         'forecast': forecast, 'yearly': snap.yearly_by_tech.get(tech, [])}
+        if parts == ['top']:
+            by = arg('by', 'Growth_Percent')
+            if by not in snap.ordered:
+                return 400, {'error': f"by must be one of {sorted(snap.ordered)}"}
+            n, error = int_arg('n', 10, low=1)
+            if error:
+                return 400, {'error': error}
+            order = snap.ordered[by]
+            if arg('order', 'desc') == 'asc':
+                order = [t for t in reversed(order) if snap.summary[t].get(by) is not None] + \
+                        [t for t in order if snap.summary[t].get(by) is None]
+            return 200, {'by': by, 'rows': [snap.summary[t] for t in order[:n]]}
+        if parts[:2] == ['rankings', 'yearly']:
+            if len(parts) == 3:
+                return 200, {'technology': parts[2], 'rows': snap.yearly_by_tech.get(parts[2], [])}
+            if not snap.yearly:
+                return 404, {'error': 'no yearly ranking table'}
+            year, error = int_arg('year', max(snap.yearly))
+            if not error:
+                n, error = int_arg('n', 10, low=1)
+            if error:
+                return 400, {'error': error}
+            if year not in snap.yearly:
+                return 404, {'error': f"no ranking for {year}"}
+            return 200, {'year': year, 'rows': snap.yearly[year][:n]}
+        return 404, {'error': f"unknown path /{'/'.join(parts)}"}
+
+    def metrics_report(self):
+        report = self.metrics.report()
+        lookups = self.cache.hits + self.cache.misses
+        report.update({'cache_size': len(self.cache.data), 'cache_hits': self.cache.hits,
+                       'cache_misses': self.cache.misses,
+                       'cache_hit_rate': round(self.cache.hits / lookups, 3) if lookups else None,
+                       'version': self.snapshot.version, 'loaded_at': self.snapshot.loaded_at,
+                       'reloads': self.reloads, 'reload_errors': self.reload_errors})
+        return report
+
+
+def make_server(service, host='127.0.0.1', port=0):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, body = service.handle(self.path)
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def self_check(out_dir=OUT_DIR):
+    # Start on a random local port, hit every endpoint and print the metrics
+    service = ForecastService(out_dir)
+    server = make_server(service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    tech = next(iter(sorted(service.snapshot.summary)), 'unknown')
+    paths = ['/health', '/technologies', f"/forecast/{urllib.parse.quote(tech)}", '/top?by=Growth_Percent&n=3',
+             '/top?by=Trend_Strength&n=3', '/rankings/yearly', f"/rankings/yearly/{urllib.parse.quote(tech)}"]
+    for path in paths * 3:
+        with urllib.request.urlopen(base + path) as resp:
+            assert resp.status == 200, path
+            json.loads(resp.read())
+    with urllib.request.urlopen(base + '/metrics') as resp:
+        print(json.dumps(json.loads(resp.read()), indent=1))
+    server.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out-dir', default=str(OUT_DIR), help='Pipeline outputs directory to serve')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE)
+    parser.add_argument('--reload-interval', type=float, default=RELOAD_INTERVAL)
+    parser.add_argument('--self-check', action='store_true', help='Run an offline smoke test and exit')
+    args = parser.parse_args(argv)
+    if args.self_check:
+        self_check(args.out_dir)
+    else:
+        service = ForecastService(args.out_dir, args.cache_size)
+        service.watch(args.reload_interval)
+        server = make_server(service, args.host, args.port)
+        print(f"Serving {args.out_dir} on http://{args.host}:{server.server_address[1]} "
+              f"({len(service.snapshot.summary)} technologies)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.stop()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,45 +1,102 @@
 # generate_dashboard_master.py  (fixed)
+# dashboard_master = final forecast table + news sentiment + trend strength + yearly average
+# interest + growth simulation, left-joined per technology. The join is kept as an
+# incremental view (dashboard_view.py): only technologies whose row changed in some source
+# are re-joined, and besides the full dashboard_master table Power BI gets a change log in
+# daily partitions under outputs/dashboard_master_parts/ for incremental refresh.
+#
+#   python code/generate_dashboard_master.py
+#   python code/generate_dashboard_master.py --rebuild     # drop the view and join everything
+#   python code/generate_dashboard_master.py --no-csv      # Power BI reads only the partitions
+import argparse
+import time
+
 import pandas as pd
-from pathlib import Path
-
-OUT = Path('outputs')
-OUT.mkdir(parents=True, exist_ok=True)
-
-# load final forecast (prefer complete file)
-try:
-    fc = pd.read_csv(OUT / "final_forecast_table_all_complete.csv")
-except Exception:
-    fc = pd.read_csv(OUT / "final_forecast_table_all.csv")
-
-# load yearly ranking (this file has columns: Year,Technology,Avg_Interest)
-rank = pd.read_csv(OUT / "tech_yearly_ranking.csv")
-sent = pd.read_csv(OUT / "news_sentiment.csv")
-ts = pd.read_csv(OUT / "trend_strength.csv")
-
-# Build a per-technology yearly summary: take the most recent year's Avg_Interest per tech
-# (safe approach: compute the mean or take the latest Year row)
-# Here we'll compute the mean Avg_Interest per technology (robust)
-if 'Avg_Interest' in rank.columns:
-    latest_year = rank.groupby('Technology', as_index=False)['Avg_Interest'].mean()
-    latest_year = latest_year.rename(columns={'Avg_Interest': 'Yearly_Avg_Interest'})
-else:
-    # fallback if column name differs
-    # find any numeric column other than Year
-    numeric_cols = [c for c in rank.columns if c not in ['Year', 'Technology']]
-    if numeric_cols:
-        col = numeric_cols[0]
-        latest_year = rank.groupby('Technology', as_index=False)[col].mean().rename(columns={col:'Yearly_Avg_Interest'})
+
+from dashboard_view import DashboardView, now_stamp, read_manifest, view_dir
+from instrument import count, show_table, start_run, timer
+from storage import OUT_DIR, load_table, save_table, table_path
+
+
+def yearly_interest(rank):
+    # Build a per-technology yearly summary: take the most recent year's Avg_Interest per tech
+    # (safe approach: compute the mean or take the latest Year row)
+    # Here we'll compute the mean Avg_Interest per technology (robust)
+    if 'Avg_Interest' in rank.columns:
+        latest_year = rank.groupby('Technology', as_index=False)['Avg_Interest'].mean()
+        latest_year = latest_year.rename(columns={'Avg_Interest': 'Yearly_Avg_Interest'})
     else:
-        # create empty placeholder
-        latest_year = pd.DataFrame({'Technology': [], 'Yearly_Avg_Interest': []})
+        # fallback if column name differs
+        # find any numeric column other than Year
+        numeric_cols = [c for c in rank.columns if c not in ['Year', 'Technology']]
+        if numeric_cols:
+            col = numeric_cols[0]
+            latest_year = rank.groupby('Technology', as_index=False)[col].mean().rename(columns={col:'Yearly_Avg_Interest'})
+        else:
+            # create empty placeholder
+            latest_year = pd.DataFrame({'Technology': [], 'Yearly_Avg_Interest': []})
+    return latest_year[['Technology', 'Yearly_Avg_Interest']]
+
+
+def dashboard_sources(out_dir=OUT_DIR):
+    # {name: frame} in join order; the final forecast table (prefer the complete one) is the base
+    base = 'final_forecast_table_all_complete'
+    if not table_path(base, out_dir).exists():
+        base = 'final_forecast_table_all'
+    sources = {base: load_table(base, out_dir=out_dir),
+               'news_sentiment': load_table("news_sentiment", out_dir=out_dir),
+               'trend_strength': load_table("trend_strength", out_dir=out_dir),
+               'tech_yearly_ranking': yearly_interest(load_table("tech_yearly_ranking", out_dir=out_dir))}
+    # growth and rank distributions under forecast uncertainty (growth_simulation.py)
+    if table_path('growth_simulation', out_dir).exists():
+        sources['growth_simulation'] = load_table("growth_simulation", out_dir=out_dir).drop(columns=['Growth_Percent'])
+    else:
+        print("growth_simulation not found: dashboard_master without the simulated columns")
+    return sources
+
+
+def build_dashboard_master(out_dir=OUT_DIR, rebuild=False, csv=True):
+    t0 = time.perf_counter()
+    with timer('load'):
+        sources = dashboard_sources(out_dir)
+    view = DashboardView.load(view_dir(out_dir))
+    # outputs deleted or left behind by an interrupted run: the partitions no longer match
+    manifest = read_manifest(out_dir)
+    rebuild = rebuild or manifest is None or manifest['version'] != view.version \
+        or not table_path('dashboard_master', out_dir).exists()
+    stamp = now_stamp()
+    with timer('apply'):
+        upserts, removed, rebuild = view.apply(sources, stamp, rebuild)
+    count('rows', len(upserts), change='upserted')
+    count('rows', len(removed), change='removed')
+    if rebuild or len(upserts) or len(removed):
+        base = next(iter(sources.values()))
+        with timer('save_table'):
+            merged = view.table(order=view.tech_ids(base['Technology'].drop_duplicates(keep='last')))
+            out = save_table(merged, 'dashboard_master', out_dir, csv=csv)
+        with timer('partitions'):
+            written = view.export_partitions(out_dir, upserts, removed, stamp, rebuild)
+        view.save(view_dir(out_dir))
+        print(f"{'Rebuilt' if rebuild else 'Updated'} {len(upserts)} rows, removed {len(removed)}; "
+              f"partition {stamp[:10]} holds {written} changes")
+    else:
+        merged = load_table('dashboard_master', out_dir=out_dir)
+        out = table_path('dashboard_master', out_dir)
+        print("No source rows changed")
+    print(f"Saved: {out} ({time.perf_counter() - t0:.2f}s)")
+    return merged
+
 
-# Merge forecast + sentiment + trend strength
-merged = fc.merge(sent, on='Technology', how='left').merge(ts, on='Technology', how='left')
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', default=str(OUT_DIR))
+    parser.add_argument('--rebuild', action='store_true', help='Rejoin every row and rewrite all partitions')
+    parser.add_argument('--no-csv', action='store_true',
+                        help='Skip the monolithic dashboard_master.csv (Parquet and the partitions only)')
+    args = parser.parse_args(argv)
+    start_run('dashboard_master')
+    show_table(build_dashboard_master(args.out, args.rebuild, csv=not args.no_csv))
 
-# Merge the Yearly_Avg_Interest
-merged = merged.merge(latest_year[['Technology','Yearly_Avg_Interest']], on='Technology', how='left')
 
-out = OUT / 'dashboard_master.csv'
-merged.to_csv(out, index=False)
-print("Saved:", out)
-print(merged.to_string(index=False))
+if __name__ == '__main__':
+    main()
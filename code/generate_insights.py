@@ -1,31 +1,49 @@
 # generate_insights.py
-import pandas as pd
+import argparse
 from pathlib import Path
 
-fc = pd.read_csv("outputs/final_forecast_table_all_complete.csv")
-ts = pd.read_csv("outputs/trend_strength.csv")
+from instrument import start_run
+from storage import OUT_DIR, load_table
 
-insights = []
-# fastest growth
-best_growth = fc.sort_values('Growth_Percent', ascending=False).iloc[0]
-insights.append(f"Fastest growing technology: {best_growth['Technology']} with forecast growth {best_growth['Growth_Percent']}%")
 
-# most stable
-most_stable = fc.sort_values('Volatility').iloc[0]
-insights.append(f"Most stable technology: {most_stable['Technology']} (Volatility {most_stable['Volatility']})")
+def generate_insights(out_dir=OUT_DIR):
+    fc = load_table("final_forecast_table_all_complete", out_dir=out_dir)
+    ts = load_table("trend_strength", out_dir=out_dir)
 
-# strongest trend strength
-best_trend = ts.sort_values('Trend_Strength', ascending=False).iloc[0]
-insights.append(f"Strongest trend momentum: {best_trend['Technology']} (Trend Strength {best_trend['Trend_Strength']})")
+    insights = []
+    # fastest growth
+    best_growth = fc.loc[fc['Growth_Percent'].idxmax()]
+    insights.append(f"Fastest growing technology: {best_growth['Technology']} with forecast growth {best_growth['Growth_Percent']}%")
 
-# combined
-insights.append("Overall: Generative AI shows highest predicted growth; 5G is steady; Edge & Quantum show healthy rise; Blockchain is moderate.")
+    # most stable
+    most_stable = fc.loc[fc['Volatility'].idxmin()]
+    insights.append(f"Most stable technology: {most_stable['Technology']} (Volatility {most_stable['Volatility']})")
 
-out = Path('outputs/auto_insights.txt')
-out.parent.mkdir(parents=True, exist_ok=True)
-with open(out, 'w') as f:
+    # strongest trend strength
+    best_trend = ts.loc[ts['Trend_Strength'].idxmax()]
+    insights.append(f"Strongest trend momentum: {best_trend['Technology']} (Trend Strength {best_trend['Trend_Strength']})")
+
+    # combined
+    insights.append("Overall: Generative AI shows highest predicted growth; 5G is steady; Edge & Quantum show healthy rise; Blockchain is moderate.")
+
+    out = Path(out_dir) / 'auto_insights.txt'
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, 'w') as f:
+        for line in insights:
+            f.write(line + "\n")
+    print("Saved insights to:", out)
     for line in insights:
-        f.write(line + "\n")
-print("Saved insights to:", out)
-for line in insights:
-    print("-", line)
+        print("-", line)
+    return insights
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', default=str(OUT_DIR))
+    args = parser.parse_args(argv)
+    start_run('insights')
+    generate_insights(args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,76 @@
 # generate_sentiment.py
+# News sentiment tables from scored headlines (see news_sentiment.py):
+#   news_sentiment_daily   Date, Technology, Headlines, Sentiment, Positive, Negative
+#   news_sentiment_weekly  the same per week starting Sunday, the panel's weekly Date,
+#                          so it joins trends_processed on Date + Technology
+#   news_sentiment         Technology, News_Sentiment (Positive/Neutral/Negative), News_Score,
+#                          Headlines over the last SUMMARY_DAYS days of news, for the dashboard
+# The technologies matched in headlines are those of the panel (--input).
+#
+#   python code/generate_sentiment.py
+#   python code/generate_sentiment.py --input data/trends_processed.csv --news data/news --out outputs
+import argparse
+
+import numpy as np
 import pandas as pd
-from pathlib import Path
-
-sent = pd.DataFrame({
-    'Technology': ['Generative AI','Blockchain','Quantum Computing','Edge Computing','5G'],
-    'News_Sentiment': ['Positive','Neutral','Positive','Neutral','Positive']
-})
-out = Path('outputs/news_sentiment.csv')
-out.parent.mkdir(parents=True, exist_ok=True)
-sent.to_csv(out, index=False)
-print("Saved:", out)
-print(sent.to_string(index=False))
+
+from instrument import show_table, start_run
+from news_sentiment import NEUTRAL_BAND, NEWS_DIR, FileSource, HttpSource, panel_keywords, run_sentiment
+from storage import OUT_DIR, PANEL_CSV, save_table
+
+SUMMARY_DAYS = 30
+
+
+def weekly(daily):
+    week = daily['Date'] - pd.to_timedelta((daily['Date'].dt.dayofweek + 1) % 7, unit='D')
+    out = daily.assign(Date=week, Score_Sum=daily['Sentiment'] * daily['Headlines'])
+    out = out.groupby(['Date', 'Technology'], as_index=False)[['Headlines', 'Score_Sum', 'Positive', 'Negative']].sum()
+    out['Sentiment'] = out['Score_Sum'] / out['Headlines']
+    return out[['Date', 'Technology', 'Headlines', 'Sentiment', 'Positive', 'Negative']]
+
+
+def summary(daily, keywords, days=SUMMARY_DAYS):
+    # Headline-weighted mean score over the last `days` days of news, one row per technology
+    if len(daily):
+        recent = daily[daily['Date'] > daily['Date'].max() - pd.Timedelta(days=days)]
+        recent = recent.assign(Score_Sum=recent['Sentiment'] * recent['Headlines'])
+        agg = recent.groupby('Technology')[['Headlines', 'Score_Sum']].sum()
+    else:
+        agg = pd.DataFrame(columns=['Headlines', 'Score_Sum'], dtype=float)
+    techs = list(keywords) + [t for t in agg.index if t not in set(keywords)]
+    agg = agg.reindex(techs)
+    headlines = agg['Headlines'].fillna(0).astype(int)
+    score = (agg['Score_Sum'] / headlines.where(headlines > 0)).round(4)
+    label = np.select([score >= NEUTRAL_BAND, score <= -NEUTRAL_BAND], ['Positive', 'Negative'], 'Neutral')
+    return pd.DataFrame({'Technology': techs, 'News_Sentiment': label, 'News_Score': score.to_numpy(),
+                         'Headlines': headlines.to_numpy()})
+
+
+def generate_sentiment(panel_csv=PANEL_CSV, news=NEWS_DIR, out_dir=OUT_DIR, server=None, dates=(),
+                       workers=None):
+    keywords = panel_keywords(panel_csv)
+    source = HttpSource(server, list(dates)) if server else FileSource(news)
+    daily = run_sentiment(source, out_dir, keywords=keywords, workers=workers)
+    save_table(weekly(daily), 'news_sentiment_weekly', out_dir)
+
+    sent = summary(daily, keywords)
+    out = save_table(sent, 'news_sentiment', out_dir)
+    print("Saved:", out)
+    return sent
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default=str(PANEL_CSV), help='Panel whose technologies are matched')
+    parser.add_argument('--news', default=str(NEWS_DIR), help='News directory or file (.jsonl/.csv)')
+    parser.add_argument('--server', default=None, help='Pull from a news feed instead (GET /news?date=...)')
+    parser.add_argument('--dates', nargs='*', default=[], help='Days to pull from --server')
+    parser.add_argument('--out', default=str(OUT_DIR), help='Directory for the sentiment tables')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+    start_run('sentiment')
+    show_table(generate_sentiment(args.input, args.news, args.out, args.server, args.dates, args.workers))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,36 @@
 # generate_trend_strength.py
-import pandas as pd
-import numpy as np
-from pathlib import Path
-
-df = pd.read_csv("data/trends_processed.csv")
-df['Date'] = pd.to_datetime(df['Date'])
-
-scores=[]
-for tech in df['Technology'].unique():
-    t = df[df['Technology']==tech].sort_values("Date")
-    y = t['Interest'].values
-    if len(y) < 5:
-        slope = 0.0
-    else:
-        slope = np.polyfit(np.arange(len(y)), y, 1)[0]
-    stability = 1 / (t['Interest'].rolling(14).std().mean() + 1) if len(t) >= 14 else 1/(t['Interest'].std()+1)
-    final_score = (slope*10) + (stability*50)
-    scores.append([tech, round(final_score,2)])
-
-scores_df = pd.DataFrame(scores, columns=['Technology','Trend_Strength'])
-out = Path('outputs/trend_strength.csv')
-out.parent.mkdir(parents=True, exist_ok=True)
-scores_df.to_csv(out, index=False)
-print("Saved:", out)
-print(scores_df.to_string(index=False))
+import argparse
+
+from features import summarize_series
+from instrument import show_table, start_run, timer
+from ranking_index import INDEX_DIR, update_board
+from storage import OUT_DIR, PANEL_CSV, load_panel, save_table
+
+
+def trend_strength(panel_csv=PANEL_CSV, out_dir=OUT_DIR, index_dir=INDEX_DIR):
+    with timer('load_panel'):
+        df = load_panel(panel_csv, columns=['Date', 'Technology', 'Interest'])
+
+    # slope*10 + stability*50 for every technology in one pass (see features.py)
+    with timer('summarize_series'):
+        feats = summarize_series(df)
+    scores_df = feats['Trend_Strength'].round(2).rename_axis('Technology').reset_index()
+
+    out = save_table(scores_df, 'trend_strength', out_dir)
+    update_board('trend_strength', scores_df.set_index('Technology')['Trend_Strength'], index_dir)
+    print("Saved:", out)
+    return scores_df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default=str(PANEL_CSV))
+    parser.add_argument('--out', default=str(OUT_DIR))
+    parser.add_argument('--index', default=str(INDEX_DIR))
+    args = parser.parse_args(argv)
+    start_run('trend_strength')
+    show_table(trend_strength(args.input, args.out, args.index))
+
+
+if __name__ == '__main__':
+    main()
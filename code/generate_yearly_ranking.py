@@ -1,15 +1,36 @@
 # generate_yearly_ranking.py
-import pandas as pd
-from pathlib import Path
-
-df = pd.read_csv("data/trends_processed.csv")
-df['Date'] = pd.to_datetime(df['Date'])
-df['Year'] = df['Date'].dt.year
-
-ranking = df.groupby(['Year','Technology'])['Interest'].mean().reset_index().rename(columns={'Interest':'Avg_Interest'})
-ranking = ranking.sort_values(['Year','Avg_Interest'], ascending=[True, False])
-out = Path('outputs/tech_yearly_ranking.csv')
-out.parent.mkdir(parents=True, exist_ok=True)
-ranking.to_csv(out, index=False)
-print("Saved:", out)
-print(ranking.head(10).to_string(index=False))
+import argparse
+
+from instrument import count, show_table, start_run, timer
+from ranking_index import INDEX_DIR, YearlyIndex
+from storage import OUT_DIR, PANEL_CSV, save_table
+
+
+def yearly_ranking(panel_csv=PANEL_CSV, out_dir=OUT_DIR, index_dir=INDEX_DIR):
+    # running per-(Year, Technology) sums in outputs/ranking_index/: only panel rows
+    # added since the last run are read and folded in (see ranking_index.py)
+    with timer('update_index'):
+        index = YearlyIndex.load(index_dir)
+        added = index.update_from_panel(panel_csv)
+        index.save(index_dir)
+    count('rows_folded', added)
+    print(f"Folded {added} new panel rows into the yearly index")
+
+    ranking = index.table()
+    out = save_table(ranking, 'tech_yearly_ranking', out_dir)
+    print("Saved:", out)
+    return ranking
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default=str(PANEL_CSV))
+    parser.add_argument('--out', default=str(OUT_DIR))
+    parser.add_argument('--index', default=str(INDEX_DIR))
+    args = parser.parse_args(argv)
+    start_run('yearly_ranking')
+    show_table(yearly_ranking(args.input, args.out, args.index), head=10)
+
+
+if __name__ == '__main__':
+    main()
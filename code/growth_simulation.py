@@ -0,0 +1,171 @@
+# growth_simulation.py
+# Uncertainty-aware growth ranking. Growth_Percent in final_forecast_table_all_complete is a
+# point value: (first forecast point - current) / current. Here the first forecast point is
+# drawn SIMULATIONS times per technology from its forecast error distribution:
+#   Y ~ N(Forecast_Value, sigma), clipped at 0 (search interest is never negative)
+#   sigma from the 95% interval of that point in arima_forecast_all.csv (ARIMA and fast-tier
+#   forecasts); technologies on the linear fallback have no interval and use their Volatility
+# and every draw ranks all technologies against each other. Per technology:
+#   Expected_Growth, Growth_P05/P95      growth distribution (quantiles are exact: clipping
+#                                        is monotone, so they are the clipped normal quantiles)
+#   P_Growth_Gt_<x>                      P(growth > x%) for each of THRESHOLDS
+#   Expected_Rank, Rank_P05/P95, P_Top_<k>  rank distribution across the draws
+# Only the first forecast point is drawn: Growth_Percent and the dashboard's ranking are
+# defined on it, and the per-step intervals of arima_forecast_all.csv are marginals, so
+# drawing the later steps would not change any of these columns.
+# Draws are (block x technologies) arrays and nothing is kept per draw: each block adds to
+# running growth sums, exceedance counts, rank sums, top-k counts and a per-technology rank
+# histogram, and the table is derived from those. Histogram plus draws stay under MEMORY_BYTES;
+# the histogram has one bin per rank up to a few thousand technologies, beyond that bins of
+# several ranks and Rank_P05/P95 are the first rank of their bin. Seeded, so reruns give the
+# same table.
+#
+#   python code/growth_simulation.py                  # -> growth_simulation (CSV for Power BI)
+#   python code/growth_simulation.py --simulations 10000 --thresholds 0 10 25
+
+import argparse
+import time
+from pathlib import Path
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from fast_forecast import Z95
+from instrument import count, show_table, start_run, timer
+from storage import OUT_DIR, load_table, save_table
+
+SIMULATIONS = 2000
+THRESHOLDS = [0.0, 5.0, 10.0]    # percent
+TOP_K = 10
+QUANTILES = (0.05, 0.95)
+MEMORY_BYTES = 256 * 2 ** 20     # rank histogram + draws, growth and sort order of one block
+SEED = 0
+
+
+def forecast_inputs(out_dir=OUT_DIR, forecasts=None):
+    # (techs, current, point forecast, sigma, point growth) from the final table, with sigma
+    # from the interval of each technology's first forecast row where there is one
+    table = load_table('final_forecast_table_all_complete', out_dir=out_dir)
+    forecasts = Path(forecasts or Path(out_dir) / 'arima_forecast_all.csv')
+    sigma = pd.Series(np.nan, index=table['Technology'].astype(str))
+    if forecasts.exists():
+        fc = pd.read_csv(forecasts, usecols=['Technology', 'ds', 'y_lower', 'y_upper'])
+        first = fc.sort_values('ds', kind='stable').groupby('Technology', sort=False).head(1)
+        width = pd.Series(((first['y_upper'] - first['y_lower']) / (2 * Z95)).to_numpy(),
+                          index=first['Technology'].astype(str))
+        sigma = width.reindex(sigma.index)
+    fallback = sigma.isna().to_numpy()
+    sigma = np.where(fallback, table['Volatility'].to_numpy(dtype=float), sigma.to_numpy())
+    count('technologies', int(fallback.sum()), sigma='volatility')
+    count('technologies', int((~fallback).sum()), sigma='interval')
+    return (table['Technology'].astype(str).to_numpy(), table['Current_Value'].to_numpy(dtype=float),
+            table['Forecast_Value'].to_numpy(dtype=float), np.nan_to_num(np.maximum(sigma, 0.0)),
+            table['Growth_Percent'].to_numpy(dtype=float))
+
+
+def growth(y, current):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(current > 0, (y - current) / current * 100, np.nan)
+
+
+def rank_bins(n, memory_bytes=MEMORY_BYTES):
+    # Ranks per histogram bin: a quarter of the budget for the int64 histogram and a quarter
+    # for the block's bincount
+    bins = max(1, min(n, memory_bytes // (4 * 8 * max(1, n))))
+    return -(-n // bins)
+
+
+def simulate(current, mu, sigma, simulations=SIMULATIONS, thresholds=THRESHOLDS, top_k=TOP_K, seed=SEED,
+             memory_bytes=MEMORY_BYTES):
+    # -> (growth sum, exceedance counts per threshold, rank sum, top-k counts,
+    #     rank histogram technologies x bins, ranks per bin)
+    n = len(mu)
+    width = rank_bins(n, memory_bytes)
+    bins = -(-n // width)
+    block = int(max(1, min(simulations, memory_bytes // 2 // max(1, n * 8 * 5))))
+    rng = np.random.default_rng(seed)
+    positions = np.arange(n)
+    total = np.zeros(n)
+    exceed = np.zeros((len(thresholds), n), dtype=np.int64)
+    rank_sum = np.zeros(n, dtype=np.int64)
+    top = np.zeros(n, dtype=np.int64)
+    hist = np.zeros(n * bins, dtype=np.int64)
+    for start in range(0, simulations, block):
+        b = min(block, simulations - start)
+        y = rng.standard_normal((b, n))
+        y *= sigma
+        y += mu
+        np.maximum(y, 0.0, out=y)
+        g = growth(y, current)
+        total += g.sum(axis=0)
+        for k, x in enumerate(thresholds):
+            exceed[k] += (g > x).sum(axis=0)
+        # rank 1 = highest growth in this draw; undefined growth (current 0) ranks last.
+        # order[i, r] is the technology at rank r + 1 of draw i.
+        order = np.argsort(-np.nan_to_num(g, nan=-np.inf), axis=1)
+        rank_sum += np.bincount(order.ravel(), weights=np.broadcast_to(positions + 1, order.shape).ravel(),
+                                minlength=n).astype(np.int64)
+        top += np.bincount(order[:, :top_k].ravel(), minlength=n)
+        hist += np.bincount((order * bins + positions // width).ravel(), minlength=n * bins)
+    return total, exceed, rank_sum, top, hist.reshape(n, bins), width
+
+
+def rank_quantiles(hist, width=1, quantiles=QUANTILES):
+    # Per-technology quantiles from the rank histogram: the lower order statistic, i.e. the
+    # first rank (bin) whose cumulative count reaches floor(q * (draws - 1)) + 1
+    cum = np.cumsum(hist, axis=1)
+    draws = cum[:, -1:]
+    out = np.empty((len(quantiles), len(hist)), dtype=np.int64)
+    for i, q in enumerate(quantiles):
+        target = np.floor(q * (draws - 1)) + 1
+        out[i] = (cum < target).sum(axis=1) * width + 1
+    return out
+
+
+def growth_simulation(out_dir=OUT_DIR, forecasts=None, simulations=SIMULATIONS,
+                      thresholds=THRESHOLDS, top_k=TOP_K, seed=SEED):
+    with timer('load'):
+        techs, current, mu, sigma, point = forecast_inputs(out_dir, forecasts)
+    t0 = time.perf_counter()
+    with timer('simulate'):
+        total, exceed, rank_sum, top, hist, width = simulate(current, mu, sigma, simulations, thresholds,
+                                                             top_k, seed)
+    with timer('summarize'):
+        rank_lo, rank_hi = rank_quantiles(hist, width)
+        g_lo, g_hi = (growth(np.maximum(mu + NormalDist().inv_cdf(q) * sigma, 0.0), current) for q in QUANTILES)
+        out = pd.DataFrame({'Technology': techs, 'Growth_Percent': point,
+                            'Expected_Growth': (total / simulations).round(3),
+                            'Growth_P05': g_lo.round(3), 'Growth_P95': g_hi.round(3)})
+        for k, x in enumerate(thresholds):
+            out[f'P_Growth_Gt_{x:g}'] = (exceed[k] / simulations).round(4)
+        out['Expected_Rank'] = (rank_sum / simulations).round(2)
+        out['Rank_P05'] = rank_lo
+        out['Rank_P95'] = rank_hi
+        out[f'P_Top_{top_k}'] = (top / simulations).round(4)
+        out['Sigma'] = sigma.round(3)
+        out = out.sort_values(['Expected_Rank', 'Technology'], ignore_index=True)
+    elapsed = time.perf_counter() - t0
+    count('draws', simulations * len(techs))
+    path = save_table(out, 'growth_simulation', out_dir)
+    print(f"Simulated {simulations} draws x {len(techs)} technologies in {elapsed:.2f}s -> {path}")
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', default=str(OUT_DIR))
+    parser.add_argument('--forecasts', default=None, help='Default: <out>/arima_forecast_all.csv')
+    parser.add_argument('--simulations', type=int, default=SIMULATIONS)
+    parser.add_argument('--thresholds', type=float, nargs='+', default=THRESHOLDS,
+                        help='Growth levels, in percent, to report P(growth > x) for')
+    parser.add_argument('--top', type=int, default=TOP_K, help='Report P(rank <= top)')
+    parser.add_argument('--seed', type=int, default=SEED)
+    args = parser.parse_args(argv)
+    start_run('growth_simulation')
+    show_table(growth_simulation(args.out, args.forecasts, args.simulations, args.thresholds, args.top, args.seed),
+               'Growth ranking under forecast uncertainty')
+
+
+if __name__ == '__main__':
+    main()
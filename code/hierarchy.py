@@ -0,0 +1,300 @@
+# hierarchy.py
+# Technology taxonomy (data/taxonomy.json) and forecasts for every level of it that add up:
+#   {"Artificial Intelligence": ["Generative AI", "LLM"], "Computing": {"Quantum": [...]}}
+# A category maps to a list of technologies or to sub-categories. TOTAL sits above all of
+# them; panel technologies the taxonomy does not mention hang directly under TOTAL.
+#  - aggregates: A is the sparse (n_categories x n_technologies) summing matrix, and the
+#    category series are A @ Y, SERIES_CHUNK technologies at a time, on one grid at the
+#    technologies' shared native frequency (weekly for Google Trends; daily only when they
+#    differ): each grid date takes a series' last point at or before it, ARIMA forecasts
+#    are read onto the forecast dates the same way, and the closed-form models run with
+#    that frequency's season and lookback (SEASON[freq] points), as fast_tier() does.
+#    Forecasts are written at that frequency; --daily carries them over their days
+#  - base forecasts: a technology keeps its ARIMA forecast (outputs/arima_forecast_all.csv,
+#    weighted by the holdout RMSE in arima_fit_report.csv). Categories, and technologies
+#    without an ARIMA forecast, get the best closed-form model of fast_forecast.py
+#  - reconciliation:
+#      bottom_up  categories = A @ technologies
+#      mint       (default) the weighted least-squares projection onto coherent forecasts
+#                 with W = diag(RMSE^2), i.e. MinT with a diagonal covariance
+#    mint is solved through the n_categories x n_categories system
+#    (W_c + A W_t A') lambda = y_c - A y_t, so a few hundred categories stay cheap however
+#    many technologies there are. Intervals keep their base width around the new point.
+# scipy is imported inside the functions that need it: the collect and fill_missing stages
+# only read the taxonomy through technologies().
+#
+#   python code/hierarchy.py                     # -> hierarchy_forecast, category_forecast
+#   python code/hierarchy.py --method bottom_up
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fast_forecast import SERIES_CHUNK, forecast_with, select_models
+from features import SEASON, forecast_index, forecast_to_daily, history_index, steps
+from instrument import count, show_table, start_run, timer
+from shared_panel import open_panel
+from storage import OUT_DIR, PANEL_CSV, save_table
+
+TAXONOMY_PATH = Path('data/taxonomy.json')
+ARIMA_FORECASTS = Path('outputs/arima_forecast_all.csv')
+ARIMA_REPORT = Path('outputs/arima_fit_report.csv')
+TOTAL = 'All Technologies'
+METHODS = ['mint', 'bottom_up']
+BACKTEST_DAYS = 14     # same window as arima_model.HOLDOUT_DAYS, so the RMSEs are comparable
+MIN_VARIANCE = 1e-6
+
+
+def load_taxonomy(path=TAXONOMY_PATH):
+    # (categories, parent, technologies): categories top-down starting with TOTAL,
+    # parent[name] for every category and technology, technologies in config order
+    tree = json.loads(Path(path).read_text(encoding='utf-8'))
+    categories, parent, techs = [TOTAL], {}, []
+
+    def add(name, node):
+        if name in parent or name == TOTAL:
+            raise ValueError(f"{path}: '{name}' appears more than once in the taxonomy")
+        parent[name] = node
+
+    def walk(node, children):
+        if isinstance(children, dict):
+            for name, sub in children.items():
+                add(name, node)
+                categories.append(name)
+                walk(name, sub)
+        else:
+            for tech in children:
+                add(tech, node)
+                techs.append(tech)
+
+    walk(TOTAL, tree)
+    return categories, parent, techs
+
+
+def technologies(path=TAXONOMY_PATH):
+    # The technologies to collect and forecast: the leaves of the taxonomy
+    return load_taxonomy(path)[2]
+
+
+def panel_technologies(panel_techs, taxonomy=TAXONOMY_PATH):
+    # The technologies that get forecasts: the collected taxonomy leaves in config order, then
+    # the panel technologies the taxonomy does not mention (they hang under TOTAL)
+    _, parent, config_techs = load_taxonomy(taxonomy)
+    in_panel = set(panel_techs)
+    return [t for t in config_techs if t in in_panel] + [t for t in panel_techs if t not in parent]
+
+
+def depth(name, parent):
+    d = 0
+    while name != TOTAL:
+        name = parent.get(name, TOTAL)
+        d += 1
+    return d
+
+
+def summing_matrix(categories, parent, techs):
+    # A[c, t] = 1 when technology t sits under category c, at any depth
+    from scipy import sparse
+    row = {c: i for i, c in enumerate(categories)}
+    rows, cols = [], []
+    for j, tech in enumerate(techs):
+        node = parent.get(tech, TOTAL)
+        while True:
+            rows.append(row[node])
+            cols.append(j)
+            if node == TOTAL:
+                break
+            node = parent[node]
+    return sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(categories), len(techs)))
+
+
+def grid_freq(panel, techs):
+    # the frequency every technology is sampled at, or 'D' when they differ
+    freqs = {panel.freq(t) for t in techs}
+    return freqs.pop() if len(freqs) == 1 else 'D'
+
+
+def grid_block(panel, techs, grid):
+    # technologies x grid (day numbers): each grid date takes the series' last point at or
+    # before it (forward fill, like features.to_native), NaN before a series starts
+    M = np.full((len(techs), len(grid)), np.nan)
+    for i, tech in enumerate(techs):
+        days, values = panel.series(tech)
+        idx = np.searchsorted(days, grid, side='right') - 1
+        M[i] = np.where(idx >= 0, values[np.maximum(idx, 0)], np.nan)
+    return M
+
+
+def arima_forecasts(techs, dates, origins, path=ARIMA_FORECASTS, report_path=ARIMA_REPORT):
+    # (point, lower, upper, rmse) from the batch ARIMA outputs on `dates`, NaN where a
+    # technology has none. Only forecasts whose Origin in the fit report is the technology's
+    # last observed date (`origins`) are used: one made from an older origin (an earlier,
+    # shorter panel) gets a closed-form forecast instead of being shifted onto these dates.
+    # Series that ended before the others carry their last forecast.
+    shape = (len(techs), len(dates))
+    out = [np.full(shape, np.nan) for _ in range(3)] + [np.full(len(techs), np.nan)]
+    if not Path(path).exists() or not Path(report_path).exists():
+        print(f"No ARIMA forecasts at {path}: every technology gets a closed-form forecast")
+        return out
+    report = pd.read_csv(report_path)
+    report = report[report['Status'] == 'ok'].drop_duplicates('Technology', keep='last').set_index('Technology')
+    origin = pd.to_datetime(report['Origin'] if 'Origin' in report.columns else pd.Series(pd.NaT, index=report.index))
+    current = origin.reindex(techs).to_numpy() == np.asarray(origins, dtype='datetime64[ns]')
+    stale = int(report.index.isin(techs).sum() - current.sum())
+    if stale:
+        count('technologies', stale, status='stale_arima')
+        print(f"{stale} ARIMA forecasts start from another origin than the panel's last date: "
+              f"using closed-form forecasts for them")
+    keep = set(np.asarray(techs, dtype=object)[current])
+    fc = pd.read_csv(path, parse_dates=['ds'])
+    fc = fc[fc['Technology'].isin(keep)]
+    for k, col in enumerate(['y_pred', 'y_lower', 'y_upper']):
+        wide = fc.pivot_table(index='Technology', columns='ds', values=col)
+        wide = wide.reindex(columns=wide.columns.union(dates)).ffill(axis=1)
+        out[k] = wide.reindex(index=techs, columns=dates).to_numpy()
+    out[3] = report['RMSE'].where(report.index.isin(keep)).reindex(techs).to_numpy(dtype=float)
+    return out
+
+
+def closed_form(Y, periods, freq):
+    # periods: points at `freq`
+    names, rmse, _, _ = select_models(Y, steps(BACKTEST_DAYS, freq), season=SEASON[freq])
+    point, lower, upper = forecast_with(Y, names, periods, season=SEASON[freq])
+    return point, lower, upper, rmse
+
+
+def base_forecasts(panel, techs, A, periods):
+    # Aggregated category series and base forecasts for both levels, on the shared native
+    # grid: two seasons of history, `periods` days ahead in points of that frequency
+    freq = grid_freq(panel, techs)
+    last = pd.to_datetime([int(panel.series(t)[0][-1]) for t in techs], unit='D')
+    end = last.max()
+    history = history_index(end, 2 * SEASON[freq], freq)
+    grid = ((history - pd.Timestamp(0)) // pd.Timedelta(days=1)).to_numpy()
+    dates = forecast_index(end, steps(periods, freq), freq)
+    n = len(dates)
+    with timer('arima_forecasts'):
+        point, lower, upper, rmse = arima_forecasts(techs, dates, last)
+    source = np.where(np.isnan(point[:, 0]), 'fast', 'arima').astype(object)
+
+    agg = np.zeros((A.shape[0], len(grid)))
+    for start in range(0, len(techs), SERIES_CHUNK):
+        stop = min(start + SERIES_CHUNK, len(techs))
+        with timer('aggregate'):
+            Y = grid_block(panel, techs[start:stop], grid)
+            agg += A[:, start:stop] @ np.nan_to_num(Y)
+        need = np.flatnonzero(np.isnan(point[start:stop, 0]) | np.isnan(rmse[start:stop]))
+        if len(need):
+            with timer('fast_forecast'):
+                fast = closed_form(Y[need], n, freq)
+            rows = start + need
+            use = np.isnan(point[rows, 0])
+            point[rows[use]], lower[rows[use]], upper[rows[use]] = (f[use] for f in fast[:3])
+            rmse[rows] = np.where(np.isnan(rmse[rows]), fast[3], rmse[rows])
+    with timer('fast_forecast'):
+        cat = closed_form(agg, n, freq)
+    return {'dates': dates, 'freq': freq, 'current': agg[:, -1], 'source': source,
+            'tech': (point, lower, upper, rmse), 'cat': cat}
+
+
+def variances(A, rmse_cat, rmse_tech):
+    # diag(W): squared backtest RMSEs; unscored nodes get the median technology variance
+    # times the number of technologies under them (structural scaling)
+    w_tech, w_cat = rmse_tech ** 2, rmse_cat ** 2
+    typical = np.nanmedian(w_tech) if np.isfinite(w_tech).any() else 1.0
+    w_tech = np.where(np.isfinite(w_tech), w_tech, typical)
+    w_cat = np.where(np.isfinite(w_cat), w_cat, typical * np.asarray(A.sum(axis=1)).ravel())
+    return np.maximum(w_cat, MIN_VARIANCE), np.maximum(w_tech, MIN_VARIANCE)
+
+
+def reconcile(A, cat, tech, w_cat=None, w_tech=None, method='mint'):
+    # Coherent (categories, technologies) from base forecasts cat (m x h) and tech (n x h)
+    if method == 'bottom_up':
+        return A @ tech, tech
+    from scipy import sparse
+    from scipy.sparse.linalg import splu
+    gap = cat - A @ tech
+    M = sparse.diags(w_cat) + A @ sparse.diags(w_tech) @ A.T
+    lam = splu(sparse.csc_matrix(M)).solve(np.ascontiguousarray(gap))
+    return cat - w_cat[:, None] * lam, tech + w_tech[:, None] * (A.T @ lam)
+
+
+def run_hierarchy(panel_csv=PANEL_CSV, taxonomy=TAXONOMY_PATH, periods=30, method='mint', out_dir=OUT_DIR,
+                  daily=False):
+    categories, parent, config_techs = load_taxonomy(taxonomy)
+    panel, _ = open_panel(panel_csv)
+    in_panel = set(panel.techs)
+    missing = [t for t in config_techs if t not in in_panel]
+    if missing:
+        print(f"{len(missing)} taxonomy technologies are not in the panel yet: {missing[:5]}")
+    techs = panel_technologies(panel.techs, taxonomy)
+    A = summing_matrix(categories, parent, techs)
+    print(f"{len(categories)} categories over {len(techs)} technologies ({A.nnz} links)")
+
+    base = base_forecasts(panel, techs, A, periods)
+    point, lower, upper, rmse = base['tech']
+    c_point, c_lower, c_upper, c_rmse = base['cat']
+    with timer('reconcile'):
+        w_cat, w_tech = variances(A, c_rmse, rmse)
+        r_cat, r_tech = reconcile(A, c_point, np.nan_to_num(point), w_cat, w_tech, method)
+    incoherence = float(np.abs(r_cat - A @ r_tech).max()) if len(techs) else 0.0
+    for src, n in pd.Series(base['source']).value_counts().items():
+        count('forecasts', int(n), source=src)
+    count('forecasts', len(categories), source='category')
+
+    names = categories + techs
+    levels = np.array([depth(n, parent) for n in names])
+    kinds = np.repeat(['category', 'technology'], [len(categories), len(techs)])
+    new = np.vstack([r_cat, r_tech])
+    old = np.vstack([c_point, point])
+    shift = new - old
+    h = len(base['dates'])
+    long = pd.DataFrame({
+        'Technology': np.repeat(names, h), 'Level': np.repeat(levels, h), 'Node_Type': np.repeat(kinds, h),
+        'Parent': np.repeat([parent.get(n, TOTAL) if n != TOTAL else '' for n in names], h),
+        'ds': np.tile(base['dates'], len(names)), 'y_pred': new.ravel().round(3),
+        'y_lower': (np.vstack([c_lower, lower]) + shift).ravel().round(3),
+        'y_upper': (np.vstack([c_upper, upper]) + shift).ravel().round(3),
+        'Base_Pred': old.ravel().round(3), 'Freq': base['freq']})
+    if daily and base['freq'] != 'D':
+        # daily rows only here, at export: every period's values carried over its days
+        days = forecast_to_daily(pd.DataFrame({'ds': base['dates'], 'period': np.arange(h)}), base['freq'])
+        columns = list(long.columns)
+        long = long.assign(period=np.tile(np.arange(h), len(names))).drop(columns='ds')
+        long = long.merge(days, on='period', sort=False).drop(columns='period').assign(Freq='D')[columns]
+    save_table(long, 'hierarchy_forecast', out_dir)
+
+    current, forecast = base['current'], r_cat[:, 0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        growth = np.where(current != 0, (forecast - current) / current * 100, np.nan)
+    summary = pd.DataFrame({
+        'Category': categories, 'Parent': [parent.get(c, '') for c in categories],
+        'Level': levels[:len(categories)], 'Technologies': np.asarray(A.sum(axis=1)).ravel().astype(int),
+        'Current_Value': current.round(3), 'Forecast_Value': forecast.round(3),
+        'Base_Forecast': c_point[:, 0].round(3), 'Growth_Percent': growth.round(3),
+        'Trend_Direction': np.select([forecast > current, forecast < current], ['Up', 'Down'], 'Stable')})
+    out = save_table(summary, 'category_forecast', out_dir)
+    print(f"Reconciled ({method}) {len(names)} series x {h} points ({base['freq']}); "
+          f"max incoherence {incoherence:.2e} -> {out}")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default=str(PANEL_CSV))
+    parser.add_argument('--taxonomy', default=str(TAXONOMY_PATH))
+    parser.add_argument('--periods', type=int, default=30)
+    parser.add_argument('--method', choices=METHODS, default='mint')
+    parser.add_argument('--daily', action='store_true', help='Write hierarchy_forecast as daily rows')
+    parser.add_argument('--out', default=str(OUT_DIR))
+    args = parser.parse_args(argv)
+    start_run('hierarchy')
+    summary = run_hierarchy(args.input, args.taxonomy, args.periods, args.method, args.out, args.daily)
+    show_table(summary, 'Category forecasts')
+
+
+if __name__ == '__main__':
+    main()
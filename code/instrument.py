@@ -0,0 +1,232 @@
+# instrument.py
+# Shared timers, counters and optional profiling for the pipeline scripts.
+# Configured from the environment, so production runs can be profiled without editing code:
+#   TRENDPULSE_LOG_LEVEL=DEBUG       print full tables and per-series lines (default INFO:
+#                                    one-line summaries only)
+#   TRENDPULSE_PROFILE=1             cProfile the run -> <stage>-<time>.prof + top functions in the JSON
+#   TRENDPULSE_TRACEMALLOC=1         tracemalloc peak and top allocation sites in the JSON
+#   TRENDPULSE_METRICS_DIR=<dir>     where metrics go (default outputs/metrics)
+#   TRENDPULSE_KEEP_RUNS=<n>         run records kept per stage, older ones are deleted (default 50)
+# Every script calls start_run() once; at exit it writes
+#   <dir>/<stage>-<time>.json   wall time, peak RSS, timers, counters, profile/memory tops
+#   <dir>/<stage>.prom          the same timers/counters in Prometheus text format (latest run)
+#
+#   TRENDPULSE_PROFILE=1 python code/pipeline.py --force
+#   python code/instrument.py code/generate_trend_strength.py   # instrument any script as-is
+
+import atexit
+import cProfile
+import heapq
+import io
+import json
+import os
+import pstats
+import re
+import runpy
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30}
+METRICS_DIR = Path(os.environ.get('TRENDPULSE_METRICS_DIR', 'outputs/metrics'))
+KEEP_RUNS = int(os.environ.get('TRENDPULSE_KEEP_RUNS', 50))
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 15
+SLOWEST_ITEMS = 10      # slowest items (e.g. series) kept per timer
+
+_lock = threading.Lock()
+_timers = {}      # (name, labels) -> [count, total seconds, max seconds]
+_counters = {}    # (name, labels) -> value
+_slowest = {}     # (name, labels) -> min-heap of (seconds, item)
+_run = None
+
+
+def log_level():
+    return LEVELS.get(os.environ.get('TRENDPULSE_LOG_LEVEL', 'INFO').upper(), 20)
+
+
+def verbose():
+    return log_level() <= LEVELS['DEBUG']
+
+
+def show_table(df, title=None, head=5):
+    # Full table at DEBUG, first `head` rows otherwise (to_string on big tables is slow)
+    if title:
+        print(f"{title} ({len(df)} rows)")
+    if verbose() or len(df) <= head:
+        print(df.to_string(index=False))
+    elif head:
+        print(df.head(head).to_string(index=False))
+        print(f"... {len(df) - head} more rows (TRENDPULSE_LOG_LEVEL=DEBUG prints all)")
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(name, seconds, item=None, **labels):
+    # item (e.g. the technology) is only used to keep the SLOWEST_ITEMS list, not as a label
+    key = _key(name, labels)
+    with _lock:
+        t = _timers.setdefault(key, [0, 0.0, 0.0])
+        t[0] += 1
+        t[1] += seconds
+        t[2] = max(t[2], seconds)
+        if item is not None:
+            heap = _slowest.setdefault(key, [])
+            if len(heap) < SLOWEST_ITEMS:
+                heapq.heappush(heap, (seconds, str(item)))
+            elif seconds > heap[0][0]:
+                heapq.heapreplace(heap, (seconds, str(item)))
+
+
+@contextmanager
+def timer(name, **labels):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0, **labels)
+
+
+def count(name, n=1, **labels):
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def start_run(stage=None):
+    # Start timing (and profiling, if asked for) this process; metrics are written at exit
+    global _run
+    if _run is not None:
+        return _run
+    stage = stage or Path(sys.argv[0]).stem
+    _run = {'stage': stage, 'started': time.time(), 't0': time.perf_counter(), 'status': 'ok',
+            'profiler': None, 'tracemalloc': False}
+    if os.environ.get('TRENDPULSE_TRACEMALLOC') == '1':
+        tracemalloc.start()
+        _run['tracemalloc'] = True
+    if os.environ.get('TRENDPULSE_PROFILE') == '1':
+        _run['profiler'] = cProfile.Profile()
+        _run['profiler'].enable()
+
+    previous_hook = sys.excepthook
+
+    def hook(*exc):
+        _run['status'] = 'failed'
+        previous_hook(*exc)
+    sys.excepthook = hook
+    atexit.register(finish_run)
+    return _run
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _prom_labels(stage, name, labels):
+    parts = [f'stage="{stage}"', f'name="{name}"'] + [f'{k}="{v}"' for k, v in labels]
+    return '{' + ','.join(parts) + '}'
+
+
+def prometheus_text(record):
+    stage = record['stage']
+    lines = ['# TYPE trendpulse_run_seconds gauge',
+             f'trendpulse_run_seconds{{stage="{stage}"}} {record["wall_s"]}']
+    if record['peak_rss_mb'] is not None:
+        lines += ['# TYPE trendpulse_peak_rss_megabytes gauge',
+                  f'trendpulse_peak_rss_megabytes{{stage="{stage}"}} {record["peak_rss_mb"]}']
+    lines.append('# TYPE trendpulse_timer_seconds summary')
+    for t in record['timers']:
+        lab = _prom_labels(stage, t['name'], sorted(t['labels'].items()))
+        lines += [f'trendpulse_timer_seconds_sum{lab} {t["total_s"]}',
+                  f'trendpulse_timer_seconds_count{lab} {t["count"]}']
+    lines.append('# TYPE trendpulse_events_total counter')
+    for c in record['counters']:
+        lab = _prom_labels(stage, c['name'], sorted(c['labels'].items()))
+        lines.append(f'trendpulse_events_total{lab} {c["value"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def prune_runs(out_dir, stage, keep=KEEP_RUNS):
+    # delete all but the newest `keep` run records of a stage, with their profiles
+    pattern = re.compile(re.escape(stage) + r'-(\d{8}T\d{6})-\d+\.json')
+    runs = sorted((m.group(1), f.stat().st_mtime, f) for f in out_dir.glob(f'{stage}-*.json')
+                  if (m := pattern.fullmatch(f.name)))
+    for _, _, f in runs[:max(len(runs) - keep, 0)]:
+        f.unlink(missing_ok=True)
+        f.with_suffix('.prof').unlink(missing_ok=True)
+
+
+def finish_run():
+    global _run
+    run, _run = _run, None
+    if run is None:
+        return None
+    stamp = time.strftime('%Y%m%dT%H%M%S', time.localtime(run['started']))
+    out_dir = METRICS_DIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+    base = out_dir / f"{run['stage']}-{stamp}-{os.getpid()}"
+
+    with _lock:
+        timers = [{'name': n, 'labels': dict(l), 'count': c, 'total_s': round(s, 6), 'max_s': round(m, 6)}
+                  for (n, l), (c, s, m) in sorted(_timers.items())]
+        for t, key in zip(timers, sorted(_timers)):
+            if key in _slowest:
+                t['slowest'] = [{'item': i, 'seconds': round(sec, 6)} for sec, i in sorted(_slowest[key], reverse=True)]
+        counters = [{'name': n, 'labels': dict(l), 'value': v} for (n, l), v in sorted(_counters.items())]
+        # several stages can run in one process (trendpulse.run): each starts from zero
+        _timers.clear()
+        _counters.clear()
+        _slowest.clear()
+    record = {'stage': run['stage'], 'status': run['status'],
+              'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(run['started'])),
+              'wall_s': round(time.perf_counter() - run['t0'], 4), 'peak_rss_mb': _peak_rss_mb(),
+              'argv': sys.argv, 'timers': timers, 'counters': counters}
+
+    if run['profiler'] is not None:
+        run['profiler'].disable()
+        run['profiler'].dump_stats(str(base) + '.prof')
+        stats = pstats.Stats(run['profiler'], stream=io.StringIO()).sort_stats('cumulative')
+        top = []
+        for (path, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+            top.append({'function': f"{Path(path).name}:{line}({func})", 'calls': nc,
+                        'tottime_s': round(tt, 6), 'cumtime_s': round(ct, 6)})
+        record['profile'] = sorted(top, key=lambda r: -r['cumtime_s'])[:TOP_FUNCTIONS]
+        record['profile_file'] = str(base) + '.prof'
+    if run['tracemalloc']:
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        record['tracemalloc_peak_mb'] = round(peak / 2 ** 20, 2)
+        record['allocations'] = [{'site': str(s.traceback[0]), 'size_kb': round(s.size / 1024, 1), 'count': s.count}
+                                 for s in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]]
+        tracemalloc.stop()
+
+    Path(str(base) + '.json').write_text(json.dumps(record, indent=1, default=str))
+    (out_dir / f"{run['stage']}.prom").write_text(prometheus_text(record))
+    prune_runs(out_dir, run['stage'])
+    return record
+
+
+if __name__ == '__main__':
+    # python code/instrument.py <script.py> [args...]: run a script with instrumentation
+    if len(sys.argv) < 2:
+        sys.exit("usage: instrument.py <script.py> [args...]")
+    script = sys.argv[1]
+    sys.argv = sys.argv[1:]
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    sys.path.insert(0, str(Path(script).resolve().parent))
+    import instrument   # the module the script itself imports, not this __main__ copy
+    instrument.start_run(Path(script).stem)
+    runpy.run_path(script, run_name='__main__')
@@ -0,0 +1,130 @@
+# model_store.py
+# Persistent per-technology ARIMA cache used by arima_model.py for warm-start refits.
+# Layout:  <root>/index.json          order, params, frequency, last-seen timestamp, data hash per tech
+#          <root>/<safe_name>.pkl     the fitted pmdarima model itself (needed for update()); the
+#                                     name ends in a hash of the full key (storage.safe_name)
+#          <root>/index.lock          held (flock) while a process merges its entries into index.json
+
+import hashlib
+import json
+import os
+import pickle
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from storage import safe_name
+
+try:
+    import fcntl
+except ImportError:   # Windows: no flock, one writer at a time is up to the caller
+    fcntl = None
+
+STORE_DIR = Path('outputs/models')
+MAX_AGE_DAYS = 28        # force a full order search at least this often
+DRIFT_THRESHOLD = 0.25   # full search when holdout RMSE grows >25% over the searched baseline
+
+
+def series_hash(ts):
+    # Content hash of a date-indexed series (dates and values)
+    h = hashlib.sha1()
+    h.update(np.asarray(ts.index.values, dtype='datetime64[ns]').view('int64').tobytes())
+    h.update(np.asarray(ts.values, dtype='float64').tobytes())
+    return h.hexdigest()
+
+
+class ModelStore:
+    def __init__(self, root=STORE_DIR, load_index=True):
+        # Workers only read/write their own pickles and pass load_index=False;
+        # the index is owned by the parent process.
+        self.root = Path(root)
+        self.index_path = self.root / 'index.json'
+        if load_index and self.index_path.exists():
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {}
+        self.updated = set()
+
+    def model_path(self, key):
+        return self.root / (safe_name(key) + '.pkl')
+
+    def get(self, key):
+        # Returns (entry, model); both None when nothing usable is cached
+        entry = self.index.get(key)
+        model = self.load_model(key) if entry is not None else None
+        if model is None:
+            return None, None
+        return entry, model
+
+    def load_model(self, key):
+        path = self.model_path(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            return None
+
+    def save_model(self, key, model):
+        # Only touches the per-key pickle, so workers can call it concurrently
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.model_path(key)
+        tmp = path.with_suffix('.pkl.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump(model, f)
+        os.replace(tmp, path)
+
+    def put_entry(self, key, entry):
+        self.index[key] = entry
+        self.updated.add(key)
+
+    @contextmanager
+    def _locked(self):
+        # exclusive lock on <root>/index.lock for a read-merge-replace of index.json
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / 'index.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def save(self):
+        # Only this store's new entries are written over the index on disk, under the lock,
+        # so shard workers sharing the store (shard_forecast.py) keep each other's entries
+        with self._locked():
+            index = {}
+            if self.index_path.exists():
+                with open(self.index_path) as f:
+                    index = json.load(f)
+            index.update({key: self.index[key] for key in self.updated})
+            tmp = self.index_path.with_suffix(f'.json.tmp-{os.getpid()}')
+            with open(tmp, 'w') as f:
+                json.dump(index, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.index_path)
+        self.index, self.updated = index, set()
+
+
+def make_entry(model, train_ts, rmse, mode, previous=None, freq='D'):
+    entry = dict(previous or {})
+    entry.update({
+        'order': list(model.order),
+        'freq': freq,
+        'params': [float(p) for p in np.asarray(model.params())],
+        'last_ts': train_ts.index.max().isoformat(),
+        'data_hash': series_hash(train_ts),
+        'n_obs': int(len(train_ts)),
+        'rmse': rmse,
+        'mode': mode,
+        'fitted_at': pd.Timestamp.now().isoformat(),
+    })
+    if mode == 'search':
+        entry['searched_at'] = entry['fitted_at']
+        entry['baseline_rmse'] = rmse
+    return entry
@@ -0,0 +1,417 @@
+# news_sentiment.py
+# Headline sentiment per Technology per day.
+#  - sources: FileSource reads data/news/*.jsonl|*.csv (date, title[, technology][, url]);
+#    HttpSource pulls GET <url>/news?date=YYYY-MM-DD (JSON lines) from a feed service,
+#    and make_fixture_server() serves a FileSource that way for tests
+#  - dedupe: 64-bit blake2b of the normalised headline; hashes seen in the last DEDUP_DAYS
+#    days are kept in outputs/news_seen so re-published or re-fetched headlines count once.
+#    FileSource remembers the files it ingested by content digest (outputs/news_files) and
+#    skips them, so late items in new files are still scored; a rewritten file is read
+#    again and only deduped by headline. HttpSource can re-fetch old days, so its items
+#    dated before the dedupe window are dropped as stale
+#  - scoring: lexicon valences (VADER's from nltk when it is installed, LEXICON otherwise)
+#    summed per headline with numpy over whole batches of tokens, negation-aware and
+#    normalised to [-1, 1] like VADER's compound score. Batches of BATCH_SIZE headlines
+#    fan out over a process pool; every worker loads the lexicon and keyword table once.
+#  - headlines without a technology are matched to the panel's keywords by n-gram lookup
+#  - aggregate: outputs/news_sentiment_daily (Date, Technology, Headlines, Sentiment,
+#    Positive, Negative) is folded into, not rebuilt, so each run only scores new items
+#
+#   python code/news_sentiment.py --input data/news
+#   python code/news_sentiment.py --server http://127.0.0.1:8060 --dates 2025-11-01 2025-11-02
+#   python code/news_sentiment.py --serve-fixtures data/news --port 8060
+
+import argparse
+import hashlib
+import html
+import io
+import re
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from instrument import count, observe, start_run, timer
+from storage import OUT_DIR, PANEL_CSV, load_panel, load_table, save_table, table_path
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+NEWS_DIR = Path('data/news')
+BATCH_SIZE = 20_000
+DEDUP_DAYS = 7
+NEUTRAL_BAND = 0.05     # |score| below this is neutral (VADER's convention)
+NORMALISE_ALPHA = 15    # compound = s / sqrt(s^2 + alpha), as in VADER
+NEGATION_SCALAR = -0.74
+NEGATION_WINDOW = 3     # a negation flips the valence of the next 3 tokens
+MAX_PHRASE = 4          # longest keyword, in tokens, matched in headlines
+
+TOKEN_RE = r"[a-z0-9][a-z0-9'+#.-]*[a-z0-9+#]|[a-z0-9]"
+NEGATIONS = {'not', 'no', 'never', 'none', 'nobody', 'nothing', 'neither', 'nor', 'without',
+             "isn't", "aren't", "wasn't", "weren't", "don't", "doesn't", "didn't", "won't",
+             "can't", "cannot", "couldn't", "shouldn't", "wouldn't", "hasn't", "haven't"}
+# Fallback lexicon (valence -4..4 like VADER) for when nltk's vader_lexicon is unavailable;
+# weighted towards the vocabulary of technology news.
+LEXICON = {
+    'breakthrough': 2.8, 'record': 1.6, 'surge': 1.8, 'surges': 1.8, 'soar': 2.2, 'soars': 2.2,
+    'boom': 2.0, 'booming': 2.0, 'growth': 1.6, 'grows': 1.4, 'gain': 1.6, 'gains': 1.6,
+    'success': 2.7, 'successful': 2.6, 'win': 2.8, 'wins': 2.7, 'launch': 0.8, 'launches': 0.8,
+    'improve': 1.9, 'improves': 1.9, 'improved': 1.9, 'advance': 1.5, 'advances': 1.5,
+    'innovative': 2.0, 'innovation': 1.8, 'adoption': 0.9, 'expands': 1.2, 'expansion': 1.2,
+    'partnership': 1.3, 'milestone': 1.9, 'promising': 2.0, 'strong': 2.3, 'best': 3.2,
+    'good': 1.9, 'great': 3.1, 'positive': 2.6, 'opportunity': 1.8, 'opportunities': 1.8,
+    'faster': 1.2, 'secure': 1.4, 'efficient': 1.8, 'upgrade': 1.2, 'rally': 1.7, 'rallies': 1.7,
+    'funding': 1.0, 'invest': 1.0, 'investment': 1.1, 'profit': 1.9, 'profits': 1.9,
+    'crash': -2.6, 'crashes': -2.6, 'plunge': -2.4, 'plunges': -2.4, 'slump': -2.1,
+    'decline': -1.6, 'declines': -1.6, 'fall': -1.2, 'falls': -1.2, 'drop': -1.3, 'drops': -1.3,
+    'loss': -1.8, 'losses': -1.8, 'fail': -2.5, 'fails': -2.5, 'failure': -2.4, 'flop': -2.2,
+    'hack': -2.1, 'hacked': -2.3, 'breach': -2.2, 'exploit': -1.8, 'vulnerability': -1.6,
+    'scam': -2.7, 'fraud': -2.9, 'ban': -2.3, 'bans': -2.3, 'banned': -2.4, 'lawsuit': -1.9,
+    'fine': -0.8, 'fined': -1.9, 'risk': -1.1, 'risks': -1.1, 'threat': -2.4, 'threats': -2.4,
+    'concern': -1.4, 'concerns': -1.4, 'warning': -1.6, 'warns': -1.6, 'delay': -1.3,
+    'delays': -1.3, 'delayed': -1.3, 'layoffs': -2.1, 'cuts': -1.2, 'bubble': -1.3, 'hype': -0.9,
+    'outage': -2.0, 'bug': -1.2, 'collapse': -2.8, 'collapses': -2.8, 'bad': -2.5, 'worst': -3.1,
+    'weak': -1.9, 'slow': -1.0, 'slower': -1.0, 'uncertain': -1.3, 'uncertainty': -1.3,
+    'problem': -1.7, 'problems': -1.7, 'crisis': -3.1, 'negative': -2.7, 'doubts': -1.5,
+}
+
+_worker = {}   # per-process: lexicon and keyword phrase table, set by _init_worker
+
+
+# --- text -------------------------------------------------------------------
+
+def clean_text(titles):
+    # Strip markup from headlines (feeds often carry HTML entities/tags), collapse whitespace
+    titles = pd.Series(titles, dtype=object).fillna('').astype(str)
+    if BeautifulSoup is not None:
+        has_tags = titles.str.contains('<', regex=False)
+        titles[has_tags] = [BeautifulSoup(t, 'html.parser').get_text(' ') for t in titles[has_tags]]
+    else:
+        titles = titles.str.replace(r'<[^>]+>', ' ', regex=True)
+    titles = titles.map(html.unescape)
+    return titles.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+
+def normalise(titles):
+    return clean_text(titles).str.lower()
+
+
+def content_hash(norm_titles):
+    # signed 64-bit blake2b of each normalised headline (fits an int64 column)
+    return np.array([int.from_bytes(hashlib.blake2b(t.encode('utf-8'), digest_size=8).digest(),
+                                    'little', signed=True) for t in norm_titles], dtype=np.int64)
+
+
+@lru_cache(maxsize=1)
+def load_lexicon():
+    # VADER's lexicon (7.5k entries) when nltk and its data are installed, else LEXICON
+    try:
+        import nltk
+        path = nltk.data.find('sentiment/vader_lexicon.zip/vader_lexicon/vader_lexicon.txt')
+        lexicon = {}
+        for line in path.open().read().decode('utf-8').splitlines():
+            word, valence = line.strip().split('\t')[:2]
+            lexicon[word] = float(valence)
+        return lexicon
+    except (ImportError, LookupError, ValueError):
+        return dict(LEXICON)
+
+
+def phrase_table(keywords):
+    # {token tuple: technology} for matching keywords inside headlines
+    table = {}
+    for kw in keywords:
+        tokens = tuple(re.findall(TOKEN_RE, str(kw).lower()))
+        if tokens and len(tokens) <= MAX_PHRASE:
+            table[tokens] = str(kw)
+    return table
+
+
+def score_tokens(tokens, lexicon):
+    # tokens: Series of token lists (one per headline) -> compound score per headline
+    n = len(tokens)
+    flat = tokens.explode()
+    row = np.repeat(np.arange(n), tokens.str.len().fillna(0).astype(int).clip(lower=1).to_numpy())
+    valence = flat.map(lexicon).fillna(0.0).to_numpy(dtype=float)
+    neg = flat.isin(NEGATIONS).to_numpy()
+    negated = np.zeros(len(flat), dtype=bool)
+    for k in range(1, NEGATION_WINDOW + 1):
+        if len(flat) > k:
+            negated[k:] |= neg[:-k] & (row[:-k] == row[k:])
+    valence = np.where(negated, valence * NEGATION_SCALAR, valence)
+    s = np.bincount(row, weights=valence, minlength=n)
+    return s / np.sqrt(s * s + NORMALISE_ALPHA)
+
+
+def match_tokens(tokens, phrases):
+    # technologies whose keyword appears in each headline (n-gram dictionary lookup)
+    longest = max((len(p) for p in phrases), default=0)
+    firsts = {p[0] for p in phrases}
+    out = []
+    for toks in tokens:
+        found = set()
+        for i in range(len(toks)):
+            if toks[i] not in firsts:
+                continue
+            for n in range(1, min(longest, len(toks) - i) + 1):
+                tech = phrases.get(tuple(toks[i:i + n]))
+                if tech is not None:
+                    found.add(tech)
+        out.append(sorted(found))
+    return out
+
+
+def _init_worker(keywords):
+    _worker['lexicon'] = load_lexicon()
+    _worker['phrases'] = phrase_table(keywords)
+
+
+def _score_task(titles, match):
+    # Runs inside a worker: titles are normalised; returns (scores, matched technologies or None)
+    if not _worker:
+        _init_worker([])
+    tokens = pd.Series(titles, dtype=object).str.findall(TOKEN_RE)
+    scores = score_tokens(tokens, _worker['lexicon'])
+    return scores, match_tokens(tokens, _worker['phrases']) if match else None
+
+
+# --- sources ----------------------------------------------------------------
+# frames() yields DataFrames with Date, Title and optionally Technology, Url columns.
+
+def _news_frame(df):
+    df = df.rename(columns={c: c.lower() for c in df.columns})
+    df = df.rename(columns={'date': 'Date', 'published': 'Date', 'title': 'Title', 'headline': 'Title',
+                            'technology': 'Technology', 'url': 'Url'})
+    if 'Date' not in df.columns or 'Title' not in df.columns:
+        raise ValueError(f"news items need date and title fields, got {list(df.columns)}")
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce', utc=True).dt.tz_localize(None).dt.normalize()
+    if 'Technology' not in df.columns:
+        df['Technology'] = None
+    return df[['Date', 'Title', 'Technology']].dropna(subset=['Date', 'Title'])
+
+
+def file_digest(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class FileSource:
+    # `ingested` holds the digests of files read by earlier runs, which frames() skips;
+    # `read` collects (digest, name) of the files it reads
+    def __init__(self, root=NEWS_DIR):
+        root = Path(root)
+        self.files = sorted(root.glob('*.jsonl')) + sorted(root.glob('*.csv')) if root.is_dir() else \
+            ([root] if root.exists() else [])
+        self.ingested = set()
+        self.read = []
+
+    def frames(self):
+        for path in self.files:
+            digest = file_digest(path)
+            if digest in self.ingested:
+                count('files', status='already_ingested')
+                continue
+            self.read.append((digest, path.name))
+            df = pd.read_json(path, lines=True) if path.suffix == '.jsonl' else pd.read_csv(path)
+            if not df.empty:
+                yield _news_frame(df)
+
+
+class HttpSource:
+    # GET <base_url>/news?date=YYYY-MM-DD -> JSON lines body, one item per line
+    def __init__(self, base_url, dates, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.dates = [pd.Timestamp(d).date().isoformat() for d in dates]
+        self.timeout = timeout
+
+    def frames(self):
+        for day in self.dates:
+            t0 = time.perf_counter()
+            url = f"{self.base_url}/news?{urllib.parse.urlencode({'date': day})}"
+            with urllib.request.urlopen(url, timeout=self.timeout) as resp:
+                body = resp.read().decode('utf-8')
+            observe('fetch', time.perf_counter() - t0)
+            if body.strip():
+                yield _news_frame(pd.read_json(io.StringIO(body), lines=True))
+
+
+def make_fixture_server(source, port=0):
+    # Local news feed for HttpSource, serving the items of any source (usually a FileSource)
+    # by day. Call serve_forever() on it, e.g. in a thread.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    frames = list(source.frames())
+    items = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['Date', 'Title', 'Technology'])
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            q = urllib.parse.parse_qs(url.query)
+            if url.path != '/news' or 'date' not in q:
+                body, status = b'expected /news?date=YYYY-MM-DD', 404
+            else:
+                day = items[items['Date'] == pd.Timestamp(q['date'][0])]
+                day = day.assign(Date=day['Date'].dt.strftime('%Y-%m-%d'))
+                body = day.rename(columns=str.lower).to_json(orient='records', lines=True).encode('utf-8')
+                status = 200
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer(('127.0.0.1', port), Handler)
+
+
+# --- pipeline ---------------------------------------------------------------
+
+def _load_state(name, columns, out_dir):
+    if table_path(name, out_dir).exists():
+        return load_table(name, out_dir=out_dir)
+    return pd.DataFrame({c: pd.Series(dtype=t) for c, t in columns.items()})
+
+
+def dedupe(items, seen, window=True):
+    # Drop items whose content hash was seen before or repeats within this batch. With
+    # window, items older than the dedupe window are dropped as stale too: their hashes
+    # are no longer kept, so they cannot be checked. Returns (items, duplicates, stale)
+    items = items.assign(Norm=normalise(items['Title']))
+    items['Hash'] = content_hash(items['Norm'])
+    stale = pd.Series(False, index=items.index)
+    if window and len(seen):
+        stale = items['Date'] <= seen['Date'].max() - pd.Timedelta(days=DEDUP_DAYS)
+    duplicate = ~stale & (items['Hash'].isin(seen['Hash']) | items.duplicated('Hash'))
+    count('headlines', int(duplicate.sum()), status='duplicate')
+    count('headlines', int(stale.sum()), status='stale')
+    return items[~stale & ~duplicate], int(duplicate.sum()), int(stale.sum())
+
+
+def score_items(items, keywords, workers=None, batch_size=BATCH_SIZE):
+    # Score Norm titles (and match technologies where missing) in batches across a pool
+    need = items['Technology'].isna().to_numpy()
+    titles = items['Norm'].to_numpy(dtype=object)
+    bounds = list(range(0, len(titles), batch_size))
+    if len(bounds) <= 1 or workers == 1:
+        _init_worker(keywords)
+        parts = [_score_task(titles[s:s + batch_size], need[s:s + batch_size].any()) for s in bounds]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(list(keywords),)) as pool:
+            parts = list(pool.map(_score_task, [titles[s:s + batch_size] for s in bounds],
+                                  [need[s:s + batch_size].any() for s in bounds]))
+    scores = np.concatenate([p[0] for p in parts]) if parts else np.zeros(0)
+    matched = []
+    for (_, m), s in zip(parts, bounds):
+        matched.extend(m if m is not None else [[]] * len(titles[s:s + batch_size]))
+    techs = [[t] if not n else m for t, n, m in zip(items['Technology'], need, matched)]
+    return items.assign(Score=scores, Technologies=techs)
+
+
+def aggregate(scored):
+    # One row per (Date, Technology); a headline naming two technologies counts for both
+    rows = scored[['Date', 'Score', 'Technologies']].explode('Technologies').dropna(subset=['Technologies'])
+    rows = rows.rename(columns={'Technologies': 'Technology'})
+    rows['Positive'] = rows['Score'] >= NEUTRAL_BAND
+    rows['Negative'] = rows['Score'] <= -NEUTRAL_BAND
+    return rows.groupby(['Date', 'Technology'], as_index=False).agg(
+        Headlines=('Score', 'size'), Score_Sum=('Score', 'sum'),
+        Positive=('Positive', 'sum'), Negative=('Negative', 'sum'))
+
+
+def fold(daily, new):
+    # Add new (Date, Technology) sums into the daily table
+    old = daily.assign(Score_Sum=daily['Sentiment'] * daily['Headlines']).drop(columns='Sentiment')
+    both = pd.concat([old, new], ignore_index=True)
+    both = both.groupby(['Date', 'Technology'], as_index=False)[['Headlines', 'Score_Sum', 'Positive', 'Negative']].sum()
+    both['Sentiment'] = both['Score_Sum'] / both['Headlines']
+    both[['Headlines', 'Positive', 'Negative']] = both[['Headlines', 'Positive', 'Negative']].astype('int64')
+    return both[['Date', 'Technology', 'Headlines', 'Sentiment', 'Positive', 'Negative']] \
+        .sort_values(['Date', 'Technology'], kind='stable').reset_index(drop=True)
+
+
+def panel_keywords(panel_csv=PANEL_CSV):
+    if not Path(panel_csv).exists():
+        return []
+    return sorted(load_panel(panel_csv, columns=['Technology'])['Technology'].astype(str).unique())
+
+
+def run_sentiment(source, out_dir=OUT_DIR, keywords=None, workers=None, batch_size=BATCH_SIZE):
+    # Ingest, dedupe, score and fold new headlines into news_sentiment_daily; returns the table
+    keywords = panel_keywords() if keywords is None else keywords
+    seen = _load_state('news_seen', {'Hash': 'int64', 'Date': 'datetime64[ns]'}, out_dir)
+    daily = _load_state('news_sentiment_daily', {'Date': 'datetime64[ns]', 'Technology': object, 'Headlines': 'int64',
+                                                 'Sentiment': float, 'Positive': 'int64', 'Negative': 'int64'}, out_dir)
+    # sources that track their files never re-read one, so need no date cutoff
+    tracked = hasattr(source, 'ingested')
+    if tracked:
+        files = _load_state('news_files', {'Digest': object, 'File': object}, out_dir)
+        source.ingested = set(files['Digest'])
+    t0 = time.perf_counter()
+    with timer('ingest'):
+        frames = [f for f in source.frames() if not f.empty]
+        items = pd.concat(frames, ignore_index=True) if frames else _news_frame(pd.DataFrame(columns=['date', 'title']))
+        received = len(items)
+        items, duplicates, stale = dedupe(items, seen, window=not tracked)
+    with timer('score'):
+        scored = score_items(items, keywords, workers, batch_size)
+    with timer('aggregate'):
+        daily = fold(daily, aggregate(scored))
+    unmatched = int(scored['Technologies'].map(len).eq(0).sum())
+    count('headlines', len(scored), status='scored')
+    count('headlines', unmatched, status='unmatched')
+
+    if len(scored):
+        # keep only the dedupe window (relative to the newest item seen)
+        seen = pd.concat([seen, scored[['Hash', 'Date']]], ignore_index=True)
+        seen = seen[seen['Date'] > seen['Date'].max() - pd.Timedelta(days=DEDUP_DAYS)]
+        save_table(seen.reset_index(drop=True), 'news_seen', out_dir)
+        save_table(daily, 'news_sentiment_daily', out_dir)
+    if tracked and source.read:
+        # after the daily table, so a crash in between re-reads the files rather than losing them
+        read = pd.DataFrame(source.read, columns=['Digest', 'File'])
+        save_table(pd.concat([files, read], ignore_index=True).drop_duplicates('Digest'), 'news_files', out_dir)
+    elapsed = time.perf_counter() - t0
+    rate = received / elapsed if elapsed > 0 else float('nan')
+    print(f"News: {received} items, {duplicates} duplicates, {len(scored)} scored "
+          f"({unmatched} matched no technology) in {elapsed:.1f}s ({rate:.0f} items/sec)")
+    if stale:
+        print(f"News: dropped {stale} items dated more than {DEDUP_DAYS} days before the newest "
+              f"headline seen (older than the dedupe window)")
+    return daily
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default=str(NEWS_DIR), help='News directory or file (.jsonl/.csv)')
+    parser.add_argument('--server', default=None, help='Base URL of a news feed (GET /news?date=...)')
+    parser.add_argument('--dates', nargs='*', default=[], help='Days to pull from --server')
+    parser.add_argument('--out', default=str(OUT_DIR))
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--serve-fixtures', default=None, help='Serve this news directory on --port and exit on Ctrl-C')
+    parser.add_argument('--port', type=int, default=8060)
+    args = parser.parse_args(argv)
+    if args.serve_fixtures:
+        server = make_fixture_server(FileSource(args.serve_fixtures), args.port)
+        print(f"Serving {args.serve_fixtures} on http://127.0.0.1:{server.server_address[1]}/news?date=YYYY-MM-DD")
+        server.serve_forever()
+    else:
+        start_run('news')
+        source = HttpSource(args.server, args.dates) if args.server else FileSource(args.input)
+        run_sentiment(source, args.out, workers=args.workers, batch_size=args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+# pipeline.py
+# Runs the stage scripts as a DAG:
+#   collect -> preprocess / arima -> make_final / fill_missing -> growth_simulation / trend_strength
+#           / yearly_ranking / sentiment / correlation / report / breakouts / hierarchy
+#           -> dashboard_master -> insights
+# A stage is skipped when the content hash of its code and inputs matches the last
+# successful run and its outputs still exist. Stages whose inputs are ready run in
+# parallel. A timing report is printed at the end.
+#
+#   python code/pipeline.py                 # run what changed
+#   python code/pipeline.py --force         # rerun everything
+#   python code/pipeline.py --with-collect  # also pull new Google Trends data
+#   python code/pipeline.py --only backtest # rolling-origin model comparison
+#   python code/pipeline.py --force --profile --log-level DEBUG
+#                                           # cProfile every stage, full tables (see instrument.py)
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import storage
+from instrument import count, observe, start_run
+
+CODE_DIR = Path(__file__).resolve().parent
+STATE_FILE = Path('outputs/.pipeline_state.json')
+PANEL = 'data/trends_processed.csv'
+
+
+def table(name):
+    # a table written through storage.save_table (Parquet and/or CSV)
+    return 'table:' + name
+
+
+STAGES = [
+    # name, script + args, inputs, outputs; the code hashed is the script and every
+    # module of code/ it imports (local_imports)
+    {'name': 'collect', 'cmd': ['trends_collect_retry.py'],
+     'inputs': ['data/taxonomy.json'], 'outputs': [PANEL], 'manual': True, 'cache': False},
+    {'name': 'preprocess',
+     'cmd': ['preprocessing.py', '--panel', '--input', PANEL, '--out', 'data/trends_features.csv'],
+     'inputs': [PANEL],
+     'outputs': ['data/trends_features.csv', 'data/trends_features_holdout.csv']},
+    {'name': 'arima',
+     'cmd': ['arima_model.py', '--batch', '--input', PANEL, '--out', 'outputs',
+             '--model-store', 'outputs/models'],
+     'inputs': [PANEL],
+     'outputs': ['outputs/arima_forecast_all.csv', 'outputs/arima_fit_report.csv']},
+    {'name': 'make_final', 'cmd': ['make_final_forecast_table_all_fix.py'],
+     'inputs': [PANEL, 'outputs/arima_forecast_all.csv'],
+     'outputs': [table('final_forecast_table_all')]},
+    {'name': 'fill_missing', 'cmd': ['fill_missing_forecasts.py'],
+     'inputs': [PANEL, 'outputs/arima_forecast_all.csv', 'data/taxonomy.json'],
+     'outputs': [table('final_forecast_table_all_complete')]},
+    {'name': 'growth_simulation', 'cmd': ['growth_simulation.py'],
+     'inputs': [table('final_forecast_table_all_complete'), 'outputs/arima_forecast_all.csv'],
+     'outputs': [table('growth_simulation')]},
+    {'name': 'trend_strength', 'cmd': ['generate_trend_strength.py'], 'inputs': [PANEL],
+     'outputs': [table('trend_strength')]},
+    {'name': 'yearly_ranking', 'cmd': ['generate_yearly_ranking.py'], 'inputs': [PANEL],
+     'outputs': [table('tech_yearly_ranking')]},
+    {'name': 'sentiment',
+     'cmd': ['generate_sentiment.py', '--input', PANEL, '--news', 'data/news', '--out', 'outputs'],
+     'inputs': [PANEL, 'data/news'],
+     'outputs': [table('news_sentiment'), table('news_sentiment_daily'), table('news_sentiment_weekly')]},
+    {'name': 'correlation', 'cmd': ['correlation.py'],
+     'inputs': [PANEL],
+     'outputs': [table('tech_neighbours')]},
+    {'name': 'report', 'cmd': ['render_report.py'], 'inputs': [PANEL],
+     'outputs': ['outputs/report/index.html']},
+    {'name': 'breakouts', 'cmd': ['breakouts.py'],
+     'inputs': [PANEL], 'outputs': [table('breakout_alerts')]},
+    {'name': 'hierarchy', 'cmd': ['hierarchy.py'],
+     'inputs': [PANEL, 'data/taxonomy.json', 'outputs/arima_forecast_all.csv', 'outputs/arima_fit_report.csv'],
+     'outputs': [table('hierarchy_forecast'), table('category_forecast')]},
+    {'name': 'dashboard_master', 'cmd': ['generate_dashboard_master.py'],
+     'inputs': [table('final_forecast_table_all_complete'), table('tech_yearly_ranking'),
+                table('news_sentiment'), table('trend_strength'), table('growth_simulation')],
+     'outputs': [table('dashboard_master'), 'outputs/dashboard_master_parts/_manifest.json']},
+    {'name': 'insights', 'cmd': ['generate_insights.py'],
+     'inputs': [table('final_forecast_table_all_complete'), table('trend_strength')],
+     'outputs': ['outputs/auto_insights.txt']},
+    # overnight job: only runs when asked for with --only backtest
+    {'name': 'backtest', 'cmd': ['backtest.py', '--input', PANEL, '--out', 'outputs'],
+     'inputs': [PANEL],
+     'outputs': [table('backtest_metrics'), table('backtest_best_model')], 'manual': True},
+]
+
+
+def resolve(ref, root):
+    if ref.startswith('table:'):
+        return storage.table_path(ref[len('table:'):], root / storage.OUT_DIR)
+    return root / ref
+
+
+def file_hash(path, h):
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+
+
+def local_imports(script, code_dir=CODE_DIR):
+    # The script and every code/ module it imports, directly or through another one,
+    # sorted; function-level imports count too
+    seen, todo = set(), [script]
+    while todo:
+        name = todo.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        tree = ast.parse((code_dir / name).read_text(encoding='utf-8'), filename=name)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [a.name for a in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level:
+                modules = [node.module]
+            else:
+                continue
+            todo.extend(f'{m}.py' for m in modules if (code_dir / f'{m}.py').is_file())
+    return sorted(seen)
+
+
+def stage_hash(stage, root):
+    h = hashlib.sha256()
+    h.update(json.dumps(stage['cmd']).encode())
+    for name in local_imports(stage['cmd'][0]):
+        file_hash(CODE_DIR / name, h)
+    for ref in stage['inputs']:
+        path = resolve(ref, root)
+        h.update(ref.encode())
+        if path.is_dir():
+            # a directory input (e.g. data/news): every file in it, by relative path
+            for f in sorted(p for p in path.rglob('*') if p.is_file()):
+                h.update(str(f.relative_to(path)).encode())
+                file_hash(f, h)
+        elif path.exists():
+            file_hash(path, h)
+    return h.hexdigest()
+
+
+def dependencies(stages):
+    produced = {out: s['name'] for s in stages for out in s['outputs']}
+    return {s['name']: {produced[i] for i in s['inputs'] if i in produced and produced[i] != s['name']}
+            for s in stages}
+
+
+def run_stage(stage, root):
+    cmd = [sys.executable, str(CODE_DIR / stage['cmd'][0])] + stage['cmd'][1:]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=root, capture_output=True, text=True)
+    return proc, time.perf_counter() - t0
+
+
+def run_pipeline(root='.', jobs=4, force=False, with_collect=False, only=None):
+    root = Path(root).resolve()
+    # manual stages only run when named in --only (or --with-collect for collect)
+    stages = [s for s in STAGES if not s.get('manual') or (only and s['name'] in only)
+              or (with_collect and s['name'] == 'collect')]
+    if only:
+        stages = [s for s in stages if s['name'] in only]
+    by_name = {s['name']: s for s in stages}
+    deps = dependencies(stages)
+    state_path = root / STATE_FILE
+    state = json.loads(state_path.read_text()) if state_path.exists() else {}
+
+    status, timings = {}, {}
+    running = {}
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while len(status) < len(stages):
+            for name, stage in by_name.items():
+                if name in status or any(name == n for n, _ in running.values()):
+                    continue
+                if any(status.get(d) in ('failed', 'blocked') for d in deps[name]):
+                    status[name] = 'blocked'
+                    continue
+                if not all(status.get(d) in ('ran', 'cached') for d in deps[name]):
+                    continue
+                digest = stage_hash(stage, root)
+                outputs_exist = all(resolve(o, root).exists() for o in stage['outputs'])
+                if not force and stage.get('cache', True) and outputs_exist and state.get(name) == digest:
+                    status[name] = 'cached'
+                    timings[name] = 0.0
+                    continue
+                if PANEL in stage['inputs'] and storage.has_parquet() and (root / PANEL).exists():
+                    # convert the panel once here rather than racing in every stage
+                    storage.sync_panel(root / PANEL)
+                print(f"▶ {name}")
+                running[pool.submit(run_stage, stage, root)] = (name, digest)
+            if not running:
+                continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for fut in done:
+                name, digest = running.pop(fut)
+                proc, seconds = fut.result()
+                timings[name] = seconds
+                observe('stage', seconds, item=name, status='ok' if proc.returncode == 0 else 'failed')
+                if proc.returncode == 0:
+                    status[name] = 'ran'
+                    state[name] = digest
+                    state_path.parent.mkdir(parents=True, exist_ok=True)
+                    state_path.write_text(json.dumps(state, indent=1, sort_keys=True))
+                    print(f"✔ {name} ({seconds:.1f}s)")
+                else:
+                    status[name] = 'failed'
+                    print(f"✖ {name} failed (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+    total = time.perf_counter() - t_start
+    for name, st in status.items():
+        count('stages', status=st)
+    print(f"\n{'Stage':<18}{'Status':<9}{'Seconds':>9}")
+    for stage in stages:
+        name = stage['name']
+        secs = f"{timings[name]:.2f}" if name in timings else '-'
+        print(f"{name:<18}{status[name]:<9}{secs:>9}")
+    print(f"{'total':<27}{total:>9.2f}")
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--root', default='.', help='Project root containing data/ and outputs/')
+    parser.add_argument('--jobs', type=int, default=4, help='Stages to run in parallel')
+    parser.add_argument('--force', action='store_true', help='Ignore cached hashes and rerun every stage')
+    parser.add_argument('--with-collect', action='store_true', help='Also run the Google Trends collection')
+    parser.add_argument('--only', nargs='*', help='Run only these stages')
+    parser.add_argument('--profile', action='store_true', help='cProfile every stage (outputs/metrics/*.prof)')
+    parser.add_argument('--tracemalloc', action='store_true', help='Record peak memory and top allocation sites')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING'], default=None,
+                        help='DEBUG prints full tables and per-series lines in every stage')
+    args = parser.parse_args(argv)
+    # stages are subprocesses: they pick these up from the environment
+    if args.profile:
+        os.environ['TRENDPULSE_PROFILE'] = '1'
+    if args.tracemalloc:
+        os.environ['TRENDPULSE_TRACEMALLOC'] = '1'
+    if args.log_level:
+        os.environ['TRENDPULSE_LOG_LEVEL'] = args.log_level
+    start_run('pipeline')
+    status = run_pipeline(args.root, jobs=args.jobs, force=args.force,
+                          with_collect=args.with_collect, only=args.only)
+    return 1 if any(s in ('failed', 'blocked') for s in status.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,19 @@
 # preprocessing.py
+# Series are regularised at their native frequency (weekly for Google Trends, see
+# features.infer_freq), not upsampled to days; the panel output records it in a Freq
+# column. Holdouts are given in days and cover the matching number of points.
 import argparse
 import pandas as pd
 from pathlib import Path
 
+import storage
+from features import FREQ_DAYS, add_series_features, infer_freq, native_index, steps
+from instrument import count, start_run, timer
+
+PANEL_COLUMNS = ['Date', 'Technology', 'Freq', 'Interest', 'MA7', 'MA30', 'Pct_Change', 'Volatility',
+                 'Trend_Direction']
+
+
 def preprocess(input_path: str, output_path: str, create_holdout: bool = True, holdout_days: int = 14):
     input_path = Path(input_path)
     output_path = Path(output_path)
@@ -27,12 +38,14 @@ def preprocess(input_path: str, output_path: str, create_holdout: bool = True, h
     # Rename for Prophet convention
     df = df.rename(columns={'Date': 'ds', 'Interest': 'y'})
 
-    # Ensure daily index from min to max
-    full_idx = pd.date_range(start=df['ds'].min(), end=df['ds'].max(), freq='D')
-    df = df.set_index('ds').reindex(full_idx).rename_axis('ds').reset_index()
+    # Regular index from min to max at the series' own frequency
+    freq = infer_freq(df['ds'])
+    full_idx = native_index(df['ds'].min(), df['ds'].max(), freq=freq)
+    df = df.set_index('ds').reindex(full_idx, method='ffill').rename_axis('ds').reset_index()
 
     # If y missing, forward-fill then fill remaining with 0
     df['y'] = df['y'].ffill().fillna(0)
+    holdout_points = steps(holdout_days, freq)
 
     # Save final input
     output_path.parent.mkdir(parents=True, exist_ok=True)
@@ -42,20 +55,127 @@ def preprocess(input_path: str, output_path: str, create_holdout: bool = True, h
     # Optionally create a holdout file for evaluation (last N days)
     if create_holdout:
         holdout_path = output_path.parent / 'forecast_input_holdout.csv'
-        if len(df) > holdout_days:
-            train = df.iloc[:-holdout_days]
-            holdout = df.iloc[-holdout_days:]
+        if len(df) > holdout_points:
+            train = df.iloc[:-holdout_points]
+            holdout = df.iloc[-holdout_points:]
             train.to_csv(output_path, index=False)
             holdout.to_csv(holdout_path, index=False)
-            print(f"Created holdout ({holdout_days} days) at {holdout_path}")
+            print(f"Created holdout ({holdout_days} days = {holdout_points} points of {freq}) at {holdout_path}")
         else:
             print("Not enough data to create holdout; whole file saved as training input.")
 
-if __name__ == '__main__':
+
+# ---------------------------------------------------------------------------
+# Streaming mode for the long Date,Technology,Interest panel: one technology is
+# loaded, processed and written at a time, so peak memory is bounded by the
+# largest single series rather than the whole panel.
+# ---------------------------------------------------------------------------
+
+def iter_panel_series(input_path, chunksize=500_000):
+    # Yields one technology's rows at a time. With pyarrow the panel is read
+    # partition by partition; otherwise the CSV is streamed in chunks and must be
+    # grouped by Technology (as the collector writes it).
+    input_path = Path(input_path)
+    if storage.has_parquet():
+        root = storage.sync_panel(input_path)
+        yield from storage.iter_panel(root, columns=['Date', 'Technology', 'Interest'])
+        return
+
+    seen = set()
+    current, parts = None, []
+    for chunk in pd.read_csv(input_path, usecols=['Date', 'Technology', 'Interest'], chunksize=chunksize):
+        for tech, part in chunk.groupby('Technology', sort=False):
+            if tech != current:
+                if current is not None:
+                    yield current, pd.concat(parts, ignore_index=True)
+                if tech in seen:
+                    raise ValueError(f"{input_path} is not grouped by Technology ({tech} appears twice); "
+                                     "install pyarrow or sort the panel first")
+                seen.add(tech)
+                current, parts = tech, []
+            parts.append(part)
+    if current is not None:
+        yield current, pd.concat(parts, ignore_index=True)
+
+
+def reindex_series(tech, df):
+    # Same cleaning as preprocess() for one series of the panel: sort, dedupe,
+    # regular index at its native frequency, forward-fill then 0
+    df = df.assign(Date=pd.to_datetime(df['Date'], errors='coerce')).dropna(subset=['Date'])
+    df = df.sort_values('Date').drop_duplicates('Date')
+    freq = infer_freq(df['Date'])
+    full_idx = native_index(df['Date'].min(), df['Date'].max(), freq=freq)
+    interest = df.set_index('Date')['Interest'].reindex(full_idx, method='ffill').fillna(0)
+    return pd.DataFrame({'Date': full_idx, 'Technology': tech, 'Freq': freq, 'Interest': interest.values})
+
+
+def preprocess_panel(input_path: str, output_path: str, create_holdout: bool = True, holdout_days: int = 14,
+                     chunksize: int = 500_000):
+    # Series are buffered until about `chunksize` rows so the feature pass
+    # (MA7/MA30/pct change/volatility, see features.add_series_features) runs on a
+    # chunk of series at once; peak memory is max(chunk, largest series).
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    holdout_path = output_path.with_name(output_path.stem + '_holdout.csv')
+
+    n_series = n_rows = 0
+    buffer, buffered = [], 0
+    out_f = open(output_path, 'w', newline='')
+    hold_f = open(holdout_path, 'w', newline='') if create_holdout else None
+
+    def flush():
+        nonlocal n_rows
+        with timer('features'):
+            df = add_series_features(pd.concat(buffer, ignore_index=True))[PANEL_COLUMNS]
+        if hold_f is not None:
+            g = df.groupby('Technology', sort=False)
+            points = df['Freq'].map({f: steps(holdout_days, f) for f in FREQ_DAYS})
+            in_holdout = (g.cumcount(ascending=False) < points) & (g['Date'].transform('size') > points)
+            df[in_holdout].to_csv(hold_f, header=hold_f.tell() == 0, index=False)
+            df = df[~in_holdout]
+        with timer('write'):
+            df.to_csv(out_f, header=out_f.tell() == 0, index=False)
+        n_rows += len(df)
+        count('chunks')
+        buffer.clear()
+
+    try:
+        for tech, raw in iter_panel_series(input_path, chunksize):
+            with timer('reindex'):
+                series = reindex_series(tech, raw)
+            buffer.append(series)
+            buffered += len(series)
+            n_series += 1
+            count('series')
+            if buffered >= chunksize:
+                flush()
+                buffered = 0
+        if buffer:
+            flush()
+    finally:
+        out_f.close()
+        if hold_f is not None:
+            hold_f.close()
+    print(f"Saved {n_series} preprocessed series ({n_rows} rows) to {output_path}")
+    if create_holdout:
+        print(f"Created holdout (last {holdout_days} days per series) at {holdout_path}")
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('--input', required=True, help='Path to trends_processed.xlsx or CSV')
     parser.add_argument('--out', required=True, help='Path to save forecast_input.csv')
     parser.add_argument('--no-holdout', action='store_true', help='Do not create holdout file')
     parser.add_argument('--holdout-days', type=int, default=14, help='Days in holdout')
-    args = parser.parse_args()
-    preprocess(args.input, args.out, create_holdout=not args.no_holdout, holdout_days=args.holdout_days)
+    parser.add_argument('--panel', action='store_true',
+                        help='Stream a multi-technology Date,Technology,Interest panel one series at a time')
+    args = parser.parse_args(argv)
+    start_run('preprocess')
+    if args.panel:
+        preprocess_panel(args.input, args.out, create_holdout=not args.no_holdout, holdout_days=args.holdout_days)
+    else:
+        preprocess(args.input, args.out, create_holdout=not args.no_holdout, holdout_days=args.holdout_days)
+
+
+if __name__ == '__main__':
+    main()
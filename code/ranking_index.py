@@ -0,0 +1,224 @@
+# ranking_index.py
+# Persistent ranking state so leaderboards are updated, not recomputed.
+#  - YearlyIndex keeps running Interest sums/counts per (Year, Technology) and the last
+#    date folded in per technology. New panel rows are added to the sums; the yearly
+#    ranking table is rebuilt from them without rescanning the history.
+#  - Leaderboard keeps one value per technology (growth, volatility, trend strength)
+#    in a heap with lazy deletion: an update pushes the new value and leaves the old
+#    entry to be skipped when it surfaces, so an update is O(log n) and top(k) is
+#    O(k log n) instead of a full sort.
+# State lives in outputs/ranking_index/<name>.pkl, one file per writer script, so
+# stages running in parallel never write the same file.
+#
+#   python code/ranking_index.py --top growth -k 10
+#   python code/ranking_index.py --top volatility -k 5      # most stable first
+#   python code/ranking_index.py --year 2024 -k 10
+
+import argparse
+import hashlib
+import heapq
+import os
+import pickle
+from pathlib import Path
+
+import pandas as pd
+
+import storage
+from storage import PANEL_CSV, load_panel
+
+INDEX_DIR = Path('outputs/ranking_index')
+FINGERPRINT_BYTES = 1 << 16
+# board name -> True when larger values rank first
+BOARDS = {'growth': True, 'volatility': False, 'trend_strength': True}
+
+
+def _save(obj, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    with open(tmp, 'wb') as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def _load(path):
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+class Leaderboard:
+    def __init__(self, name, descending=True):
+        self.name = name
+        self.descending = descending
+        self.values = {}
+        self.heap = []
+
+    def _key(self, value):
+        return -value if self.descending else value
+
+    def update(self, values):
+        # values: {tech: value} or a Series; only changed values touch the heap
+        changed = 0
+        for tech, value in dict(values).items():
+            tech = str(tech)
+            if pd.isna(value):
+                if self.values.pop(tech, None) is not None:
+                    changed += 1
+                continue
+            value = float(value)
+            if self.values.get(tech) == value:
+                continue
+            self.values[tech] = value
+            heapq.heappush(self.heap, (self._key(value), tech))
+            changed += 1
+        if len(self.heap) > 2 * len(self.values) + 64:
+            # too many stale entries: rebuild from the live values
+            self.heap = [(self._key(v), t) for t, v in self.values.items()]
+            heapq.heapify(self.heap)
+        return changed
+
+    def remove(self, techs):
+        for tech in techs:
+            self.values.pop(str(tech), None)
+
+    def top(self, k=10):
+        # [(tech, value)] best first; stale entries met on the way are dropped for good
+        out, keep = [], []
+        while self.heap and len(out) < k:
+            key, tech = heapq.heappop(self.heap)
+            value = self.values.get(tech)
+            if value is None or self._key(value) != key or any(t == tech for t, _ in out):
+                continue
+            out.append((tech, value))
+            keep.append((key, tech))
+        for item in keep:
+            heapq.heappush(self.heap, item)
+        return out
+
+    def save(self, root=INDEX_DIR):
+        _save(self, Path(root) / f'{self.name}.pkl')
+
+    @classmethod
+    def load(cls, name, root=INDEX_DIR):
+        board = _load(Path(root) / f'{name}.pkl')
+        return board if board is not None else cls(name, BOARDS.get(name, True))
+
+
+def update_board(name, values, root=INDEX_DIR):
+    # Load, update and save one board; used by the stage scripts after they write their table
+    board = Leaderboard.load(name, root)
+    board.remove(set(board.values) - {str(t) for t in dict(values)})
+    changed = board.update(values)
+    board.save(root)
+    return board, changed
+
+
+def panel_fingerprint(csv_path, length=None):
+    # (size, hash of the first `length` bytes). An append keeps the hash of the old prefix;
+    # anything else (rewrite, truncation) changes it and forces a rebuild.
+    csv_path = Path(csv_path)
+    size = csv_path.stat().st_size
+    length = min(size, FINGERPRINT_BYTES) if length is None else length
+    with open(csv_path, 'rb') as f:
+        head = f.read(length)
+    return {'size': size, 'length': length, 'head': hashlib.sha1(head).hexdigest()}
+
+
+class YearlyIndex:
+    def __init__(self):
+        self.sums = {}        # (year, tech) -> [sum, count]
+        self.last = {}        # tech -> last Date folded in
+        self.source = None    # panel_fingerprint of the CSV when last updated
+        self.boards = {}      # year -> Leaderboard of Avg_Interest
+
+    def add(self, rows):
+        # Fold Date,Technology,Interest rows into the sums; rows at or before a
+        # technology's last folded date are ignored, so re-feeding rows is harmless.
+        if rows.empty:
+            return 0
+        rows = rows.dropna(subset=['Date', 'Interest']).copy()
+        rows['Technology'] = rows['Technology'].astype(str)
+        last = pd.to_datetime(rows['Technology'].map(self.last))
+        rows = rows[last.isna() | (rows['Date'] > last)]
+        if rows.empty:
+            return 0
+        rows['Year'] = rows['Date'].dt.year
+        agg = rows.groupby(['Year', 'Technology'])['Interest'].agg(['sum', 'count'])
+        touched = {}
+        for (year, tech), s, c in zip(agg.index, agg['sum'], agg['count']):
+            acc = self.sums.setdefault((int(year), tech), [0.0, 0])
+            acc[0] += float(s)
+            acc[1] += int(c)
+            touched.setdefault(int(year), {})[tech] = acc[0] / acc[1]
+        for year, avgs in touched.items():
+            self.boards.setdefault(year, Leaderboard(f'yearly_{year}')).update(avgs)
+        for tech, d in rows.groupby('Technology')['Date'].max().items():
+            self.last[tech] = d
+        return len(rows)
+
+    def update_from_panel(self, csv_path=PANEL_CSV):
+        # Read only what is new since the last update and fold it in
+        csv_path = Path(csv_path)
+        if self.source is not None:
+            now = panel_fingerprint(csv_path, self.source['length'])
+            if now['size'] < self.source['size'] or now['head'] != self.source['head']:
+                print("Panel was rewritten, not appended to: rebuilding the yearly index")
+                self.__init__()
+        columns = ['Date', 'Technology', 'Interest']
+        if not self.last or not storage.has_parquet():
+            # first run, or CSV-only: one read, add() skips what is already folded in
+            added = self.add(load_panel(csv_path, columns=columns))
+        else:
+            # technologies that appeared since the last run need their whole history;
+            # fold them in first so the delta read below does not mark them as seen
+            root = storage.sync_panel(csv_path)
+            new = [t for t in storage.panel_technologies(root) if t not in self.last]
+            start = min(self.last.values()) + pd.Timedelta(days=1)
+            added = self.add(load_panel(csv_path, columns=columns, technologies=new)) if new else 0
+            added += self.add(load_panel(csv_path, columns=columns, start=start))
+        self.source = panel_fingerprint(csv_path)
+        return added
+
+    def table(self):
+        # Same layout as the original groupby: Year, Technology, Avg_Interest sorted by
+        # Year then Avg_Interest descending
+        rows = [(year, tech, s / c) for (year, tech), (s, c) in self.sums.items()]
+        df = pd.DataFrame(rows, columns=['Year', 'Technology', 'Avg_Interest'])
+        return df.sort_values(['Year', 'Avg_Interest'], ascending=[True, False], kind='stable').reset_index(drop=True)
+
+    def top(self, year, k=10):
+        board = self.boards.get(int(year))
+        return board.top(k) if board else []
+
+    def save(self, root=INDEX_DIR):
+        _save(self, Path(root) / 'yearly.pkl')
+
+    @classmethod
+    def load(cls, root=INDEX_DIR):
+        index = _load(Path(root) / 'yearly.pkl')
+        return index if index is not None else cls()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--root', default=str(INDEX_DIR))
+    parser.add_argument('--top', choices=sorted(BOARDS), help='Show a leaderboard')
+    parser.add_argument('--year', type=int, help='Show the Avg_Interest leaderboard of a year')
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args(argv)
+    if args.top:
+        rows = Leaderboard.load(args.top, args.root).top(args.k)
+    else:
+        index = YearlyIndex.load(args.root)
+        year = args.year or (max(index.boards) if index.boards else None)
+        rows = index.top(year, args.k) if year else []
+        print(f"Year {year}")
+    for i, (tech, value) in enumerate(rows, 1):
+        print(f"{i:>4}  {tech:<40}{value:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+# render_report.py
+# Headless chart report for the whole catalogue (the charts of notebooks/03_eda.py without
+# plt.show()): per technology, Interest with MA7/MA30 over its Volatility, plus an overview
+# of the OVERVIEW_TECHS most searched technologies, and index pages linking them all.
+#  - Agg backend, so it runs on servers and in the pipeline
+#  - charts are rendered in a process pool, CHUNK technologies per task; each worker builds
+#    its figure once and only swaps the line data, limits and title between series
+#  - a chart is skipped when the sha1 of its series (and RENDER_VERSION) matches the one in
+#    manifest.json and the file still exists; bump RENDER_VERSION when the styling changes
+#
+#   python code/render_report.py                    # -> outputs/report/index.html
+#   python code/render_report.py --force --workers 4
+
+import argparse
+import hashlib
+import html
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from instrument import count, observe, start_run, timer
+from shared_panel import attach, open_panel
+from storage import PANEL_CSV, safe_name
+
+REPORT_DIR = Path('outputs/report')
+RENDER_VERSION = '1'
+CHUNK = 100
+OVERVIEW_TECHS = 10
+OVERVIEW_PERIODS = 52     # "most searched" = highest mean Interest over the last 52 points
+PAGE_SIZE = 500           # technologies per index page
+FIGSIZE = (10, 6)
+DPI = 80
+PNG_OPTIONS = {'compress_level': 1}   # zlib level; the default 6 costs more than drawing
+
+_figure = {}   # per-process: the reusable figure and its artists
+
+
+def chart_name(tech):
+    return f"{safe_name(tech)}.png"
+
+
+def series_hash(days, values):
+    h = hashlib.sha1(RENDER_VERSION.encode())
+    h.update(np.ascontiguousarray(days).tobytes())
+    h.update(np.ascontiguousarray(values).tobytes())
+    return h.hexdigest()
+
+
+def series_features(days, values):
+    # MA7 / MA30 / Volatility with the definitions of features.add_series_features
+    y = pd.Series(values, dtype=float)
+    return (days.astype('datetime64[D]'), y.to_numpy(), y.rolling(7, min_periods=1).mean().to_numpy(),
+            y.rolling(30, min_periods=1).mean().to_numpy(), y.rolling(7, min_periods=1).std().to_numpy())
+
+
+def _make_figure():
+    fig, (ax, ax_vol) = plt.subplots(2, 1, figsize=FIGSIZE, dpi=DPI, sharex=True,
+                                     gridspec_kw={'height_ratios': [3, 1]})
+    lines = {
+        'interest': ax.plot([], [], color='tab:blue', label='Interest')[0],
+        'ma7': ax.plot([], [], linestyle='--', color='tab:orange', label='MA7')[0],
+        'ma30': ax.plot([], [], linestyle='--', color='tab:green', label='MA30')[0],
+        'volatility': ax_vol.plot([], [], color='tab:red')[0],
+    }
+    ax.xaxis_date()          # the artists start empty, so the date axis is not inferred
+    ax.set_title(' ')        # room for the per-series title in the fixed layout
+    ax.set_ylabel('Search Interest')
+    ax.legend(loc='upper left')
+    ax.grid(alpha=0.3)
+    ax_vol.set_ylabel('Volatility')
+    ax_vol.set_xlabel('Date')
+    ax_vol.grid(alpha=0.3)
+    fig.tight_layout()
+    fig.set_layout_engine('none')   # layout is fixed: no extra dry-run draw on every savefig
+    return {'fig': fig, 'ax': ax, 'ax_vol': ax_vol, 'lines': lines}
+
+
+def draw(tech, days, values, path):
+    # Reuses this process's figure: new data on the same artists, then rescale and save
+    if 'chart' not in _figure:
+        _figure['chart'] = _make_figure()
+    f = _figure['chart']
+    dates, y, ma7, ma30, vol = series_features(days, values)
+    for name, data in [('interest', y), ('ma7', ma7), ('ma30', ma30), ('volatility', vol)]:
+        f['lines'][name].set_data(dates, data)
+    for ax in (f['ax'], f['ax_vol']):
+        ax.relim()
+        ax.autoscale_view()
+    _date_ticks(f['ax_vol'], dates)
+    f['ax'].set_title(f"{tech} – Trend with Moving Averages")
+    f['fig'].savefig(path, pil_kwargs=PNG_OPTIONS)
+
+
+def _date_ticks(ax, dates):
+    # Fixed locators picked from the span: AutoDateLocator's rrule search is the slowest
+    # part of drawing a chart
+    span = int((dates[-1] - dates[0]).astype(int)) if len(dates) else 0
+    if span > 3 * 365:
+        locator, fmt = mdates.YearLocator(), '%Y'
+    elif span > 365:
+        locator, fmt = mdates.MonthLocator(bymonth=[1, 7]), '%Y-%m'
+    else:
+        locator, fmt = mdates.MonthLocator(), '%Y-%m'
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter(fmt))
+
+
+def _render_task(techs, panel, out_dir):
+    # Runs inside a worker: renders a chunk of charts from the shared panel
+    shared = attach(panel)
+    done = []
+    for tech in techs:
+        t0 = time.perf_counter()
+        try:
+            days, values = shared.series(tech)
+            draw(tech, days, values, Path(out_dir) / chart_name(tech))
+            done.append((tech, '', time.perf_counter() - t0))
+        except Exception as e:
+            done.append((tech, str(e), time.perf_counter() - t0))
+    return done
+
+
+def render_overview(panel, techs, path):
+    fig, ax = plt.subplots(figsize=(14, 6), dpi=DPI)
+    for tech in techs:
+        days, values = panel.series(tech)
+        ax.plot(days.astype('datetime64[D]'), values, label=tech)
+    ax.set_title("Technology Search Interest Over Time (Trend Comparison)")
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Search Interest')
+    ax.legend(loc='upper left', fontsize='small')
+    ax.grid(alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(path, pil_kwargs=PNG_OPTIONS)
+    plt.close(fig)
+
+
+def write_index(out_dir, techs, overview):
+    # index.html (+ index-2.html, ...) with PAGE_SIZE lazily loaded charts per page
+    pages = [techs[i:i + PAGE_SIZE] for i in range(0, len(techs), PAGE_SIZE)] or [[]]
+    names = ['index.html'] + [f'index-{i}.html' for i in range(2, len(pages) + 1)]
+    for i, (page, name) in enumerate(zip(pages, names)):
+        nav = ' '.join(f'<a href="{n}">{j + 1}</a>' if j != i else f'<b>{j + 1}</b>' for j, n in enumerate(names))
+        cards = '\n'.join(
+            f'<figure><a href="{chart_name(t)}"><img src="{chart_name(t)}" loading="lazy" width="400"></a>'
+            f'<figcaption>{html.escape(t)}</figcaption></figure>' for t in page)
+        head = f'<h2>Most searched</h2><img src="{overview}" width="1000">' if overview and i == 0 else ''
+        body = (f'<!doctype html><html><head><meta charset="utf-8"><title>TrendPulse report</title>'
+                f'<style>body{{font-family:sans-serif}} figure{{display:inline-block;margin:6px}}</style></head>'
+                f'<body><h1>TrendPulse report</h1><p>{len(techs)} technologies, page {i + 1}/{len(pages)}: {nav}</p>'
+                f'{head}<h2>Technologies</h2>\n{cards}\n</body></html>')
+        tmp = Path(out_dir) / f'.{name}.{os.getpid()}.tmp'
+        tmp.write_text(body, encoding='utf-8')
+        os.replace(tmp, Path(out_dir) / name)
+    return Path(out_dir) / names[0]
+
+
+def render_report(panel_csv=PANEL_CSV, out_dir=REPORT_DIR, workers=None, force=False, techs=None):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / 'manifest.json'
+    manifest = {} if force or not manifest_path.exists() else json.loads(manifest_path.read_text())
+
+    with timer('load_panel'):
+        panel, handle = open_panel(panel_csv)
+        techs = panel.select(techs)
+        hashes = {t: series_hash(*panel.series(t)) for t in techs}
+    stale = [t for t in techs if manifest.get(t) != hashes[t] or not (out_dir / chart_name(t)).exists()]
+    print(f"Rendering {len(stale)}/{len(techs)} charts ({len(techs) - len(stale)} unchanged) "
+          f"with {workers or 'all'} workers")
+
+    t0 = time.perf_counter()
+    failed = {}
+    chunks = [stale[i:i + CHUNK] for i in range(0, len(stale), CHUNK)]
+    with timer('render'):
+        if len(chunks) <= 1 or workers == 1:
+            results = [_render_task(c, handle, str(out_dir)) for c in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_render_task, c, handle, str(out_dir)) for c in chunks]
+                results = [f.result() for f in as_completed(futures)]
+    for tech, error, seconds in (r for chunk in results for r in chunk):
+        observe('chart', seconds, item=tech)
+        if error:
+            failed[tech] = error
+            manifest.pop(tech, None)
+            print(f"{tech}: {error}")
+        else:
+            manifest[tech] = hashes[tech]
+    count('charts', len(stale) - len(failed), status='rendered')
+    count('charts', len(techs) - len(stale), status='unchanged')
+    count('charts', len(failed), status='failed')
+
+    # overview of the most searched technologies, re-rendered only when one of them changed
+    recent = {}
+    for t in techs:
+        values = panel.series(t)[1][-OVERVIEW_PERIODS:]
+        recent[t] = float(values.mean()) if len(values) else 0.0
+    top = sorted(recent, key=recent.get, reverse=True)[:OVERVIEW_TECHS]
+    key = hashlib.sha1(''.join(t + hashes[t] for t in top).encode()).hexdigest()
+    overview = 'overview.png' if top else None
+    if top and (manifest.get('__overview__') != key or not (out_dir / overview).exists()):
+        render_overview(panel, top, out_dir / overview)
+        manifest['__overview__'] = key
+
+    index = write_index(out_dir, techs, overview)
+    tmp = manifest_path.with_name(f'.{manifest_path.name}.{os.getpid()}.tmp')
+    tmp.write_text(json.dumps(manifest))
+    os.replace(tmp, manifest_path)
+    elapsed = time.perf_counter() - t0
+    rate = len(stale) / elapsed if elapsed > 0 else float('nan')
+    print(f"Rendered {len(stale) - len(failed)} charts in {elapsed:.1f}s ({rate:.1f} charts/sec); index: {index}")
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default=str(PANEL_CSV))
+    parser.add_argument('--out', default=str(REPORT_DIR))
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--force', action='store_true', help='Re-render every chart')
+    parser.add_argument('--techs', nargs='*', help='Only these technologies')
+    args = parser.parse_args(argv)
+    start_run('report')
+    render_report(args.input, args.out, args.workers, args.force, args.techs)
+
+
+if __name__ == '__main__':
+    main()
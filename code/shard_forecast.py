@@ -0,0 +1,261 @@
+# shard_forecast.py
+# Forecast refresh split over any number of worker processes and hosts that share the
+# project directory, through the work queue of workqueue.py (outputs/queue/queue.db):
+#   submit  splits the panel's technologies (sorted) into shards of SHARD_SIZE, one work unit
+#           each. The job id hashes the panel fingerprint and the job's parameters, so
+#           submitting again for the same panel resumes the same job instead of starting over
+#   work    claims units until none is left. A unit is an arima_model batch over its shard
+#           (warm-started from the shared model store), written to a private directory while
+#           a Heartbeat renews the lease, then moved to results/<job>/<unit>/ as it completes.
+#           A worker that dies loses its lease and the unit goes to the next worker. Run one
+#           per host: it fits with all of the host's cores
+#   reduce  when no unit is pending or leased: the shards' forecasts and fit reports are
+#           merged into outputs/ (arima_forecast_all.csv, arima_fit_report.csv and the
+#           per-technology files), and make_final / fill_missing build the forecast tables
+#           from them. Technologies of failed units (or whose fit failed) have no forecast:
+#           their per-technology files from earlier refreshes are deleted and fill_missing
+#           gives them its linear fallback
+#   run     submit + local workers + reduce, on one machine
+# Units are technology shards only: the geo of CANDIDATE_SETTINGS (trends_collector.py) is
+# an order of fallbacks for collection, not a dimension of the panel (one series per
+# technology), so there is nothing to split along it here.
+#
+#   python code/shard_forecast.py submit                      # on one host
+#   python code/shard_forecast.py work                        # on every host
+#   python code/shard_forecast.py reduce --wait               # on one host
+#   python code/shard_forecast.py run --procs 4 --tiered
+#   python code/workqueue.py outputs/queue/queue.db           # progress
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from arima_model import FORECAST_COLUMNS, run_arima_batch
+from fast_forecast import TIER_THRESHOLD
+from fill_missing_forecasts import fill_missing
+from hierarchy import TAXONOMY_PATH
+from instrument import count, observe, show_table, start_run
+from make_final_forecast_table_all_fix import make_final_table
+from model_store import STORE_DIR
+from ranking_index import INDEX_DIR, panel_fingerprint
+from shared_panel import open_panel
+from storage import OUT_DIR, PANEL_CSV, forecast_path
+from workqueue import LEASE_SECONDS, Heartbeat, WorkQueue, worker_id
+
+QUEUE_DIR = Path('outputs/queue')
+SHARD_SIZE = 200       # technologies per unit: a few minutes of ARIMA on one host
+POLL_SECONDS = 10      # how often a waiting worker / reduce looks at the queue again
+
+
+def queue_at(queue_dir=QUEUE_DIR, lease=LEASE_SECONDS):
+    return WorkQueue(Path(queue_dir) / 'queue.db', lease=lease)
+
+
+def result_dir(queue_dir, job, unit):
+    return Path(queue_dir) / 'results' / job / unit
+
+
+def submit(panel_csv=PANEL_CSV, queue_dir=QUEUE_DIR, shard_size=SHARD_SIZE, periods=30, tiered=False,
+           tier_threshold=TIER_THRESHOLD, timeout=None, store_dir=str(STORE_DIR), daily=False):
+    panel, _ = open_panel(panel_csv)   # also builds the memory-mapped arrays the workers map
+    techs = sorted(panel.techs)
+    params = {'panel': str(panel_csv), 'periods': periods, 'tiered': tiered, 'tier_threshold': tier_threshold,
+              'timeout': timeout, 'model_store': store_dir, 'daily': daily}
+    key = json.dumps({'source': panel_fingerprint(panel_csv), 'params': params, 'shard_size': shard_size},
+                     sort_keys=True)
+    job = 'forecast-' + hashlib.sha1(key.encode()).hexdigest()[:12]
+    units = {f'shard-{i // shard_size:05d}': {'techs': techs[i:i + shard_size]}
+             for i in range(0, len(techs), shard_size)}
+    queue = queue_at(queue_dir)
+    added = queue.submit(job, units, params)
+    counts = queue.status(job)
+    print(f"Job {job}: {len(techs)} technologies in {len(units)} units ({added} new); "
+          + ', '.join(f"{n} {s}" for s, n in counts.items()))
+    return job
+
+
+def _publish(tmp, final):
+    if final.exists():
+        shutil.rmtree(final)
+    final.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp, final)
+
+
+def work(queue_dir=QUEUE_DIR, job=None, workers=None, wait=False, lease=LEASE_SECONDS, worker=None):
+    # Claim and run units until none is claimable (with wait: until the jobs are finished,
+    # taking over the units of workers whose lease runs out). Returns the units completed
+    queue = queue_at(queue_dir, lease)
+    worker = worker or worker_id()
+    completed = 0
+    while True:
+        claimed = queue.claim(worker, job)
+        if claimed is None:
+            if wait and not all(queue.finished(j) for j in ([job] if job else queue.jobs())):
+                time.sleep(POLL_SECONDS)
+                continue
+            break
+        job_id, unit, payload, attempt = claimed
+        params = queue.params(job_id)
+        final = result_dir(queue_dir, job_id, unit)
+        tmp = final.with_name(f"{unit}.tmp-{''.join(x if x.isalnum() else '_' for x in worker)}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        print(f"{worker}: {job_id}/{unit}, {len(payload['techs'])} technologies (attempt {attempt})")
+        t0 = time.perf_counter()
+        try:
+            with Heartbeat(queue, job_id, unit, worker) as beat:
+                run_arima_batch(params['panel'], tmp, periods=params['periods'], workers=workers,
+                                timeout=params['timeout'], techs=payload['techs'], store_dir=params['model_store'],
+                                tiered=params['tiered'], tier_threshold=params['tier_threshold'],
+                                daily=params['daily'])
+        except Exception as e:
+            queue.fail(job_id, unit, worker, f"{type(e).__name__}: {e}")
+            shutil.rmtree(tmp, ignore_errors=True)
+            count('units', status='failed')
+            print(f"{worker}: {unit} failed: {e}")
+            continue
+        if beat.lost or not queue.complete(job_id, unit, worker, publish=lambda: _publish(tmp, final)):
+            # the lease ran out and another worker has the unit: its result wins
+            shutil.rmtree(tmp, ignore_errors=True)
+            count('units', status='lost')
+            print(f"{worker}: lost the lease on {unit}, result dropped")
+            continue
+        observe('unit', time.perf_counter() - t0, item=unit)
+        count('units', status='done')
+        completed += 1
+    print(f"{worker}: completed {completed} units")
+    return completed
+
+
+def _write_csv(df, path):
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def reduce(queue_dir=QUEUE_DIR, job=None, out_dir=OUT_DIR, taxonomy=TAXONOMY_PATH, index_dir=INDEX_DIR,
+           wait=False):
+    queue = queue_at(queue_dir)
+    job = job or (queue.jobs() or [None])[-1]
+    if job is None:
+        print(f"No job in {queue.path}")
+        return None
+    while not queue.finished(job):
+        if not wait:
+            print(f"Job {job} is not finished: {queue.status(job)}")
+            return None
+        time.sleep(POLL_SECONDS)
+    units = queue.units(job)
+    failed = [u for u in units if u['status'] != 'done']
+    for u in failed:
+        print(f"⚠ {u['unit']} failed after {u['attempts']} attempts: {u['error']}")
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    results = Path(queue_dir) / 'results' / job
+    for stale in results.glob('*.tmp-*'):
+        shutil.rmtree(stale, ignore_errors=True)   # partial output of workers that died
+    forecasts, reports, n_files = [], [], 0
+    for unit in sorted(results.glob('shard-*')):
+        if (unit / 'arima_forecast_all.csv').exists():
+            forecasts.append(pd.read_csv(unit / 'arima_forecast_all.csv'))
+        if (unit / 'arima_fit_report.csv').exists():
+            reports.append(pd.read_csv(unit / 'arima_fit_report.csv'))
+        for path in unit.glob('*_arima_forecast.csv'):
+            tmp = out_dir / f'.{path.name}.{os.getpid()}.tmp'
+            shutil.copyfile(path, tmp)
+            os.replace(tmp, out_dir / path.name)
+            n_files += 1
+    forecasts = pd.concat(forecasts, ignore_index=True) if forecasts else pd.DataFrame(columns=FORECAST_COLUMNS)
+    _write_csv(forecasts, out_dir / 'arima_forecast_all.csv')
+    if reports:
+        _write_csv(pd.concat(reports, ignore_index=True), out_dir / 'arima_fit_report.csv')
+    # no forecast this time: last refresh's per-technology file must not pass for a current one
+    fresh = set(forecasts['Technology'].astype(str))
+    missing = [t for u in units for t in u['payload']['techs'] if t not in fresh]
+    for tech in missing:
+        forecast_path(tech, out_dir).unlink(missing_ok=True)
+    count('forecast_files', n_files)
+    count('technologies', len(missing), status='no_forecast')
+    print(f"Merged {n_files} forecasts from {len(reports)} units of {job} into {out_dir}; "
+          f"{len(missing)} technologies without a forecast")
+
+    panel_csv = queue.params(job)['panel']
+    make_final_table(panel_csv, out_dir)
+    return fill_missing(panel_csv, out_dir, taxonomy, index_dir)
+
+
+def run(panel_csv=PANEL_CSV, queue_dir=QUEUE_DIR, procs=2, out_dir=OUT_DIR, **job):
+    # One machine: submit, `procs` worker processes sharing the cores, reduce
+    job_id = submit(panel_csv, queue_dir, **job)
+    per_proc = max(1, (os.cpu_count() or 1) // procs)
+    cmd = [sys.executable, str(Path(__file__).resolve()), '--queue', str(queue_dir), 'work', '--job', job_id,
+           '--workers', str(per_proc)]
+    workers = [subprocess.Popen(cmd) for _ in range(procs)]
+    codes = [w.wait() for w in workers]
+    if any(codes):
+        print(f"⚠ worker exit codes: {codes}")
+    return reduce(queue_dir, job_id, out_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queue', default=str(QUEUE_DIR), help='Queue directory shared by every host')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    job_options = argparse.ArgumentParser(add_help=False)
+    job_options.add_argument('--input', default=str(PANEL_CSV))
+    job_options.add_argument('--shard-size', type=int, default=SHARD_SIZE, help='Technologies per work unit')
+    job_options.add_argument('--periods', type=int, default=30, help='Days ahead to forecast')
+    job_options.add_argument('--tiered', action='store_true', help='Closed-form models first, ARIMA for the rest')
+    job_options.add_argument('--tier-threshold', type=float, default=TIER_THRESHOLD)
+    job_options.add_argument('--timeout', type=float, default=None, help='Per-series fit timeout in seconds')
+    job_options.add_argument('--model-store', default=str(STORE_DIR))
+    job_options.add_argument('--daily', action='store_true', help='Write the forecasts as daily rows')
+    commands.add_parser('submit', parents=[job_options], help='Put a forecast job on the queue')
+
+    work_parser = commands.add_parser('work', help='Claim and run units')
+    work_parser.add_argument('--job', default=None, help='Only units of this job (default: any)')
+    work_parser.add_argument('--workers', type=int, default=None, help='Fitting processes (default: all cores)')
+    work_parser.add_argument('--lease', type=float, default=LEASE_SECONDS, help='Lease length in seconds')
+    work_parser.add_argument('--wait', action='store_true', help='Stay until the jobs are finished')
+
+    reduce_parser = commands.add_parser('reduce', help='Merge the results into the forecast tables')
+    reduce_parser.add_argument('--job', default=None, help='Default: the last submitted job')
+    reduce_parser.add_argument('--out', default=str(OUT_DIR))
+    reduce_parser.add_argument('--taxonomy', default=str(TAXONOMY_PATH))
+    reduce_parser.add_argument('--wait', action='store_true', help='Wait for the job to finish')
+
+    run_parser = commands.add_parser('run', parents=[job_options], help='submit + local workers + reduce')
+    run_parser.add_argument('--procs', type=int, default=2, help='Local worker processes')
+    run_parser.add_argument('--out', default=str(OUT_DIR))
+    args = parser.parse_args(argv)
+
+    start_run(f'shard_{args.command}')
+    job = {} if args.command not in ('submit', 'run') else {
+        'shard_size': args.shard_size, 'periods': args.periods, 'tiered': args.tiered,
+        'tier_threshold': args.tier_threshold, 'timeout': args.timeout, 'store_dir': args.model_store,
+        'daily': args.daily}
+    if args.command == 'submit':
+        submit(args.input, args.queue, **job)
+    elif args.command == 'work':
+        work(args.queue, args.job, args.workers, args.wait, args.lease)
+    else:
+        if args.command == 'reduce':
+            table = reduce(args.queue, args.job, args.out, args.taxonomy, wait=args.wait)
+        else:
+            table = run(args.input, args.queue, args.procs, args.out, **job)
+        if table is None:
+            return 1
+        show_table(table)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
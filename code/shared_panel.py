@@ -0,0 +1,199 @@
+# shared_panel.py
+# Compact array form of the Date,Technology,Interest panel for fanning out to worker
+# processes without pickling DataFrames:
+#   values   float32[n_rows]    Interest, sorted by (Technology, Date)
+#   days     int32[n_rows]      days since 1970-01-01
+#   offsets  int64[n_techs + 1] rows of technology i are offsets[i]:offsets[i + 1]
+#   techs    list of names, in offset order
+#   freqs    native frequency of each series ('D', 'W', 'M'; features.infer_freq)
+# Two ways to share it:
+#   - memory-mapped .npy files in data/trends_processed.arrays/ (rebuilt when the CSV
+#     changes, like storage.sync_panel): workers np.load(mmap_mode='r') them and the OS
+#     page cache holds one copy for everybody
+#   - multiprocessing.shared_memory segments (SharedPanel.share()), for panels that
+#     should not touch the disk
+# Either way a task only carries a small handle; attach(handle) maps the arrays once per
+# worker process and series() returns views into them.
+
+import json
+import os
+import shutil
+from collections.abc import Mapping
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import storage
+from features import infer_freq
+from storage import PANEL_CSV, load_panel
+
+SOURCE_MARKER = '_source.json'
+ARRAYS = {'values': np.float32, 'days': np.int32, 'offsets': np.int64}
+
+_attached = {}   # per-process cache: handle key -> SharedPanel
+
+
+def arrays_dir(csv_path=PANEL_CSV):
+    csv_path = Path(csv_path)
+    return csv_path.parent / (csv_path.stem + '.arrays')
+
+
+class SharedPanel:
+    def __init__(self, techs, offsets, days, values, segments=None, freqs=None):
+        self.techs = list(techs)
+        self.index = {t: i for i, t in enumerate(self.techs)}
+        self.offsets = offsets
+        self.days = days
+        self.values = values
+        self.segments = segments or []   # SharedMemory blocks backing the arrays, if any
+        self.freqs = list(freqs) if freqs is not None else \
+            [infer_freq(days[offsets[i]:offsets[i + 1]]) for i in range(len(self.techs))]
+
+    def __len__(self):
+        return len(self.techs)
+
+    @classmethod
+    def from_frame(cls, df):
+        df = df.dropna(subset=['Date']).sort_values(['Technology', 'Date'], kind='stable')
+        tech = df['Technology'].astype(str).to_numpy()
+        starts = np.flatnonzero(np.r_[True, tech[1:] != tech[:-1]]) if len(tech) else np.zeros(0, dtype=int)
+        offsets = np.r_[starts, len(tech)].astype(np.int64)
+        days = (pd.DatetimeIndex(df['Date']).values.astype('datetime64[D]').astype(np.int64)).astype(np.int32)
+        values = df['Interest'].to_numpy(dtype=np.float32)
+        return cls(tech[starts].tolist(), offsets, days, values)
+
+    def rows(self, tech):
+        i = self.index[tech] if not isinstance(tech, (int, np.integer)) else int(tech)
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def series(self, tech):
+        # (int32 day numbers, float32 values): views, no copy
+        r = self.rows(tech)
+        return self.days[r], self.values[r]
+
+    def freq(self, tech):
+        return self.freqs[self.index[tech] if not isinstance(tech, (int, np.integer)) else int(tech)]
+
+    def series_dates(self, tech):
+        # (datetime64 dates, float64 values) in the shape arima_model's tasks expect
+        days, values = self.series(tech)
+        return days.astype('datetime64[D]').astype('datetime64[ns]'), values.astype(np.float64)
+
+    def select(self, techs=None):
+        wanted = set(map(str, techs)) if techs else None
+        return [t for t in self.techs if wanted is None or t in wanted]
+
+    # --- memory-mapped files -------------------------------------------------
+    def save(self, root, source=None):
+        # written to a temporary directory and renamed, so readers never see a partial set
+        root = Path(root)
+        tmp = root.with_name(f'{root.name}.tmp-{os.getpid()}')
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for name in ARRAYS:
+            np.save(tmp / f'{name}.npy', getattr(self, name))
+        (tmp / 'techs.json').write_text(json.dumps(self.techs))
+        (tmp / 'freqs.json').write_text(json.dumps(self.freqs))
+        (tmp / SOURCE_MARKER).write_text(json.dumps(source))
+        old = root.with_name(f'{root.name}.old-{os.getpid()}')
+        if root.exists():
+            os.replace(root, old)
+        os.replace(tmp, root)
+        shutil.rmtree(old, ignore_errors=True)
+        return root
+
+    @classmethod
+    def load(cls, root, mmap=True):
+        root = Path(root)
+        arrays = {name: np.load(root / f'{name}.npy', mmap_mode='r' if mmap else None) for name in ARRAYS}
+        freqs = json.loads((root / 'freqs.json').read_text()) if (root / 'freqs.json').exists() else None
+        return cls(json.loads((root / 'techs.json').read_text()), arrays['offsets'], arrays['days'],
+                   arrays['values'], freqs=freqs)
+
+    # --- shared memory -------------------------------------------------------
+    def share(self):
+        # Copy the arrays into shared memory once; returns the SharedPanel backed by the
+        # segments (keep it alive, call unlink() when done) and the handle for workers
+        segments, specs = [], {}
+        names = json.dumps([self.techs, self.freqs]).encode()
+        for name, data in list((n, getattr(self, n)) for n in ARRAYS) + [('techs', np.frombuffer(names, np.uint8))]:
+            shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+            np.ndarray(data.shape, data.dtype, buffer=shm.buf)[:] = data
+            segments.append(shm)
+            specs[name] = (shm.name, str(data.dtype), data.shape)
+        shared = SharedPanel._from_segments(specs, segments)
+        return shared, {'shm': specs}
+
+    @classmethod
+    def _from_segments(cls, specs, segments):
+        arrays = {}
+        for shm, (name, (_, dtype, shape)) in zip(segments, specs.items()):
+            arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+        techs, freqs = json.loads(arrays['techs'].tobytes().decode())
+        return cls(techs, arrays['offsets'], arrays['days'], arrays['values'], segments, freqs)
+
+    def close(self):
+        for shm in self.segments:
+            shm.close()
+
+    def unlink(self):
+        for shm in self.segments:
+            shm.close()
+            shm.unlink()
+
+
+class PanelSeries(Mapping):
+    # {tech: (dates, values)} over a SharedPanel, converted on access; `handle` is what
+    # worker tasks get instead of the arrays
+    def __init__(self, panel, handle, techs=None):
+        self.panel = panel
+        self.handle = handle
+        self.techs = panel.select(techs)
+
+    def __getitem__(self, tech):
+        return self.panel.series_dates(tech)
+
+    def freq(self, tech):
+        return self.panel.freq(tech)
+
+    def __iter__(self):
+        return iter(self.techs)
+
+    def __len__(self):
+        return len(self.techs)
+
+
+def sync_arrays(csv_path=PANEL_CSV):
+    # (Re)build the memory-mapped arrays if the CSV changed since they were written
+    csv_path = Path(csv_path)
+    root = arrays_dir(csv_path)
+    source = storage._csv_signature(csv_path)
+    marker = root / SOURCE_MARKER
+    if marker.exists() and json.loads(marker.read_text()) == source:
+        return root
+    df = load_panel(csv_path, columns=['Date', 'Technology', 'Interest'])
+    return SharedPanel.from_frame(df).save(root, source=source)
+
+
+def open_panel(csv_path=PANEL_CSV):
+    # Memory-mapped panel plus the handle workers attach() with
+    root = sync_arrays(csv_path)
+    return SharedPanel.load(root), {'root': str(root)}
+
+
+def attach(handle):
+    # Worker side: map the panel once per process and reuse it for every task
+    key = handle.get('root') or json.dumps(handle['shm'], sort_keys=True)
+    panel = _attached.get(key)
+    if panel is None:
+        if 'root' in handle:
+            panel = SharedPanel.load(handle['root'])
+        else:
+            # pool workers share the parent's resource tracker, so attaching does not
+            # hand the segments' lifetime to the worker; the parent unlinks them
+            segments = [shared_memory.SharedMemory(name=name) for name, _, _ in handle['shm'].values()]
+            panel = SharedPanel._from_segments(handle['shm'], segments)
+        _attached[key] = panel
+    return panel
@@ -0,0 +1,259 @@
+# storage.py
+# Columnar storage for the processed panel and the derived output tables.
+#
+# Panel:   the typed Parquet dataset partitioned by Technology/Year
+#          (data/trends_processed.parquet/) is the panel; reads only touch the partitions
+#          and columns they ask for. New rows go through append_panel, which rewrites
+#          just the Technology/Year partitions they fall in and appends them to
+#          data/trends_processed.csv, the export Power BI reads (append-only, so
+#          ranking_index.panel_fingerprint sees an append). A CSV changed by anything
+#          else (first run, a hand edit) is converted whole by sync_panel.
+# Tables:  outputs/<name>.parquet, plus outputs/<name>.csv only for the tables
+#          Power BI reads (POWERBI_TABLES).
+# Without pyarrow everything falls back to plain CSV.
+
+import hashlib
+import json
+import os
+import shutil
+import urllib.parse
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+PANEL_CSV = Path('data/trends_processed.csv')
+OUT_DIR = Path('outputs')
+POWERBI_TABLES = {'final_forecast_table_all', 'final_forecast_table_all_complete', 'dashboard_master',
+                  'breakout_alerts', 'category_forecast', 'growth_simulation'}
+FORECASTS_CSV = 'arima_forecast_all.csv'   # every technology's forecast, written by arima_model.py
+SOURCE_MARKER = '_source.json'
+CSV_CHUNK_ROWS = 1_000_000   # the CSV is converted in chunks, never loaded whole
+
+
+def has_parquet():
+    return pa is not None
+
+
+def panel_dir(csv_path=PANEL_CSV):
+    csv_path = Path(csv_path)
+    return csv_path.parent / (csv_path.stem + '.parquet')
+
+
+def _typed_panel(df):
+    df = df.copy()
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    df = df.dropna(subset=['Date'])
+    df['Technology'] = df['Technology'].astype('category')
+    df['Interest'] = pd.to_numeric(df['Interest'], errors='coerce').astype('float64')
+    df['Year'] = df['Date'].dt.year.astype('int16')
+    return df.sort_values(['Technology', 'Date'], kind='stable')
+
+
+def write_panel(frames, root=None, source=None):
+    # Rewrite the whole partitioned dataset from a frame or an iterable of chunks;
+    # built in a sibling directory and swapped in so readers never see a half-written panel.
+    root = Path(root) if root else panel_dir()
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    tmp = root.with_name(f'{root.name}.tmp-{os.getpid()}')
+    shutil.rmtree(tmp, ignore_errors=True)
+    for i, df in enumerate(frames):
+        table = pa.Table.from_pandas(_typed_panel(df), preserve_index=False)
+        pq.write_to_dataset(table, tmp, partition_cols=['Technology', 'Year'],
+                            basename_template=f'part-{i}-{{i}}.parquet', max_partitions=1 << 20)
+    if source is not None:
+        (tmp / SOURCE_MARKER).write_text(json.dumps(source))
+    old = root.with_name(f'{root.name}.old-{os.getpid()}')
+    if root.exists():
+        root.rename(old)
+    tmp.rename(root)
+    shutil.rmtree(old, ignore_errors=True)
+    return root
+
+
+def panel_technologies(root=None):
+    # Technologies in the dataset, read from the partition directory names only
+    root = Path(root) if root else panel_dir()
+    return sorted(urllib.parse.unquote(p.name.split('=', 1)[1])
+                  for p in root.glob('Technology=*') if p.is_dir())
+
+
+def iter_panel(root=None, columns=None):
+    # (technology, frame) one series at a time; each read only lists that
+    # technology's partition directory instead of rediscovering the whole dataset
+    root = Path(root) if root else panel_dir()
+    for tech_dir in sorted(p for p in root.glob('Technology=*') if p.is_dir()):
+        tech = urllib.parse.unquote(tech_dir.name.split('=', 1)[1])
+        dataset = pads.dataset(tech_dir, format='parquet', partitioning='hive', exclude_invalid_files=True)
+        cols = [c for c in columns if c != 'Technology'] if columns else None
+        df = dataset.to_table(columns=cols).to_pandas().sort_values('Date', kind='stable')
+        if columns is None or 'Technology' in columns:
+            df.insert(1, 'Technology', tech)
+        yield tech, df[columns].reset_index(drop=True) if columns else df.reset_index(drop=True)
+
+
+def read_panel(root=None, columns=None, technologies=None, years=None, start=None):
+    # Partition pruning on Technology/Year, row-group pruning on Date, column pruning on read
+    root = Path(root) if root else panel_dir()
+    dataset = pads.dataset(root, format='parquet', partitioning='hive', exclude_invalid_files=True)
+    flt = None
+    for expr in [
+        pads.field('Technology').isin(list(technologies)) if technologies else None,
+        pads.field('Year').isin([int(y) for y in years]) if years else None,
+        pads.field('Date') >= pa.scalar(pd.Timestamp(start), type=pa.timestamp('ns')) if start else None,
+    ]:
+        if expr is not None:
+            flt = expr if flt is None else flt & expr
+    df = dataset.to_table(columns=columns, filter=flt).to_pandas()
+    if 'Technology' in df.columns:
+        df['Technology'] = df['Technology'].astype(str).astype('category')
+    if 'Date' in df.columns:
+        df = df.sort_values([c for c in ['Technology', 'Date'] if c in df.columns], kind='stable')
+    return df.reset_index(drop=True)
+
+
+def _csv_signature(csv_path):
+    st = Path(csv_path).stat()
+    return {'mtime': st.st_mtime, 'size': st.st_size}
+
+
+def sync_panel(csv_path=PANEL_CSV):
+    # (Re)build the Parquet copy of the panel if the CSV changed since it was written
+    csv_path = Path(csv_path)
+    root = panel_dir(csv_path)
+    marker = root / SOURCE_MARKER
+    if root.exists():
+        if not csv_path.exists():
+            return root
+        if marker.exists() and json.loads(marker.read_text()) == _csv_signature(csv_path):
+            return root
+    chunks = pd.read_csv(csv_path, usecols=['Date', 'Technology', 'Interest'], chunksize=CSV_CHUNK_ROWS)
+    return write_panel(chunks, root, source=_csv_signature(csv_path))
+
+
+def _write_marker(root, csv_path):
+    _replace(Path(root) / SOURCE_MARKER, lambda tmp: tmp.write_text(json.dumps(_csv_signature(csv_path))))
+
+
+def append_panel(rows, csv_path=PANEL_CSV):
+    # Add Date,Technology,Interest rows to the panel. Only the partitions the rows fall in
+    # are read and replaced (a new file is written, then the old ones removed). The CSV is
+    # appended first: if the run dies before the marker is updated, the next sync_panel
+    # sees a CSV it did not write and rebuilds from it.
+    csv_path = Path(csv_path)
+    root = panel_dir(csv_path)
+    marker = root / SOURCE_MARKER
+    in_sync = has_parquet() and csv_path.exists() and marker.exists() and \
+        json.loads(marker.read_text()) == _csv_signature(csv_path)
+    rows = rows[['Date', 'Technology', 'Interest']]
+    csv_path.parent.mkdir(parents=True, exist_ok=True)
+    rows.to_csv(csv_path, mode='a', header=not csv_path.exists(), index=False, date_format='%Y-%m-%d')
+    if not has_parquet():
+        return csv_path
+    if not in_sync:
+        return sync_panel(csv_path)
+
+    new = _typed_panel(rows)
+    touched = new[['Technology', 'Year']].astype({'Technology': str}).drop_duplicates()
+    old = read_panel(root, technologies=touched['Technology'].unique(), years=touched['Year'].unique())
+    old = old.astype({'Technology': str, 'Year': 'int16'}).merge(touched, on=['Technology', 'Year'])
+    both = pd.concat([old, new.astype({'Technology': str})], ignore_index=True)
+    both = both.drop_duplicates(['Technology', 'Date'], keep='last').sort_values(['Technology', 'Date'], kind='stable')
+    written = []
+    pq.write_to_dataset(pa.Table.from_pandas(both, preserve_index=False), root,
+                        partition_cols=['Technology', 'Year'], max_partitions=1 << 20,
+                        basename_template=f'part-{pd.Timestamp.now():%Y%m%d%H%M%S%f}-{os.getpid()}-{{i}}.parquet',
+                        existing_data_behavior='overwrite_or_ignore',
+                        file_visitor=lambda f: written.append(Path(f.path)))
+    for part in {f.parent for f in written}:
+        for f in part.glob('*.parquet'):
+            if f not in written:
+                f.unlink()
+    _write_marker(root, csv_path)
+    return root
+
+
+def load_panel(csv_path=PANEL_CSV, columns=None, technologies=None, years=None, start=None):
+    # Parquet when it is in sync with the CSV, otherwise parse the CSV once and cache it
+    csv_path = Path(csv_path)
+    if not has_parquet():
+        df = pd.read_csv(csv_path, parse_dates=['Date'])
+        df['Year'] = df['Date'].dt.year
+        if technologies:
+            df = df[df['Technology'].isin(list(technologies))]
+        if years:
+            df = df[df['Year'].isin([int(y) for y in years])]
+        if start:
+            df = df[df['Date'] >= pd.Timestamp(start)]
+        return df[columns] if columns else df
+
+    root = sync_panel(csv_path)
+    return read_panel(root, columns=columns, technologies=technologies, years=years, start=start)
+
+
+def safe_name(name):
+    # file-system safe and unique: the truncated name alone collides for long names
+    # sharing a 40-character prefix
+    safe = "".join(x if x.isalnum() else "_" for x in name)[:40]
+    return f"{safe}-{hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]}"
+
+
+def forecast_path(tech, out_dir=OUT_DIR):
+    # the per-technology copy of a forecast (<safe name>_arima_forecast.csv)
+    return Path(out_dir) / f"{safe_name(tech)}_arima_forecast.csv"
+
+
+def first_forecasts(out_dir=OUT_DIR):
+    # {technology: y_pred of its first forecast point} from <out>/arima_forecast_all.csv,
+    # keyed by the full technology name; empty when there is no forecast file
+    path = Path(out_dir) / FORECASTS_CSV
+    if not path.exists():
+        return {}
+    fc = pd.read_csv(path, usecols=['Technology', 'ds', 'y_pred'])
+    first = fc.sort_values('ds', kind='stable').drop_duplicates('Technology')
+    return dict(zip(first['Technology'].astype(str), first['y_pred'].astype(float)))
+
+
+def table_path(name, out_dir=OUT_DIR):
+    # The file load_table would read for `name`
+    out_dir = Path(out_dir)
+    pq_path = out_dir / f'{name}.parquet'
+    csv_path = out_dir / f'{name}.csv'
+    if has_parquet() and pq_path.exists():
+        if not csv_path.exists() or pq_path.stat().st_mtime >= csv_path.stat().st_mtime:
+            return pq_path
+    return csv_path
+
+
+def save_table(df, name, out_dir=OUT_DIR, csv=None):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    csv = name in POWERBI_TABLES if csv is None else csv
+    # CSV first so the Parquet copy is never older than its CSV export. Each file is
+    # written under a temporary name and renamed, so readers (forecast_server.py
+    # polls these) never see a half-written table.
+    if csv or not has_parquet():
+        _replace(out_dir / f'{name}.csv', lambda tmp: df.to_csv(tmp, index=False))
+    if has_parquet():
+        _replace(out_dir / f'{name}.parquet', lambda tmp: df.to_parquet(tmp, index=False))
+    return table_path(name, out_dir)
+
+
+def _replace(path, write):
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def load_table(name, columns=None, out_dir=OUT_DIR):
+    path = table_path(name, out_dir)
+    if path.suffix == '.parquet':
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
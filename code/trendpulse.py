@@ -0,0 +1,87 @@
+# trendpulse.py
+# One command for every stage: `trendpulse <stage> [stage options]`.
+# Only argparse and the standard library are imported up front; a stage's module (and with
+# it pandas, pmdarima, matplotlib, ...) is imported when that stage is run, so `--help`,
+# `list` and the light stages start in a fraction of the time. Everything after the stage
+# name is handed to the stage's own main(argv): `trendpulse arima --help` shows its options.
+# Stages read and write under data/ and outputs/ relative to --root (default: the current
+# directory). From Python, run(name, argv, root) does the same in-process, and each module
+# exposes its stage as a function (fill_missing_forecasts.fill_missing(panel_csv, out_dir),
+# arima_model.run_arima_batch(...), ...).
+#
+#   python code/trendpulse.py list
+#   python code/trendpulse.py --root /srv/trendpulse run --force      # the pipeline DAG
+#   python code/trendpulse.py arima --batch --input data/trends_processed.csv --out outputs
+#   python code/trendpulse.py insights
+
+import argparse
+import contextlib
+import importlib
+import os
+import sys
+
+STAGES = {
+    # name: (module, what it does)
+    'run': ('pipeline', 'Run the stages as a DAG, skipping what is unchanged'),
+    'collect': ('trends_collect_retry', 'Fetch new Google Trends points for the taxonomy'),
+    'preprocess': ('preprocessing', 'Feature table and holdout split'),
+    'arima': ('arima_model', 'ARIMA forecasts (one series or --batch)'),
+    'make_final': ('make_final_forecast_table_all_fix', 'Final forecast table from the ARIMA forecasts'),
+    'fill_missing': ('fill_missing_forecasts', 'Final table with linear fallbacks for missing forecasts'),
+    'simulate': ('growth_simulation', 'Growth and rank distributions under forecast uncertainty'),
+    'trend_strength': ('generate_trend_strength', 'Trend strength per technology'),
+    'yearly_ranking': ('generate_yearly_ranking', 'Average interest per year and technology'),
+    'sentiment': ('generate_sentiment', 'News sentiment per technology'),
+    'correlation': ('correlation', 'Lead/lag neighbours of every technology'),
+    'report': ('render_report', 'Chart report (outputs/report/index.html)'),
+    'breakouts': ('breakouts', 'Breakout alerts over the new points'),
+    'hierarchy': ('hierarchy', 'Reconciled category forecasts'),
+    'dashboard_master': ('generate_dashboard_master', 'Power BI master table'),
+    'view': ('dashboard_view', 'Incremental dashboard view and its Power BI partitions'),
+    'insights': ('generate_insights', 'Text insights (outputs/auto_insights.txt)'),
+    'backtest': ('backtest', 'Rolling-origin model comparison'),
+    'shard': ('shard_forecast', 'Forecasts sharded over workers and hosts (submit / work / reduce)'),
+    'queue': ('workqueue', 'Progress of the sharded jobs'),
+    'news': ('news_sentiment', 'Score a news feed into the sentiment tables'),
+    'rank': ('ranking_index', 'Show a leaderboard'),
+    'serve': ('forecast_server', 'Serve the forecasts over HTTP'),
+    'benchmark': ('benchmark', 'Synthetic-scale benchmark of the stages'),
+}
+
+
+def load(name):
+    # the stage's module, imported only now
+    return importlib.import_module(STAGES[name][0])
+
+
+def run(name, argv=(), root=None):
+    # Run one stage in this process, as `trendpulse --root <root> <name> <argv>` would
+    from instrument import finish_run
+    with contextlib.chdir(root) if root else contextlib.nullcontext():
+        try:
+            return load(name).main(list(argv))
+        finally:
+            finish_run()   # metrics go under this root, not wherever the process exits
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='trendpulse', formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='stages:\n' + '\n'.join(f'  {name:<18}{text}' for name, (_, text) in STAGES.items()))
+    parser.add_argument('--root', default=None, help='Project root containing data/ and outputs/')
+    parser.add_argument('stage', choices=['list'] + list(STAGES), metavar='stage',
+                        help="A stage, or 'list'")
+    parser.add_argument('args', nargs=argparse.REMAINDER, help="The stage's own options")
+    args = parser.parse_args(argv)
+    if args.stage == 'list':
+        for name, (module, text) in STAGES.items():
+            print(f"{name:<18}{module + '.py':<38}{text}")
+        return 0
+    if args.root:
+        os.chdir(args.root)
+    sys.argv = [f'trendpulse {args.stage}'] + args.args   # usage lines and the metrics' argv
+    return load(args.stage).main(args.args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
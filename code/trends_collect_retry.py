@@ -1,87 +1,103 @@
 # trends_collect_retry.py
-# Tries multiple timeframes/regions to get enough data for 5 technologies.
-# If a technology still has too-few rows, it fills the time series using simple interpolation
-# so forecasting can proceed. Saves combined CSV to data/trends_processed.csv
+# Tries multiple timeframes/regions to get enough data for the technologies of the
+# taxonomy (data/taxonomy.json, see hierarchy.py).
+# Gaps in a series are filled by interpolation at its own frequency (weekly points stay
+# weekly; the forecasters work at the native frequency, see features.infer_freq).
+# Appends new points to data/trends_processed.csv
+# (only the dates after what is already stored are fetched).
+# Keywords go 4 per payload next to ANCHOR, so every batch of a run is renormalised onto one
+# scale; --per-series fetches each keyword alone on its own 0-100 scale instead (full
+# resolution for keywords far below the anchor, at five times the requests).
+#
+#   python code/trends_collect_retry.py
+#   python code/trends_collect_retry.py --per-series --workers 2 --rate 0.25
 
-from pytrends.request import TrendReq
+import argparse
 import pandas as pd
 from pathlib import Path
-import time
 import numpy as np
 
+from features import infer_freq, native_index
+from hierarchy import TAXONOMY_PATH, technologies
+from instrument import start_run
+from trends_collector import CANDIDATE_SETTINGS, MAX_KEYWORDS_PER_PAYLOAD, Collector, PyTrendsBackend
+from storage import append_panel
+from trends_incremental import last_dates, update_panel
+
 OUT_PATH = Path('data/trends_processed.csv')
-TECHS = [
-    "Generative AI",
-    "Blockchain",
-    "Quantum Computing",
-    "Edge Computing",
-    "5G"
-]
-
-CANDIDATE_SETTINGS = [
-    {'timeframe': 'today 5-y', 'geo': ''},   # best: last 5 years worldwide
-    {'timeframe': 'today 5-y', 'geo': 'US'}, # try US if worldwide weak
-    {'timeframe': 'today 12-m', 'geo': 'US'},# fallback to last 12 months in US
-    {'timeframe': 'today 12-m', 'geo': ''},  # last 12 months worldwide
-]
-
-pytrends = TrendReq(hl='en-US', tz=360)
-SLEEP = 2.0
-
-all_dfs = []
-
-print("Retry collection for technologies:", TECHS)
-for tech in TECHS:
-    collected = None
-    for setting in CANDIDATE_SETTINGS:
-        tf = setting['timeframe']
-        geo = setting['geo']
-        try:
-            print(f"Trying {tech} with timeframe={tf} geo={geo}")
-            pytrends.build_payload([tech], timeframe=tf, geo=geo)
-            df = pytrends.interest_over_time()
-            time.sleep(SLEEP)
-            if df.empty:
-                print(" -> got empty, try next setting.")
-                continue
-            if 'isPartial' in df.columns:
-                df = df.drop(columns=['isPartial'])
-            df = df.reset_index().rename(columns={'date':'Date', tech:'Interest'})
-            df['Technology'] = tech
-            collected = df[['Date','Technology','Interest']].copy()
-            print(f" -> collected {len(collected)} rows with {tf} / geo={geo}")
-            break
-        except Exception as e:
-            print(f" -> error {e} ; trying next setting")
-            time.sleep(SLEEP)
-
-    if collected is None:
-        # nothing collected: create a synthetic sparse series (monthly zeros -> small noise)
-        print(f"⚠️ No raw data for {tech}. Creating fallback synthetic series.")
-        # create monthly dates for 3 years
-        dates = pd.date_range(end=pd.Timestamp.today(), periods=36, freq='M')
-        values = np.linspace(1.0, 3.0, len(dates)) + np.random.normal(0, 0.5, len(dates))
-        collected = pd.DataFrame({'Date': dates, 'Technology': tech, 'Interest': np.round(values,2)})
-    else:
-        # If collected has very few rows (<30), apply upsampling and interpolation to daily
-        if len(collected) < 60:
-            print(f"ℹ️ {tech} has only {len(collected)} rows, upsampling+interpolating to daily.")
-            collected['Date'] = pd.to_datetime(collected['Date'])
-            collected = collected.set_index('Date').resample('D').mean().interpolate(limit_direction='both')
-            collected = collected.reset_index().rename(columns={0:'Date', 'index':'Date'})
-            collected['Technology'] = tech
-            collected = collected.rename(columns={0:'Interest'}) if 'Interest' not in collected.columns else collected
-            # ensure column order
-            collected = collected[['Date','Technology','Interest']]
+
+WORKERS = 4
+RATE = 0.5        # requests/second shared by all workers (the old fixed 2s sleep, minus the idle time)
+BATCH_SIZE = MAX_KEYWORDS_PER_PAYLOAD
+ANCHOR = 'Cloud Computing'   # steady, mid-volume term; not a taxonomy technology, so never stored
+
+
+def densify(tech, collected):
+    # Interpolate missing points on the series' own grid (no upsampling to daily)
+    collected['Date'] = pd.to_datetime(collected['Date'])
+    interest = collected.drop_duplicates('Date').set_index('Date')['Interest'].sort_index()
+    freq = infer_freq(interest.index)
+    full_idx = native_index(interest.index.min(), interest.index.max(), freq=freq)
+    missing = full_idx.difference(interest.index)
+    if len(missing):
+        print(f"ℹ️ {tech} is missing {len(missing)} of {len(full_idx)} points ({freq}), interpolating.")
+        interest = interest.reindex(interest.index.union(full_idx)).interpolate(method='time', limit_direction='both')
+        collected = interest.rename_axis('Date').reset_index()
+        collected['Technology'] = tech
+        # ensure column order
+        collected = collected[['Date','Technology','Interest']]
 
     # final safety: ensure no NaNs
     collected['Interest'] = collected['Interest'].ffill().bfill().fillna(0)
-    all_dfs.append(collected)
+    print(f" -> collected {len(collected)} rows for {tech}")
+    return collected
+
+
+def synthetic_series(tech):
+    # nothing collected: create a synthetic sparse series (monthly zeros -> small noise)
+    print(f"⚠️ No raw data for {tech}. Creating fallback synthetic series.")
+    # create monthly dates for 3 years
+    dates = pd.date_range(end=pd.Timestamp.today(), periods=36, freq='ME')
+    values = np.linspace(1.0, 3.0, len(dates)) + np.random.normal(0, 0.5, len(dates))
+    return pd.DataFrame({'Date': dates, 'Technology': tech, 'Interest': np.round(values,2)})
+
+
+def collect(out_path=OUT_PATH, taxonomy=TAXONOMY_PATH, workers=WORKERS, rate=RATE, anchor=ANCHOR,
+            batch_size=BATCH_SIZE):
+    out_path = Path(out_path)
+    techs = technologies(taxonomy)
+    print("Retry collection for technologies:", techs)
+    collector = Collector(PyTrendsBackend(), workers=workers, rate=rate, settings=CANDIDATE_SETTINGS)
+
+    # Only the window after each series' last stored date is fetched and merged into the
+    # panel; every keyword is checkpointed as it arrives so an interrupted run resumes.
+    update_panel(techs, collector, out_path, batch_size=batch_size, prepare=densify, anchor=anchor)
+
+    # technologies that still have no data at all get the synthetic fallback
+    missing = [tech for tech in techs if tech not in last_dates(out_path).index]
+    if missing:
+        fallback = pd.concat([synthetic_series(tech) for tech in missing], ignore_index=True)
+        append_panel(fallback, out_path)
+    print(f"Saved trends to {out_path}")
+    return out_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', default=str(OUT_PATH))
+    parser.add_argument('--taxonomy', default=str(TAXONOMY_PATH))
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--rate', type=float, default=RATE, help='Requests per second across all workers')
+    parser.add_argument('--anchor', default=ANCHOR, help='Term added to every batch to tie their scales')
+    parser.add_argument('--per-series', action='store_true',
+                        help='One keyword per payload, no anchor: each series on its own 0-100 scale')
+    args = parser.parse_args(argv)
+    start_run('collect')
+    if args.per_series:
+        collect(args.out, args.taxonomy, args.workers, args.rate, anchor=None, batch_size=1)
+    else:
+        collect(args.out, args.taxonomy, args.workers, args.rate, anchor=args.anchor)
 
-# combine
-combined = pd.concat(all_dfs, axis=0, ignore_index=True)
-combined = combined.sort_values(['Technology','Date']).reset_index(drop=True)
 
-OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
-combined.to_csv(OUT_PATH, index=False)
-print(f"Saved combined trends to {OUT_PATH} (rows: {len(combined)})")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+# trends_collector.py
+# Concurrent Google Trends collector.
+#  - a bounded thread pool issues requests, all sharing one token-bucket rate limiter
+#  - failed requests back off exponentially with full jitter, then walk CANDIDATE_SETTINGS
+#  - keywords are batched up to 5 per payload (Google's limit); every batch carries the
+#    same anchor term so batches can be renormalised onto one common scale
+#  - the backend is pluggable: PyTrendsBackend talks to Google, ReplayBackend replays
+#    fixture files and HttpBackend talks to a local fake server for tests
+
+import argparse
+import io
+import random
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from instrument import count, observe, start_run
+
+MAX_KEYWORDS_PER_PAYLOAD = 5
+
+CANDIDATE_SETTINGS = [
+    {'timeframe': 'today 5-y', 'geo': ''},   # best: last 5 years worldwide
+    {'timeframe': 'today 5-y', 'geo': 'US'}, # try US if worldwide weak
+    {'timeframe': 'today 12-m', 'geo': 'US'},# fallback to last 12 months in US
+    {'timeframe': 'today 12-m', 'geo': ''},  # last 12 months worldwide
+]
+
+
+class TokenBucket:
+    # `rate` requests per second on average, bursts of up to `capacity`
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# --- backends ---------------------------------------------------------------
+# fetch(keywords, timeframe, geo) -> DataFrame indexed by date, one column per keyword
+# (same shape as pytrends interest_over_time() without isPartial). Raise on failure.
+
+class PyTrendsBackend:
+    def __init__(self, hl='en-US', tz=360):
+        self.hl = hl
+        self.tz = tz
+        self.local = threading.local()   # TrendReq holds a requests.Session: one per thread
+
+    def fetch(self, keywords, timeframe, geo):
+        if not hasattr(self.local, 'client'):
+            from pytrends.request import TrendReq
+            self.local.client = TrendReq(hl=self.hl, tz=self.tz)
+        client = self.local.client
+        client.build_payload(list(keywords), timeframe=timeframe, geo=geo)
+        df = client.interest_over_time()
+        if 'isPartial' in df.columns:
+            df = df.drop(columns=['isPartial'])
+        return df
+
+
+class ReplayBackend:
+    # Serves responses from fixture CSVs (date,<kw>,<kw>,...), one file per keyword
+    # or one wide file for all of them; keywords missing from the fixtures fail.
+    def __init__(self, fixtures):
+        fixtures = Path(fixtures)
+        files = sorted(fixtures.glob('*.csv')) if fixtures.is_dir() else [fixtures]
+        frames = [pd.read_csv(f, parse_dates=['date']).set_index('date') for f in files]
+        self.data = pd.concat(frames, axis=1).sort_index() if frames else pd.DataFrame()
+        self.calls = 0
+
+    def fetch(self, keywords, timeframe, geo):
+        self.calls += 1
+        missing = [k for k in keywords if k not in self.data.columns]
+        if missing:
+            raise KeyError(f"no fixture data for {missing}")
+        df = self.data[list(keywords)].dropna(how='all')
+        parts = timeframe.split()
+        if len(parts) == 2 and parts[0][:1].isdigit():
+            # explicit "YYYY-MM-DD YYYY-MM-DD" window
+            df = df.loc[parts[0]:parts[1]]
+        peak = df.max().max()
+        return (df * 100.0 / peak).round() if peak else df
+
+
+class HttpBackend:
+    # GET <base_url>/interest?keywords=a,b&timeframe=..&geo=.. -> CSV body (date,<kw>,...)
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def fetch(self, keywords, timeframe, geo):
+        query = urllib.parse.urlencode({'keywords': ','.join(keywords), 'timeframe': timeframe, 'geo': geo})
+        with urllib.request.urlopen(f"{self.base_url}/interest?{query}", timeout=self.timeout) as resp:
+            body = resp.read().decode('utf-8')
+        return pd.read_csv(io.StringIO(body), parse_dates=['date']).set_index('date')
+
+
+def make_fake_server(backend, port=0):
+    # Local stand-in for Google that HttpBackend can talk to, serving any backend
+    # (usually a ReplayBackend). Call serve_forever() on it, e.g. in a thread.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            q = urllib.parse.parse_qs(url.query, keep_blank_values=True)
+            try:
+                df = backend.fetch(q['keywords'][0].split(','), q.get('timeframe', [''])[0], q.get('geo', [''])[0])
+                body, status = df.rename_axis('date').to_csv().encode('utf-8'), 200
+            except Exception as e:
+                body, status = str(e).encode('utf-8'), 429 if 'rate' in str(e).lower() else 404
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/csv')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer(('127.0.0.1', port), Handler)
+
+
+# --- collector --------------------------------------------------------------
+
+def make_batches(keywords, anchor=None, size=MAX_KEYWORDS_PER_PAYLOAD):
+    # With an anchor every batch holds the anchor plus size-1 keywords
+    if anchor and size < 2:
+        raise ValueError("an anchor needs a batch size of at least 2")
+    keywords = [k for k in keywords if k != anchor]
+    step = size - 1 if anchor else size
+    batches = [keywords[i:i + step] for i in range(0, len(keywords), step)]
+    return [([anchor] + b if anchor else b) for b in batches]
+
+
+class Collector:
+    def __init__(self, backend, workers=4, rate=0.5, burst=1, max_retries=4,
+                 base_delay=2.0, max_delay=60.0, settings=None, sleep=time.sleep):
+        self.backend = backend
+        self.workers = workers
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.settings = settings or CANDIDATE_SETTINGS
+        self.sleep = sleep
+
+    def _call(self, keywords, timeframe, geo):
+        # one setting, with exponential backoff + full jitter between attempts
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            t0 = time.perf_counter()
+            try:
+                df = self.backend.fetch(keywords, timeframe, geo)
+                observe('fetch', time.perf_counter() - t0, status='ok')
+                return df
+            except Exception as e:
+                observe('fetch', time.perf_counter() - t0, status='error')
+                if attempt == self.max_retries:
+                    raise
+                count('retries')
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                print(f" -> {keywords} {timeframe}/{geo or 'world'}: {e}; retry in {delay:.1f}s")
+                self.sleep(delay)
+
+    def fetch_batch(self, keywords, settings=None):
+        # Walk the candidate settings until one returns data. Returns (frame, setting) or (None, None).
+        for setting in settings or self.settings:
+            try:
+                df = self._call(keywords, setting['timeframe'], setting['geo'])
+            except Exception as e:
+                print(f" -> {keywords} failed with {setting}: {e}; trying next setting")
+                continue
+            if df is not None and not df.empty:
+                return df, setting
+        return None, None
+
+    def collect(self, keywords, anchor=None, batch_size=MAX_KEYWORDS_PER_PAYLOAD,
+                settings=None, on_result=None, keep=True):
+        # Returns the long Date,Technology,Interest frame. on_result(keyword, frame, setting)
+        # is called as soon as each keyword's series is available (frame and setting None on
+        # failure); with keep=False frames are only handed to on_result, not accumulated.
+        batches = make_batches(keywords, anchor, batch_size)
+        wanted = set(keywords)
+        results = {}
+        reference = {}
+
+        def handle(batch, df, setting):
+            if df is not None and anchor:
+                df = renormalise(df, anchor, reference, setting)
+            for kw in batch:
+                if kw not in wanted or kw in results:
+                    continue   # the anchor itself, or already taken from an earlier batch
+                frame = None
+                if df is not None and kw in df.columns:
+                    frame = (df[kw].astype(float).rename('Interest').rename_axis('Date').reset_index()
+                             .assign(Technology=kw)[['Date', 'Technology', 'Interest']])
+                results[kw] = frame if keep else None
+                if on_result is not None:
+                    on_result(kw, frame, setting if frame is not None else None)
+
+        if anchor and batches:
+            # the first batch fixes the reference scale, so fetch it before fanning out
+            handle(batches[0], *self.fetch_batch(batches[0], settings))
+            batches = batches[1:]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.fetch_batch, batch, settings): batch for batch in batches}
+            for fut in as_completed(futures):
+                handle(futures[fut], *fut.result())
+        frames = [f for f in results.values() if f is not None]
+        if not frames:
+            return pd.DataFrame(columns=['Date', 'Technology', 'Interest'])
+        return pd.concat(frames, ignore_index=True).sort_values(['Technology', 'Date']).reset_index(drop=True)
+
+
+def renormalise(df, anchor, reference, setting):
+    # Google scales every payload to its own max (=100). Put all batches fetched with the
+    # same setting on the scale of the first one by matching the anchor's level.
+    key = (setting['timeframe'], setting['geo'])
+    level = float(df[anchor].mean())
+    if key not in reference:
+        reference[key] = level
+        return df
+    if level <= 0:
+        return df
+    return df * (reference[key] / level)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--keywords', nargs='+', required=True)
+    parser.add_argument('--out', default='data/trends_processed.csv')
+    parser.add_argument('--anchor', default=None, help='Anchor term added to every batch of 5')
+    parser.add_argument('--batch-size', type=int, default=MAX_KEYWORDS_PER_PAYLOAD)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=0.5, help='Requests per second across all workers')
+    parser.add_argument('--replay', default=None, help='Replay fixture CSV file/dir instead of Google')
+    parser.add_argument('--server', default=None, help='Base URL of a local fake Trends server')
+    args = parser.parse_args(argv)
+    start_run('collect')
+
+    if args.replay:
+        backend = ReplayBackend(args.replay)
+    elif args.server:
+        backend = HttpBackend(args.server)
+    else:
+        backend = PyTrendsBackend()
+    collector = Collector(backend, workers=args.workers, rate=args.rate)
+    t0 = time.perf_counter()
+    combined = collector.collect(args.keywords, anchor=args.anchor, batch_size=args.batch_size)
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    combined.to_csv(out, index=False)
+    print(f"Saved {combined['Technology'].nunique()} series ({len(combined)} rows) to {out} "
+          f"in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
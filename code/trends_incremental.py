@@ -0,0 +1,230 @@
+# trends_incremental.py
+# Incremental, checkpointed collection into data/trends_processed.csv.
+#  - every keyword's result is written to data/checkpoints/ as soon as it arrives, so a
+#    crashed run resumes where it stopped instead of starting over
+#  - keywords already in the panel only fetch the window after their last stored date
+#    (plus OVERLAP_DAYS of history used to measure Google's rescaling of the new window)
+#  - deltas are rescaled onto the stored series and appended to the panel
+#    (storage.append_panel: only the Technology/Year partitions they fall in are rewritten)
+#  - the setting a series was first collected with (which CANDIDATE_SETTINGS entry gave
+#    data: worldwide, or the US fallback) is kept in data/trends_processed_settings.json and
+#    its deltas are fetched with the same geo, so they come from the same population.
+#    Series collected before the file existed count as worldwide
+#  - with an anchor, every payload carries it and batches are renormalised onto the first
+#    one (trends_collector.renormalise); the overlap rescale above puts the result back on
+#    each stored series' own scale, so switching between anchored and per-series payloads
+#    needs no re-collection
+
+import argparse
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from instrument import count, start_run
+from storage import PANEL_CSV, append_panel, load_panel, safe_name
+from trends_collector import CANDIDATE_SETTINGS, MAX_KEYWORDS_PER_PAYLOAD, Collector, PyTrendsBackend, ReplayBackend
+
+CHECKPOINT_DIR = Path('data/checkpoints')
+OVERLAP_DAYS = 56        # stored weeks re-fetched to estimate the rescaling factor
+MIN_WINDOW_DAYS = 270    # Google returns daily points for windows shorter than ~9 months
+MIN_OVERLAP_POINTS = 3
+MANIFEST = 'manifest.jsonl'
+
+
+class Checkpoints:
+    def __init__(self, root=CHECKPOINT_DIR):
+        self.root = Path(root)
+
+    def path(self, keyword):
+        return self.root / (safe_name(keyword) + '.csv')
+
+    def records(self):
+        # {keyword: manifest record} for the results already on disk
+        manifest = self.root / MANIFEST
+        if not manifest.exists():
+            return {}
+        done = {}
+        with open(manifest) as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue   # torn last line from a crash
+                if (self.root / rec['file']).exists():
+                    done[rec['keyword']] = rec
+        return done
+
+    def done(self):
+        # keywords whose result is already on disk
+        return {kw: self.root / rec['file'] for kw, rec in self.records().items()}
+
+    def save(self, keyword, frame, setting=None):
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.path(keyword)
+        tmp = path.with_suffix('.csv.tmp')
+        frame.to_csv(tmp, index=False)
+        os.replace(tmp, path)
+        manifest = self.root / MANIFEST
+        torn = False
+        if manifest.exists() and manifest.stat().st_size:
+            with open(manifest, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+        with open(manifest, 'a') as f:
+            if torn:
+                f.write('\n')   # a crash cut the last record short: start a fresh line
+            f.write(json.dumps({'keyword': keyword, 'file': path.name, 'rows': len(frame),
+                                'setting': setting}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load_all(self):
+        files = list(self.done().values())
+        if not files:
+            return pd.DataFrame(columns=['Date', 'Technology', 'Interest'])
+        return pd.concat([pd.read_csv(f, parse_dates=['Date']) for f in files], ignore_index=True)
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def settings_path(panel_csv=PANEL_CSV):
+    panel_csv = Path(panel_csv)
+    return panel_csv.with_name(panel_csv.stem + '_settings.json')
+
+
+def load_settings(panel_csv=PANEL_CSV):
+    # {keyword: {'timeframe', 'geo'}} each series was first collected with
+    path = settings_path(panel_csv)
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def save_settings(settings, panel_csv=PANEL_CSV):
+    path = settings_path(panel_csv)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.json.tmp')
+    tmp.write_text(json.dumps(settings, indent=1, sort_keys=True))
+    os.replace(tmp, path)
+
+
+def last_dates(panel_csv=PANEL_CSV):
+    if not Path(panel_csv).exists():
+        return pd.Series(dtype='datetime64[ns]')
+    panel = load_panel(panel_csv, columns=['Technology', 'Date'])
+    last = panel.groupby('Technology', observed=True)['Date'].max()
+    last.index = last.index.astype(str)
+    return last
+
+
+def fetch_windows(keywords, last, today, settings=None):
+    # {(window start, geo): [keywords]}; (None, None) for keywords without history (full
+    # CANDIDATE_SETTINGS walk). A delta uses the geo its series was collected with
+    settings = settings or {}
+    windows = {}
+    for kw in keywords:
+        key = (None, None)
+        if kw in last.index:
+            start = min(last[kw] - pd.Timedelta(days=OVERLAP_DAYS), today - pd.Timedelta(days=MIN_WINDOW_DAYS))
+            key = (start.normalize(), settings.get(kw, {}).get('geo', ''))
+        windows.setdefault(key, []).append(kw)
+    return windows
+
+
+def merge_delta(stored, delta, last):
+    # Rows of `delta` to append to the panel. For series with history, the delta window
+    # is rescaled by mean(stored)/mean(delta) over the dates both cover, and only dates
+    # after the last stored one are kept.
+    delta = delta.copy()
+    delta['Technology'] = delta['Technology'].astype(str)
+    if len(stored):
+        stored = stored[['Technology', 'Date', 'Interest']].copy()
+        stored['Technology'] = stored['Technology'].astype(str)
+        both = delta.merge(stored, on=['Technology', 'Date'], suffixes=('', '_stored'))
+        g = both.groupby('Technology')
+        scale = g['Interest_stored'].sum() / g['Interest'].sum()
+        scale = scale.where((g.size() >= MIN_OVERLAP_POINTS) & np.isfinite(scale) & (scale > 0))
+        delta['Interest'] = delta['Interest'] * delta['Technology'].map(scale).fillna(1.0)
+    cutoff = pd.to_datetime(delta['Technology'].map(last.to_dict()))
+    new = delta[cutoff.isna() | (delta['Date'] > cutoff)].copy()
+    new['Interest'] = new['Interest'].round(2)
+    return new.sort_values(['Technology', 'Date'])[['Date', 'Technology', 'Interest']]
+
+
+def update_panel(keywords, collector, panel_csv=PANEL_CSV, checkpoint_dir=CHECKPOINT_DIR,
+                 batch_size=MAX_KEYWORDS_PER_PAYLOAD, today=None, prepare=None, anchor=None):
+    # Fetch what is missing for `keywords`, append it to the panel and return the new rows.
+    # prepare(keyword, frame) may post-process series that have no stored history yet.
+    panel_csv = Path(panel_csv)
+    today = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+    ckpt = Checkpoints(checkpoint_dir)
+    done = ckpt.done()
+    todo = [k for k in keywords if k not in done]
+    if done:
+        print(f"Resuming: {len(done)} keywords already checkpointed, {len(todo)} to fetch")
+
+    last = last_dates(panel_csv)
+    collected_with = load_settings(panel_csv)
+
+    def on_result(kw, frame, setting):
+        if frame is None:
+            if kw in last.index:
+                geo = collected_with.get(kw, {}).get('geo', '')
+                count('series', status='no_delta')
+                print(f" -> no new data for {kw} ({geo or 'world'}): series not updated this run")
+            else:
+                print(f" -> no data for {kw}")
+            return
+        if prepare is not None and kw not in last.index:
+            frame = prepare(kw, frame)
+        ckpt.save(kw, frame, setting)
+
+    for (start, geo), group in fetch_windows(todo, last, today, collected_with).items():
+        if start is None:
+            settings = CANDIDATE_SETTINGS
+        else:
+            settings = [{'timeframe': f"{start:%Y-%m-%d} {today:%Y-%m-%d}", 'geo': geo}]
+        collector.collect(group, anchor=anchor, batch_size=batch_size, settings=settings, on_result=on_result,
+                          keep=False)
+
+    delta = ckpt.load_all()
+    stored = pd.DataFrame(columns=['Date', 'Technology', 'Interest'])
+    if len(delta) and panel_csv.exists():
+        stored = load_panel(panel_csv, columns=['Date', 'Technology', 'Interest'], start=delta['Date'].min())
+    new_rows = merge_delta(stored, delta, last) if len(delta) else delta
+
+    if len(new_rows):
+        append_panel(new_rows, panel_csv)
+    # the setting of each new series, for its later deltas
+    new_settings = {kw: rec['setting'] for kw, rec in ckpt.records().items()
+                    if kw not in last.index and kw not in collected_with and rec.get('setting')}
+    if new_settings:
+        save_settings({**collected_with, **new_settings}, panel_csv)
+    # the panel now holds the new rows, so a rerun would filter them out again
+    ckpt.clear()
+    print(f"Appended {len(new_rows)} new rows for {new_rows['Technology'].nunique()} series to {panel_csv}")
+    return new_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--keywords', nargs='+', required=True)
+    parser.add_argument('--panel', default=str(PANEL_CSV))
+    parser.add_argument('--checkpoints', default=str(CHECKPOINT_DIR))
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=0.5)
+    parser.add_argument('--batch-size', type=int, default=MAX_KEYWORDS_PER_PAYLOAD)
+    parser.add_argument('--anchor', default=None, help='Anchor term added to every batch')
+    parser.add_argument('--replay', default=None, help='Replay fixture CSV file/dir instead of Google')
+    args = parser.parse_args(argv)
+    start_run('collect')
+    backend = ReplayBackend(args.replay) if args.replay else PyTrendsBackend()
+    update_panel(args.keywords, Collector(backend, workers=args.workers, rate=args.rate),
+                 args.panel, args.checkpoints, batch_size=args.batch_size, anchor=args.anchor)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+# workqueue.py
+# Durable work queue in one SQLite file, for spreading a job over processes and hosts that
+# share a directory (no server to run):
+#   jobs   job id, its parameters (JSON), when it was submitted
+#   units  (job, unit) -> payload (JSON), status pending / leased / done / failed, owner,
+#          lease_until, attempts, last error
+#  - claim() takes the oldest claimable unit inside BEGIN IMMEDIATE, so two workers can
+#    never lease the same unit; a unit is claimable when pending or when its lease ran out
+#    (its worker died or hung). A unit whose lease ran out MAX_ATTEMPTS times is failed
+#  - the worker renews its lease with heartbeat() while it works (Heartbeat does this from a
+#    thread every lease/3 seconds); heartbeat() returns False once the lease was lost
+#  - complete() only counts when the caller still holds the lease; the `publish` callback
+#    (e.g. moving the unit's result into place) runs inside the same transaction
+#  - submit() is idempotent: resubmitting a job only adds the units it does not have yet
+# The database uses the rollback journal, not WAL: WAL needs shared memory, which hosts
+# sharing the directory over NFS/SMB do not have. Lease times compare the hosts' clocks, so
+# keep them in sync (NTP) and leases well above the expected skew.
+#
+#   python code/workqueue.py outputs/queue/queue.db            # status of every job
+#   python code/workqueue.py outputs/queue/queue.db --retry J  # requeue the failed units of J
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 3
+BUSY_TIMEOUT = 60     # seconds to wait for another host's write lock
+STATUSES = ['pending', 'leased', 'done', 'failed']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (job TEXT PRIMARY KEY, params TEXT NOT NULL, submitted REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS units (
+    job TEXT NOT NULL, unit TEXT NOT NULL, payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending', owner TEXT, lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0, error TEXT, updated REAL,
+    PRIMARY KEY (job, unit));
+CREATE INDEX IF NOT EXISTS units_status ON units (status, lease_until);
+"""
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    def __init__(self, path, lease=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._local = threading.local()   # one connection per thread (Heartbeat has its own)
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            db.execute('PRAGMA journal_mode=DELETE')
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front: read-then-update is atomic
+        db = self._connect()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def submit(self, job, units, params=None):
+        # units: {unit id: payload}. Returns the number of units added
+        now = time.time()
+        with self._transaction() as db:
+            db.execute('INSERT OR IGNORE INTO jobs VALUES (?, ?, ?)', (job, json.dumps(params or {}), now))
+            before = db.execute('SELECT COUNT(*) FROM units WHERE job = ?', (job,)).fetchone()[0]
+            db.executemany('INSERT OR IGNORE INTO units (job, unit, payload, updated) VALUES (?, ?, ?, ?)',
+                           [(job, unit, json.dumps(payload), now) for unit, payload in units.items()])
+            return db.execute('SELECT COUNT(*) FROM units WHERE job = ?', (job,)).fetchone()[0] - before
+
+    def params(self, job):
+        row = self._connect().execute('SELECT params FROM jobs WHERE job = ?', (job,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def claim(self, worker, job=None):
+        # -> (job, unit, payload, attempt) or None when nothing is claimable right now
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("UPDATE units SET status = 'failed', owner = NULL, updated = ?, "
+                       "error = COALESCE(error, 'lease expired') "
+                       "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                       (now, now, self.max_attempts))
+            row = db.execute("SELECT job, unit, payload, attempts FROM units "
+                             "WHERE (status = 'pending' OR (status = 'leased' AND lease_until < ?)) "
+                             "AND (? IS NULL OR job = ?) ORDER BY attempts, job, unit LIMIT 1",
+                             (now, job, job)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE units SET status = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1, "
+                       "updated = ? WHERE job = ? AND unit = ?", (worker, now + self.lease, now, row[0], row[1]))
+        return row[0], row[1], json.loads(row[2]), row[3] + 1
+
+    def heartbeat(self, job, unit, worker):
+        now = time.time()
+        with self._transaction() as db:
+            cur = db.execute("UPDATE units SET lease_until = ?, updated = ? "
+                             "WHERE job = ? AND unit = ? AND owner = ? AND status = 'leased'",
+                             (now + self.lease, now, job, unit, worker))
+            return cur.rowcount == 1
+
+    def complete(self, job, unit, worker, publish=None):
+        # False (and publish is not called) when the lease went to another worker meanwhile
+        with self._transaction() as db:
+            row = db.execute('SELECT status, owner FROM units WHERE job = ? AND unit = ?', (job, unit)).fetchone()
+            if row != ('leased', worker):
+                return False
+            if publish is not None:
+                publish()
+            db.execute("UPDATE units SET status = 'done', lease_until = NULL, error = NULL, updated = ? "
+                       "WHERE job = ? AND unit = ?", (time.time(), job, unit))
+            return True
+
+    def fail(self, job, unit, worker, error):
+        # Back to pending for another attempt, or failed after max_attempts
+        with self._transaction() as db:
+            db.execute("UPDATE units SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                       "owner = NULL, lease_until = NULL, error = ?, updated = ? "
+                       "WHERE job = ? AND unit = ? AND owner = ? AND status = 'leased'",
+                       (self.max_attempts, str(error)[:2000], time.time(), job, unit, worker))
+
+    def retry(self, job):
+        # Requeue the failed units of a job with a fresh attempt budget
+        with self._transaction() as db:
+            return db.execute("UPDATE units SET status = 'pending', attempts = 0, updated = ? "
+                              "WHERE job = ? AND status = 'failed'", (time.time(), job)).rowcount
+
+    def status(self, job):
+        # {status: count}, with every status present; an expired lease counts as what the
+        # next claim() turns it into (pending, or failed when out of attempts)
+        now = time.time()
+        rows = self._connect().execute(
+            "SELECT CASE WHEN status = 'leased' AND lease_until < ? "
+            "THEN CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END ELSE status END, COUNT(*) "
+            "FROM units WHERE job = ? GROUP BY 1", (now, self.max_attempts, job)).fetchall()
+        return {**dict.fromkeys(STATUSES, 0), **dict(rows)}
+
+    def units(self, job):
+        rows = self._connect().execute(
+            'SELECT unit, status, owner, attempts, error, updated, payload FROM units WHERE job = ? ORDER BY unit',
+            (job,)).fetchall()
+        return [dict(zip(['unit', 'status', 'owner', 'attempts', 'error', 'updated'], r), payload=json.loads(r[6]))
+                for r in rows]
+
+    def jobs(self):
+        return [r[0] for r in self._connect().execute('SELECT job FROM jobs ORDER BY submitted')]
+
+    def finished(self, job):
+        counts = self.status(job)
+        return counts['pending'] == 0 and counts['leased'] == 0
+
+
+class Heartbeat:
+    # Renews a lease from a background thread while the unit runs:
+    #   with Heartbeat(queue, job, unit, worker) as hb: ... ; hb.lost tells if it was taken
+    def __init__(self, queue, job, unit, worker):
+        self.queue, self.job, self.unit, self.worker = queue, job, unit, worker
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.queue.lease / 3):
+            try:
+                if not self.queue.heartbeat(self.job, self.unit, self.worker):
+                    self.lost = True
+                    return
+            except sqlite3.OperationalError:
+                pass   # database busy for longer than BUSY_TIMEOUT: try again next beat
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('db', help='Queue database, e.g. outputs/queue/queue.db')
+    parser.add_argument('--job', default=None, help='Show the units of this job')
+    parser.add_argument('--retry', default=None, metavar='JOB', help='Requeue the failed units of a job')
+    args = parser.parse_args(argv)
+    queue = WorkQueue(args.db)
+    if args.retry:
+        print(f"Requeued {queue.retry(args.retry)} failed units of {args.retry}")
+    for job in [args.job] if args.job else queue.jobs():
+        counts = queue.status(job)
+        print(f"{job}: " + ', '.join(f"{counts[s]} {s}" for s in STATUSES))
+        if args.job:
+            for u in queue.units(job):
+                print(f"  {u['unit']:<24}{u['status']:<9}{u['attempts']:>3}  {u['owner'] or '':<28}{u['error'] or ''}")
+
+
+if __name__ == '__main__':
+    main()
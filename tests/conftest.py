@@ -0,0 +1,46 @@
+# conftest.py
+# The scripts in code/ import each other as top-level modules and default to paths relative
+# to the project root (outputs/, data/): put code/ on sys.path and run every test in its own
+# temporary directory, so nothing is written into the real outputs.
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'code'))
+
+
+@pytest.fixture(autouse=True)
+def in_tmp(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('TRENDPULSE_METRICS_DIR', str(tmp_path / 'metrics'))
+    return tmp_path
+
+
+def weekly_panel(techs, weeks, start='2022-01-02', seed=0):
+    # long Date,Technology,Interest frame of random walks on Google's 0..100 scale
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=weeks, freq='W-SUN')
+    frames = []
+    for i, tech in enumerate(techs):
+        y = np.clip(40 + np.cumsum(rng.normal(0, 3, weeks)), 1, 100).round()
+        frames.append(pd.DataFrame({'Date': dates, 'Technology': tech, 'Interest': y}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_panel(df, path, append=False):
+    df.to_csv(path, mode='a' if append else 'w', header=not append, index=False, date_format='%Y-%m-%d')
+    return path
+
+
+def split_panel(path, techs, weeks=80, new=6):
+    # writes all but the last `new` weeks to `path`; returns those weeks, to append later
+    panel = weekly_panel(techs, weeks)
+    # a clear level shift late in the history, so there is something to detect
+    dates = panel['Date'].unique()
+    panel.loc[(panel['Technology'] == techs[3]) & (panel['Date'] >= dates[weeks - 10]), 'Interest'] += 40
+    cut = dates[weeks - new] if new else dates[-1] + pd.Timedelta(days=1)
+    write_panel(panel[panel['Date'] < cut], path)
+    return panel[panel['Date'] >= cut].sort_values(['Date', 'Technology'])
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+import breakouts
+from conftest import split_panel, write_panel
+
+TECHS = [f'Tech {i}' for i in range(8)]
+
+
+def test_update_matches_rebuild(tmp_path):
+    path = tmp_path / 'panel.csv'
+    tail = split_panel(path, TECHS)
+    first = breakouts.run_breakouts(path, tmp_path / 'out_inc', tmp_path / 'inc')
+    write_panel(tail, path, append=True)
+    second = breakouts.run_breakouts(path, tmp_path / 'out_inc', tmp_path / 'inc')
+    full = breakouts.run_breakouts(path, tmp_path / 'out_full', tmp_path / 'full', reset=True)
+
+    assert len(full) and len(second)
+    pd.testing.assert_frame_equal(pd.concat([first, second], ignore_index=True), full.reset_index(drop=True))
+    inc_state, full_state = breakouts.load_state(tmp_path / 'inc'), breakouts.load_state(tmp_path / 'full')
+    for name in breakouts.STATE_ARRAYS:
+        np.testing.assert_allclose(inc_state[name], full_state[name], err_msg=name)
+    assert len(breakouts.load_table('breakout_alerts', out_dir=tmp_path / 'out_inc')) == len(full)
+
+
+def test_level_shift_raises_a_breakout(tmp_path):
+    path = tmp_path / 'panel.csv'
+    split_panel(path, TECHS, new=0)
+    alerts = breakouts.run_breakouts(path, tmp_path / 'out', tmp_path / 'state')
+    assert 'breakout' in set(alerts.loc[alerts['Technology'] == 'Tech 3', 'Alert'])
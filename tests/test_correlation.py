@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+import correlation
+from conftest import split_panel, write_panel
+
+TECHS = [f'Tech {i}' for i in range(8)]
+
+
+def test_update_matches_rebuild(tmp_path):
+    path = tmp_path / 'panel.csv'
+    tail = split_panel(path, TECHS)
+    correlation.update_index(path, tmp_path / 'inc')
+    write_panel(tail, path, append=True)
+    inc = correlation.update_index(path, tmp_path / 'inc')
+    assert inc['since_rebuild'] == tail['Date'].nunique()
+    full = correlation.update_index(path, tmp_path / 'full', rebuild=True)
+
+    assert inc['n'] == full['n']
+    np.testing.assert_allclose(inc['s1'], full['s1'])
+    np.testing.assert_allclose(inc['s2'], full['s2'])
+    a, b = correlation.neighbours(inc), correlation.neighbours(full)
+    cols = ['Technology', 'Rank', 'Neighbour', 'Lag']
+    pd.testing.assert_frame_equal(a[cols], b[cols])
+    np.testing.assert_allclose(a['Correlation'], b['Correlation'], atol=1e-3)
+
+
+def test_lagged_copy_is_found_at_its_lag(tmp_path):
+    rng = np.random.default_rng(3)
+    dates = pd.date_range('2022-01-02', periods=60, freq='W-SUN')
+    lead = 50 + np.cumsum(rng.normal(0, 4, 62))
+    rows = [pd.DataFrame({'Date': dates, 'Technology': 'Lead', 'Interest': lead[2:]}),
+            pd.DataFrame({'Date': dates, 'Technology': 'Follow', 'Interest': lead[:-2]})]
+    rows += [pd.DataFrame({'Date': dates, 'Technology': f'Noise {i}', 'Interest': 50 + rng.normal(0, 4, 60)})
+             for i in range(3)]
+    path = write_panel(pd.concat(rows, ignore_index=True), tmp_path / 'panel.csv')
+    top = correlation.neighbours(correlation.update_index(path, tmp_path / 'idx'))
+    best = top[(top['Technology'] == 'Lead') & (top['Rank'] == 1)].iloc[0]
+    assert best['Neighbour'] == 'Follow' and best['Lag'] == 2 and best['Correlation'] > 0.9
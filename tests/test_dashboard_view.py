@@ -0,0 +1,65 @@
+import pandas as pd
+
+from dashboard_view import KEY, STAMP, DashboardView, read_manifest
+from generate_dashboard_master import build_dashboard_master
+from storage import load_table, save_table
+
+TECHS = ['A', 'B', 'C', 'D']
+
+
+def sources(growth=None, strength=None, techs=TECHS):
+    growth = growth or {}
+    strength = strength or {}
+    return {'final': pd.DataFrame({'Technology': techs, 'Growth_Percent': [growth.get(t, 1.0) for t in techs]}),
+            'trend_strength': pd.DataFrame({'Technology': techs[::-1],
+                                            'Trend_Strength': [strength.get(t, 2.0) for t in techs[::-1]]})}
+
+
+def test_upsert_touches_only_changed_ids():
+    view = DashboardView()
+    upserts, removed, rebuilt = view.apply(sources(), 'day1')
+    assert rebuilt and len(upserts) == len(TECHS) and removed.empty
+    ids = dict(view.ids)
+
+    # nothing changed: nothing upserted, the view is not even re-versioned
+    version = view.version
+    upserts, removed, rebuilt = view.apply(sources(), 'day2')
+    assert not rebuilt and len(upserts) == 0 and view.version == version
+
+    # one value in a joined (non-base) source
+    upserts, removed, _ = view.apply(sources(strength={'C': 9.0}), 'day3')
+    assert list(upserts) == [ids['C']] and removed.empty
+    rows = view.table().set_index('Technology')
+    assert rows.loc['C', STAMP] == 'day3' and rows.loc['C', 'Trend_Strength'] == 9.0
+    assert (rows.drop(index='C')[STAMP] == 'day1').all()
+
+    # B disappears, E appears: E gets a new id, B's is never handed out again
+    techs = ['A', 'C', 'D', 'E']
+    upserts, removed, _ = view.apply(sources(strength={'C': 9.0}, techs=techs), 'day4')
+    assert list(upserts) == [5] and list(removed.index) == [ids['B']]
+    assert view.ids['E'] == 5 and view.ids['B'] == ids['B']
+    assert sorted(view.table()['Technology']) == techs
+
+
+def test_build_writes_the_full_join_and_a_change_log(tmp_path):
+    out = tmp_path / 'out'
+    save_table(pd.DataFrame({'Technology': TECHS, 'Growth_Percent': [1.0, 2.0, 3.0, 4.0]}),
+               'final_forecast_table_all_complete', out)
+    save_table(pd.DataFrame({'Technology': TECHS, 'News_Sentiment': 'Neutral'}), 'news_sentiment', out)
+    save_table(pd.DataFrame({'Technology': TECHS[:3], 'Trend_Strength': [5.0, 6.0, 7.0]}), 'trend_strength', out)
+    save_table(pd.DataFrame({'Year': 2024, 'Technology': TECHS, 'Avg_Interest': [10.0, 20.0, 30.0, 40.0]}),
+               'tech_yearly_ranking', out)
+    first = build_dashboard_master(out)
+    assert list(first['Technology']) == TECHS and pd.isna(first.set_index('Technology').loc['D', 'Trend_Strength'])
+    version = read_manifest(out)['version']
+
+    save_table(pd.DataFrame({'Technology': TECHS[:3], 'Trend_Strength': [5.0, 6.5, 7.0]}), 'trend_strength', out)
+    second = build_dashboard_master(out)
+    assert second.set_index('Technology').loc['B', 'Trend_Strength'] == 6.5
+    pd.testing.assert_frame_equal(second.drop(columns=[STAMP]), load_table('dashboard_master', out_dir=out)
+                                  .drop(columns=[STAMP]), check_dtype=False)
+    manifest = read_manifest(out)
+    assert manifest['version'] == version + 1 and manifest['rows'] == len(TECHS)
+    (day,) = manifest['partitions']
+    part = pd.read_csv(out / 'dashboard_master_parts' / f'{day}.csv')
+    assert sorted(part[KEY]) == [1, 2, 3, 4] and (part['Change'] == 'upsert').all()
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from arima_model import load_panel_series, run_arima_batch
+from conftest import weekly_panel, write_panel
+from fast_forecast import (fast_tier, holt_forecast, naive_forecast, seasonal_naive_forecast, select_models,
+                           trend_forecast)
+
+
+def test_naive_repeats_the_last_value_with_widening_intervals():
+    Y = np.array([[1.0, 3.0, 2.0, 4.0, 5.0]])
+    point, lower, upper = naive_forecast(Y, 4)
+    np.testing.assert_array_equal(point, [[5.0] * 4])
+    width = (upper - lower)[0]
+    np.testing.assert_allclose(width / width[0], np.sqrt([1, 2, 3, 4]))
+
+
+def test_seasonal_naive_repeats_the_last_season():
+    Y = np.tile([1.0, 5.0, 9.0], 3)[None, :]
+    point, lower, upper = seasonal_naive_forecast(Y, 5, season=3)
+    np.testing.assert_array_equal(point, [[1.0, 5.0, 9.0, 1.0, 5.0]])
+    np.testing.assert_allclose(lower, point)
+    assert np.isnan(seasonal_naive_forecast(Y[:, :3], 2, season=3)[0]).all()
+
+
+def test_trend_extrapolates_a_line_with_left_padding():
+    Y = np.array([[np.nan, np.nan] + [1.0 + 2.0 * x for x in range(10)]])
+    point, lower, upper = trend_forecast(Y, 3, window=12)
+    np.testing.assert_allclose(point, [[21.0, 23.0, 25.0]])
+    np.testing.assert_allclose(upper - lower, 0.0, atol=1e-9)
+
+
+def test_holt_on_a_constant_series_stays_constant():
+    point, _, _ = holt_forecast(np.full((2, 30), 7.0), 5)
+    np.testing.assert_allclose(point, 7.0)
+
+
+def test_select_models_picks_the_generating_model():
+    x = np.arange(104, dtype=float)
+    rng = np.random.default_rng(0)
+    Y = np.vstack([10 + 0.5 * x,                                   # line
+                   50 + 20 * np.sin(2 * np.pi * x / 52),           # pure season
+                   50 + rng.normal(0, 30, len(x))])                # noise
+    names, rmse, scaled, need_arima = select_models(Y, 4, season=52)
+    assert names[0] == 'trend' and names[1] == 'seasonal_naive'
+    assert rmse[0] < 1e-6 and rmse[1] < 1e-6
+    assert list(need_arima) == [False, False, True]
+
+
+def test_tiers_forecast_from_the_same_origin(tmp_path):
+    panel = weekly_panel([f'Tech {i}' for i in range(4)], 110)
+    # one flat series the cheap tier keeps; the others are noise that goes on to ARIMA
+    rng = np.random.default_rng(1)
+    panel['Interest'] = np.clip(30 + rng.normal(0, 15, len(panel)), 0, 100).round()
+    panel.loc[panel['Technology'] == 'Tech 0', 'Interest'] = 50.0
+    path = write_panel(panel, tmp_path / 'panel.csv')
+    series = load_panel_series(path)
+    selection, fast = fast_tier(series, periods=28, horizon=14)
+    assert 'Tech 0' in fast
+
+    report = run_arima_batch(path, tmp_path / 'out', periods=28, workers=1, tiered=True)
+    last = panel['Date'].max()
+    assert set(report['Mode'].str.startswith('fast')) == {True, False}
+    assert (pd.to_datetime(report['Origin']) == last).all()
+    fc = pd.read_csv(tmp_path / 'out' / 'arima_forecast_all.csv', parse_dates=['ds'])
+    first = fc.groupby('Technology')['ds'].min()
+    assert (first == last + pd.Timedelta(days=7)).all()
+    assert fc.groupby('Technology').size().eq(4).all()
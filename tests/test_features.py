@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from features import REGRESSION_WINDOW, summarize_series
+
+LENGTHS = {'Short': 4, 'Mid': 10, 'Long': 150, 'Flat': 30}
+
+
+def panel(seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for tech, n in LENGTHS.items():
+        y = np.full(n, 25.0) if tech == 'Flat' else 40 + np.cumsum(rng.normal(0, 3, n))
+        frames.append(pd.DataFrame({'Date': pd.date_range('2023-01-01', periods=n, freq='W-SUN'),
+                                    'Technology': tech, 'Interest': y.round(1)}))
+    # shuffled, as summarize_series must not depend on the input order
+    return pd.concat(frames, ignore_index=True).sample(frac=1, random_state=seed)
+
+
+def baseline(t):
+    # the per-technology loop the feature module replaced
+    y = t['Interest'].to_numpy()
+    s = t['Interest']
+    slope = np.polyfit(np.arange(len(y)), y, 1)[0] if len(y) >= 5 else 0.0
+    stability = 1 / (s.rolling(14).std().mean() + 1) if len(s) >= 14 else 1 / (s.std() + 1)
+    last = y[-REGRESSION_WINDOW:]
+    fit = np.polyfit(np.arange(len(last)), last, 1)
+    return {'Last_Value': y[-1], 'Slope': slope, 'Stability': stability,
+            'Volatility': s.rolling(7).std().dropna().iloc[-1] if len(s) >= 7 else s.std(),
+            'MA7': s.rolling(7, min_periods=1).mean().iloc[-1], 'MA30': s.rolling(30, min_periods=1).mean().iloc[-1],
+            'Pct_Change': s.pct_change().fillna(0).iloc[-1],
+            'Linear_Forecast': np.polyval(fit, len(last) + 1),
+            'Trend_Strength': slope * 10 + stability * 50}
+
+
+def test_matches_per_technology_formulas():
+    df = panel()
+    got = summarize_series(df)
+    for tech, t in df.groupby('Technology'):
+        t = t.sort_values('Date')
+        assert got.loc[tech, 'N'] == len(t)
+        for col, value in baseline(t).items():
+            np.testing.assert_allclose(got.loc[tech, col], value, rtol=1e-9, atol=1e-9, err_msg=f'{tech} {col}')
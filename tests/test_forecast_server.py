@@ -0,0 +1,37 @@
+import json
+
+import pandas as pd
+import pytest
+
+from forecast_server import ForecastService
+from storage import save_table
+
+
+@pytest.fixture
+def service(tmp_path):
+    save_table(pd.DataFrame({'Technology': ['A', 'B', 'C'], 'Growth_Percent': [5.0, 1.0, 3.0]}),
+               'final_forecast_table_all', tmp_path, csv=True)
+    save_table(pd.DataFrame({'Year': [2024] * 3, 'Technology': ['A', 'B', 'C'], 'Avg_Interest': [10.0, 30.0, 20.0]}),
+               'tech_yearly_ranking', tmp_path, csv=True)
+    return ForecastService(tmp_path)
+
+
+def get(service, target):
+    status, body = service.handle(target)
+    return status, json.loads(body)
+
+
+def test_top_and_yearly(service):
+    status, payload = get(service, '/top?n=2')
+    assert status == 200
+    assert [r['Technology'] for r in payload['rows']] == ['A', 'C']
+    status, payload = get(service, '/rankings/yearly?year=2024&n=1')
+    assert status == 200 and [r['Technology'] for r in payload['rows']] == ['B']
+
+
+@pytest.mark.parametrize('target', ['/top?n=ten', '/top?n=0', '/top?n=-3',
+                                    '/rankings/yearly?year=last', '/rankings/yearly?n=0'])
+def test_bad_query_values_are_400(service, target):
+    status, payload = get(service, target)
+    assert status == 400
+    assert 'error' in payload
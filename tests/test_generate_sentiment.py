@@ -0,0 +1,30 @@
+import json
+
+import storage
+import trendpulse
+from conftest import weekly_panel, write_panel
+
+HEADLINES = [
+    {'date': '2024-03-04', 'title': 'Blockchain adoption soars with great new wins'},
+    {'date': '2024-03-04', 'title': 'Blockchain exchange hit by terrible fraud scandal'},
+    {'date': '2024-03-05', 'title': 'Quantum Computing breakthrough praised as excellent'},
+]
+
+
+def test_sentiment_reads_input_and_writes_out(tmp_path):
+    panel = tmp_path / 'in' / 'panel.csv'
+    panel.parent.mkdir()
+    write_panel(weekly_panel(['Blockchain', 'Quantum Computing', 'Edge AI'], 20), panel)
+    news = tmp_path / 'news'
+    news.mkdir()
+    (news / 'day.jsonl').write_text('\n'.join(json.dumps(h) for h in HEADLINES) + '\n')
+
+    trendpulse.main(['sentiment', '--input', str(panel), '--news', str(news), '--out', str(tmp_path / 'out')])
+
+    assert not (tmp_path / 'outputs').exists()
+    sent = storage.load_table('news_sentiment', out_dir=tmp_path / 'out').set_index('Technology')
+    assert sorted(sent.index) == ['Blockchain', 'Edge AI', 'Quantum Computing']
+    assert sent.loc['Blockchain', 'Headlines'] == 2
+    assert sent.loc['Quantum Computing', 'News_Sentiment'] == 'Positive'
+    assert sent.loc['Edge AI', 'Headlines'] == 0
+    assert storage.table_path('news_sentiment_weekly', tmp_path / 'out').exists()
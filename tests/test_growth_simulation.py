@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import growth_simulation as gs
+
+N, S = 40, 3000
+
+
+def inputs(seed=1):
+    rng = np.random.default_rng(seed)
+    current = rng.uniform(5, 80, N)
+    current[3] = 0                      # undefined growth: always ranked last
+    mu = current * rng.uniform(0.7, 1.5, N)
+    sigma = rng.uniform(0, 10, N)
+    return current, mu, sigma
+
+
+def reference(current, mu, sigma, top_k, seed):
+    # every draw and rank kept in memory, as the simulation did before the accumulators
+    y = np.maximum(np.random.default_rng(seed).standard_normal((S, N)) * sigma + mu, 0.0)
+    g = gs.growth(y, current)
+    order = np.argsort(-np.nan_to_num(g, nan=-np.inf), axis=1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, N + 1)[None, :].repeat(S, 0), axis=1)
+    rows = [int(np.floor(q * (S - 1))) for q in gs.QUANTILES]
+    return g, ranks, np.sort(ranks, axis=0)[rows]
+
+
+@pytest.mark.parametrize('memory_bytes', [gs.MEMORY_BYTES, 200_000])
+def test_accumulators_match_full_draws(memory_bytes):
+    current, mu, sigma = inputs()
+    total, exceed, rank_sum, top, hist, width = gs.simulate(current, mu, sigma, S, [0.0, 10.0], 5, 7,
+                                                            memory_bytes=memory_bytes)
+    assert width == 1
+    g, ranks, quantiles = reference(current, mu, sigma, 5, 7)
+    np.testing.assert_allclose(total, g.sum(axis=0))
+    np.testing.assert_array_equal(exceed[1], (g > 10.0).sum(axis=0))
+    np.testing.assert_array_equal(rank_sum, ranks.sum(axis=0))
+    np.testing.assert_array_equal(top, (ranks <= 5).sum(axis=0))
+    np.testing.assert_array_equal(hist.sum(axis=1), S)
+    np.testing.assert_array_equal(gs.rank_quantiles(hist, width), quantiles)
+    assert (ranks[:, 3] == N).all()
+
+
+def test_coarse_histogram_brackets_the_quantiles():
+    current, mu, sigma = inputs()
+    *_, hist, width = gs.simulate(current, mu, sigma, S, seed=7, memory_bytes=N * 8 * 4 * 10)
+    assert width == 4 and hist.shape == (N, 10)
+    _, _, exact = reference(current, mu, sigma, gs.TOP_K, 7)
+    lo = gs.rank_quantiles(hist, width)
+    assert ((lo <= exact) & (exact < lo + width)).all()
+
+
+def test_zero_sigma_is_the_point_ranking():
+    current, mu, _ = inputs()
+    *_, rank_sum, top, hist, width = gs.simulate(current, mu, np.zeros(N), 50, top_k=3)
+    expected = np.empty(N, dtype=int)
+    expected[np.argsort(-np.nan_to_num(gs.growth(mu, current), nan=-np.inf))] = np.arange(1, N + 1)
+    np.testing.assert_array_equal(rank_sum, expected * 50)
+    np.testing.assert_array_equal(gs.rank_quantiles(hist, width), [expected, expected])
+    np.testing.assert_array_equal(top, np.where(expected <= 3, 50, 0))
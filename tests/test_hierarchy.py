@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+import pytest
+
+import hierarchy
+from conftest import weekly_panel, write_panel
+from storage import load_table
+
+TAXONOMY = {'AI': ['GenAI', 'LLM'], 'Computing': {'Quantum': ['Qubits'], 'Edge': ['5G', 'IoT']}}
+TECHS = ['GenAI', 'LLM', 'Qubits', '5G', 'IoT']
+
+
+@pytest.fixture
+def taxonomy(tmp_path):
+    path = tmp_path / 'taxonomy.json'
+    path.write_text(json.dumps(TAXONOMY))
+    return path
+
+
+def test_summing_matrix_covers_every_depth(taxonomy):
+    categories, parent, techs = hierarchy.load_taxonomy(taxonomy)
+    assert categories == [hierarchy.TOTAL, 'AI', 'Computing', 'Quantum', 'Edge']
+    A = hierarchy.summing_matrix(categories, parent, techs + ['Stray']).toarray()
+    rows = dict(zip(categories, A))
+    assert rows[hierarchy.TOTAL].tolist() == [1, 1, 1, 1, 1, 1]
+    assert rows['Computing'].tolist() == [0, 0, 1, 1, 1, 0]
+    assert rows['Edge'].tolist() == [0, 0, 0, 1, 1, 0]
+
+
+@pytest.mark.parametrize('method', hierarchy.METHODS)
+def test_reconciled_forecasts_add_up(taxonomy, method):
+    categories, parent, techs = hierarchy.load_taxonomy(taxonomy)
+    A = hierarchy.summing_matrix(categories, parent, techs)
+    rng = np.random.default_rng(0)
+    tech = rng.uniform(10, 50, (len(techs), 6))
+    cat = A @ tech + rng.normal(0, 5, (len(categories), 6))   # incoherent base forecasts
+    w_cat, w_tech = rng.uniform(1, 4, len(categories)), rng.uniform(1, 4, len(techs))
+    r_cat, r_tech = hierarchy.reconcile(A, cat, tech, w_cat, w_tech, method)
+    np.testing.assert_allclose(r_cat, A @ r_tech, atol=1e-9)
+    # forecasts that already add up are left alone
+    coherent = hierarchy.reconcile(A, A @ tech, tech, w_cat, w_tech, method)
+    np.testing.assert_allclose(coherent[1], tech, atol=1e-9)
+
+
+def test_mint_with_untrusted_categories_is_bottom_up(taxonomy):
+    categories, parent, techs = hierarchy.load_taxonomy(taxonomy)
+    A = hierarchy.summing_matrix(categories, parent, techs)
+    tech = np.arange(len(techs) * 3, dtype=float).reshape(len(techs), 3)
+    cat = np.zeros((len(categories), 3))
+    r_cat, r_tech = hierarchy.reconcile(A, cat, tech, np.full(len(categories), 1e12), np.ones(len(techs)))
+    np.testing.assert_allclose(r_tech, tech, atol=1e-4)
+
+
+def test_run_hierarchy_writes_coherent_tables(tmp_path, taxonomy):
+    panel = write_panel(weekly_panel(TECHS + ['Stray'], 140), tmp_path / 'panel.csv')
+    summary = hierarchy.run_hierarchy(panel, taxonomy, periods=56, out_dir=tmp_path / 'out')
+    fc = load_table('hierarchy_forecast', out_dir=tmp_path / 'out')
+    wide = fc.pivot(index='ds', columns='Technology', values='y_pred')
+    assert len(wide) == 8   # periods are days: 8 weeks
+    np.testing.assert_allclose(wide['Edge'], wide['5G'] + wide['IoT'], atol=0.01)
+    np.testing.assert_allclose(wide['Computing'], wide['Qubits'] + wide['Edge'], atol=0.01)
+    # technologies outside the taxonomy still count towards the total
+    np.testing.assert_allclose(wide[hierarchy.TOTAL], wide[TECHS + ['Stray']].sum(axis=1), atol=0.01)
+    assert summary.set_index('Category').loc['Edge', 'Technologies'] == 2
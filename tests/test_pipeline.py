@@ -0,0 +1,17 @@
+import pipeline
+
+
+def test_local_imports_follow_indirect_imports():
+    # hierarchy.py pulls in fast_forecast/features/shared_panel; stages that only import
+    # hierarchy must still be rehashed when those change
+    for script in ['trends_collect_retry.py', 'fill_missing_forecasts.py']:
+        code = pipeline.local_imports(script)
+        assert script in code
+        assert {'hierarchy.py', 'fast_forecast.py', 'features.py', 'shared_panel.py', 'storage.py'} <= set(code)
+    # third-party and stdlib imports are not files of code/
+    assert all((pipeline.CODE_DIR / name).is_file() for name in pipeline.local_imports('arima_model.py'))
+
+
+def test_every_stage_script_resolves():
+    for stage in pipeline.STAGES:
+        assert stage['cmd'][0] in pipeline.local_imports(stage['cmd'][0])
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from conftest import split_panel, weekly_panel, write_panel
+from ranking_index import Leaderboard, YearlyIndex
+
+TECHS = [f'Tech {i}' for i in range(8)]
+
+
+def test_leaderboard_lazy_updates():
+    board = Leaderboard('growth')
+    board.update({'A': 1.0, 'B': 5.0, 'C': 3.0})
+    board.update({'B': 0.5})
+    board.remove(['C'])
+    assert [t for t, _ in board.top(3)] == ['A', 'B']
+    stable = Leaderboard('volatility', descending=False)
+    stable.update({'A': 2.0, 'B': 1.0})
+    assert [t for t, _ in stable.top(1)] == ['B']
+
+
+def test_yearly_update_matches_rebuild(tmp_path):
+    path = tmp_path / 'panel.csv'
+    tail = split_panel(path, TECHS, weeks=120, new=20)
+    inc = YearlyIndex()
+    inc.update_from_panel(path)
+    write_panel(tail, path, append=True)
+    assert inc.update_from_panel(path) == len(tail)
+    full = YearlyIndex()
+    full.update_from_panel(path)
+    pd.testing.assert_frame_equal(inc.table(), full.table())
+
+    expected = pd.read_csv(path, parse_dates=['Date']).assign(Year=lambda d: d['Date'].dt.year) \
+        .groupby(['Year', 'Technology'])['Interest'].mean()
+    got = full.table().set_index(['Year', 'Technology'])['Avg_Interest']
+    pd.testing.assert_series_equal(got.sort_index(), expected.sort_index(), check_names=False,
+                                   check_index_type=False)
+
+
+def test_rewritten_panel_rebuilds(tmp_path):
+    path = write_panel(weekly_panel(TECHS, 30), tmp_path / 'panel.csv')
+    index = YearlyIndex()
+    index.update_from_panel(path)
+    write_panel(weekly_panel(TECHS[:2], 30, seed=1), path)
+    index.update_from_panel(path)
+    assert {t for _, t in index.sums} == set(TECHS[:2])
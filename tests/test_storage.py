@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+import storage
+from conftest import split_panel, weekly_panel, write_panel
+
+pytestmark = pytest.mark.skipif(not storage.has_parquet(), reason='needs pyarrow')
+
+TECHS = ['AI/ML', 'Edge Computing', 'C++ & Rust', '5G']
+
+
+def files(root):
+    return {p.relative_to(root): p.stat().st_mtime_ns for p in root.rglob('*.parquet')}
+
+
+def test_round_trip_matches_the_csv(tmp_path):
+    path = write_panel(weekly_panel(TECHS, 120), tmp_path / 'panel.csv')
+    got = storage.load_panel(path, columns=['Date', 'Technology', 'Interest'])
+    want = pd.read_csv(path, parse_dates=['Date']).sort_values(['Technology', 'Date'], kind='stable')
+    pd.testing.assert_frame_equal(got.astype({'Technology': str}).reset_index(drop=True),
+                                  want.reset_index(drop=True), check_dtype=False)
+    # technology names survive the partition directory names
+    assert storage.panel_technologies(storage.panel_dir(path)) == sorted(TECHS)
+
+
+def test_reads_are_pruned(tmp_path):
+    path = write_panel(weekly_panel(TECHS, 120, start='2022-01-02'), tmp_path / 'panel.csv')
+    df = storage.load_panel(path, columns=['Date', 'Interest'], technologies=['C++ & Rust'], years=[2023])
+    assert list(df.columns) == ['Date', 'Interest']
+    assert len(df) == 53 and (df['Date'].dt.year == 2023).all()
+    df = storage.load_panel(path, technologies=['5G'], start='2024-01-01')
+    assert set(df['Technology']) == {'5G'} and df['Date'].min() >= pd.Timestamp('2024-01-01')
+
+
+def test_append_rewrites_only_the_touched_partitions(tmp_path, monkeypatch):
+    path = tmp_path / 'panel.csv'
+    tail = split_panel(path, TECHS, weeks=120, new=3)
+    root = storage.sync_panel(path)
+    before = files(root)
+    # the appended weeks are all in the last year, for two of the technologies
+    rows = tail[tail['Technology'].isin(TECHS[:2])]
+    year = rows['Date'].dt.year.max()
+    assert (rows['Date'].dt.year == year).all()
+
+    monkeypatch.setattr(storage, 'write_panel', lambda *a, **k: pytest.fail('panel rebuilt'))
+    storage.append_panel(rows, path)
+    after = files(root)
+    changed = {f.parent for f in set(before) ^ set(after)}
+    assert changed == {p.parent for p in before if p.parts[-2] == f'Year={year}'
+                       and any(p.parts[0] == f'Technology={t}' for t in ['AI%2FML', 'Edge%20Computing'])}
+    assert all(after[f] == before[f] for f in after if f.parent not in changed)
+
+    # the dataset and the CSV export hold the same rows, and the next read does not rebuild
+    got = storage.load_panel(path, columns=['Date', 'Technology', 'Interest']).astype({'Technology': str})
+    csv = pd.read_csv(path, parse_dates=['Date']).sort_values(['Technology', 'Date'], kind='stable')
+    pd.testing.assert_frame_equal(got, csv.reset_index(drop=True), check_dtype=False)
+
+
+def test_csv_edited_outside_append_panel_is_converted(tmp_path):
+    path = tmp_path / 'panel.csv'
+    tail = split_panel(path, TECHS, weeks=60, new=2)
+    storage.sync_panel(path)
+    write_panel(tail.iloc[:3], path, append=True)    # not through append_panel
+    storage.append_panel(tail.iloc[3:], path)
+    assert len(storage.load_panel(path)) == 60 * len(TECHS)
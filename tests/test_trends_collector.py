@@ -0,0 +1,74 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from trends_collector import Collector, HttpBackend, ReplayBackend, make_batches, make_fake_server
+
+
+@pytest.fixture
+def fixtures(tmp_path):
+    dates = pd.date_range('2024-01-07', periods=60, freq='W-SUN')
+    wide = pd.DataFrame({'date': dates, 'A': np.arange(60) % 40 + 10, 'B': 70 - np.arange(60) % 30,
+                         'C': np.full(60, 25)})
+    wide.to_csv(tmp_path / 'fixtures.csv', index=False)
+    return tmp_path / 'fixtures.csv'
+
+
+def collector(backend, **kw):
+    return Collector(backend, workers=2, rate=1000, burst=10, max_retries=1, sleep=lambda s: None, **kw)
+
+
+def test_make_batches_with_anchor():
+    batches = make_batches(['a', 'b', 'c', 'd', 'e', 'f'], anchor='x', size=3)
+    assert batches == [['x', 'a', 'b'], ['x', 'c', 'd'], ['x', 'e', 'f']]
+    with pytest.raises(ValueError):
+        make_batches(['a'], anchor='x', size=1)
+
+
+def test_collect_replay(fixtures):
+    backend = ReplayBackend(fixtures)
+    got = collector(backend).collect(['A', 'B', 'C'], batch_size=2)
+    assert list(got.columns) == ['Date', 'Technology', 'Interest']
+    assert got.groupby('Technology').size().to_dict() == {'A': 60, 'B': 60, 'C': 60}
+    assert backend.calls == 2
+
+
+def test_missing_keyword_walks_settings_and_reports_none(fixtures):
+    backend = ReplayBackend(fixtures)
+    seen = {}
+    got = collector(backend).collect(['A', 'Nope'], batch_size=1,
+                                     on_result=lambda kw, frame, setting: seen.update({kw: (frame, setting)}))
+    assert set(got['Technology']) == {'A'}
+    assert seen['Nope'] == (None, None)
+    assert seen['A'][1] == {'timeframe': 'today 5-y', 'geo': ''}
+    # 1 call for A; Nope: 2 attempts for each of the 4 candidate settings
+    assert backend.calls == 1 + 2 * 4
+
+
+def test_anchor_puts_batches_on_one_scale(fixtures):
+    got = collector(ReplayBackend(fixtures)).collect(['A', 'B', 'C'], anchor='C', batch_size=2)
+    # each payload is scaled to its own peak; the anchor C is constant, so after
+    # renormalisation A and B keep their raw ratio
+    wide = got.pivot(index='Date', columns='Technology', values='Interest')
+    raw = pd.read_csv(fixtures, parse_dates=['date']).set_index('date')
+    ratio = (wide['A'] / wide['B']).to_numpy()
+    np.testing.assert_allclose(ratio, (raw['A'] / raw['B']).to_numpy(), rtol=0.05)
+
+
+def test_http_backend_matches_replay(fixtures):
+    replay = ReplayBackend(fixtures)
+    server = make_fake_server(replay)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        http = HttpBackend(f"http://127.0.0.1:{server.server_address[1]}")
+        over_http = collector(http).collect(['A', 'B'], batch_size=2)
+        missing = collector(http).collect(['Nope'])
+    finally:
+        server.shutdown()
+        server.server_close()
+    direct = collector(ReplayBackend(fixtures)).collect(['A', 'B'], batch_size=2)
+    pd.testing.assert_frame_equal(over_http, direct, check_dtype=False)
+    assert missing.empty
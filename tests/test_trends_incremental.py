@@ -0,0 +1,125 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import write_panel
+from trends_collector import Collector, ReplayBackend
+from trends_incremental import Checkpoints, fetch_windows, last_dates, load_settings, update_panel
+
+DATES = pd.date_range('2024-01-07', periods=100, freq='W-SUN')
+STORED = 80   # weeks already in the panel
+
+
+class RecordingBackend(ReplayBackend):
+    # remembers every request; keywords in `weak` have no worldwide data
+    def __init__(self, fixtures, weak=()):
+        super().__init__(fixtures)
+        self.requests = []
+        self.weak = set(weak)
+
+    def fetch(self, keywords, timeframe, geo):
+        self.requests.append((tuple(keywords), timeframe, geo))
+        if geo == '' and self.weak & set(keywords):
+            raise KeyError('not enough worldwide volume')
+        return super().fetch(keywords, timeframe, geo)
+
+
+@pytest.fixture
+def fixtures(tmp_path):
+    # the peak (100) falls in the last weeks, so a delta window comes back unscaled
+    a = np.linspace(20, 100, len(DATES)).round()
+    b = (50 + 30 * np.sin(np.arange(len(DATES)) / 5)).round()
+    b[-1] = 100
+    pd.DataFrame({'date': DATES, 'A': a, 'B': b}).to_csv(tmp_path / 'fixtures.csv', index=False)
+    return tmp_path / 'fixtures.csv'
+
+
+def collector(backend):
+    return Collector(backend, workers=1, rate=1000, burst=10, max_retries=0, sleep=lambda s: None)
+
+
+def stored_panel(fixtures, path, scale=0.5):
+    # the first STORED weeks, on a different scale than Google returns them today
+    raw = pd.read_csv(fixtures, parse_dates=['date']).iloc[:STORED]
+    long = raw.melt(id_vars='date', var_name='Technology', value_name='Interest').rename(columns={'date': 'Date'})
+    return write_panel(long.assign(Interest=long['Interest'] * scale), path)
+
+
+def test_fetch_windows_groups_by_start_and_geo():
+    last = pd.Series(pd.to_datetime(['2025-01-05', '2025-01-05']), index=['A', 'B'])
+    today = pd.Timestamp('2025-03-01')
+    windows = fetch_windows(['A', 'B', 'C'], last, today, {'B': {'timeframe': 'today 5-y', 'geo': 'US'}})
+    start = (today - pd.Timedelta(days=270)).normalize()
+    assert windows == {(start, ''): ['A'], (start, 'US'): ['B'], (None, None): ['C']}
+
+
+def test_delta_is_rescaled_onto_stored_series(fixtures, tmp_path):
+    panel = stored_panel(fixtures, tmp_path / 'panel.csv')
+    backend = RecordingBackend(fixtures)
+    new = update_panel(['A', 'B'], collector(backend), panel, tmp_path / 'ck', today=DATES[-1])
+
+    assert [(r[0], r[2]) for r in backend.requests] == [(('A', 'B'), '')]
+    assert all(r[1].endswith(f'{DATES[-1]:%Y-%m-%d}') for r in backend.requests)
+    assert new.groupby('Technology').size().to_dict() == {'A': 20, 'B': 20}
+    raw = pd.read_csv(fixtures, parse_dates=['date']).set_index('date').iloc[STORED:]
+    got = new.pivot(index='Date', columns='Technology', values='Interest')
+    np.testing.assert_allclose(got['A'], raw['A'] * 0.5, atol=0.01)
+    np.testing.assert_allclose(got['B'], raw['B'] * 0.5, atol=0.01)
+    assert last_dates(panel).eq(DATES[-1]).all()
+    assert not (tmp_path / 'ck').exists()
+
+
+def test_resume_skips_checkpointed_keywords(fixtures, tmp_path):
+    panel = stored_panel(fixtures, tmp_path / 'panel.csv')
+    # a crashed run left A's delta behind
+    raw = pd.read_csv(fixtures, parse_dates=['date'])
+    done = raw.loc[STORED - 10:, ['date', 'A']].rename(columns={'date': 'Date', 'A': 'Interest'})
+    Checkpoints(tmp_path / 'ck').save('A', done.assign(Technology='A')[['Date', 'Technology', 'Interest']],
+                                      {'timeframe': 'x', 'geo': ''})
+    with open(tmp_path / 'ck' / 'manifest.jsonl', 'a') as f:
+        f.write('{"keyword": "B", "fi')   # torn line from the crash
+    backend = RecordingBackend(fixtures)
+    new = update_panel(['A', 'B'], collector(backend), panel, tmp_path / 'ck', today=DATES[-1])
+
+    assert [r[0] for r in backend.requests] == [('B',)]
+    assert new.groupby('Technology').size().to_dict() == {'A': 20, 'B': 20}
+    full = pd.read_csv(panel)
+    assert not full.duplicated(['Technology', 'Date']).any()
+    # a second run has nothing left to append
+    assert update_panel(['A', 'B'], collector(backend), panel, tmp_path / 'ck', today=DATES[-1]).empty
+
+
+def test_new_series_keep_their_fallback_geo(fixtures, tmp_path):
+    panel = tmp_path / 'panel.csv'
+    backend = RecordingBackend(fixtures, weak={'B'})
+    update_panel(['A', 'B'], collector(backend), panel, tmp_path / 'ck', batch_size=1, today=DATES[STORED])
+    settings = load_settings(panel)
+    assert settings['A']['geo'] == '' and settings['B']['geo'] == 'US'
+    assert json.loads((tmp_path / 'panel_settings.json').read_text()) == settings
+
+    backend.requests.clear()
+    update_panel(['A', 'B'], collector(backend), panel, tmp_path / 'ck', batch_size=1, today=DATES[-1])
+    geos = {r[0][0]: r[2] for r in backend.requests}
+    assert geos == {'A': '', 'B': 'US'}
+
+
+def test_anchored_batches_share_one_scale(tmp_path):
+    # six keywords need two payloads; the anchor ties the second one to the first
+    rng = np.random.default_rng(0)
+    raw = pd.DataFrame({k: rng.uniform(5, 60, len(DATES)).round() for k in 'CDEFGH'}, index=DATES)
+    raw['Anchor'] = 80.0
+    raw.rename_axis('date').reset_index().to_csv(tmp_path / 'fixtures.csv', index=False)
+    panel = tmp_path / 'panel.csv'
+    backend = RecordingBackend(tmp_path / 'fixtures.csv')
+    new = update_panel(list('CDEFGH'), collector(backend), panel, tmp_path / 'ck', today=DATES[-1],
+                       anchor='Anchor')
+
+    assert all(r[0][0] == 'Anchor' and len(r[0]) <= 5 for r in backend.requests)
+    assert len(backend.requests) == 2
+    assert 'Anchor' not in set(new['Technology'])
+    got = new.pivot(index='Date', columns='Technology', values='Interest')
+    # one common factor across both payloads (up to Google-style rounding of each payload)
+    ratio = (got / raw[got.columns]).stack()
+    assert ratio.std() / ratio.mean() < 0.03
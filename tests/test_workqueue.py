@@ -0,0 +1,59 @@
+import time
+
+from workqueue import Heartbeat, WorkQueue
+
+LEASE = 0.2
+
+
+def queue(tmp_path, **kw):
+    return WorkQueue(tmp_path / 'queue.db', lease=LEASE, **kw)
+
+
+def test_claim_complete(tmp_path):
+    q = queue(tmp_path)
+    assert q.submit('job', {'u1': {'techs': ['A']}, 'u2': {'techs': ['B']}}) == 2
+    assert q.submit('job', {'u1': {'techs': ['A']}}) == 0
+    job, unit, payload, attempt = q.claim('w1')
+    assert (job, unit, payload, attempt) == ('job', 'u1', {'techs': ['A']}, 1)
+    assert q.complete('job', 'u1', 'w1')
+    assert q.status('job')['done'] == 1 and not q.finished('job')
+
+
+def test_expired_lease_is_reclaimed_and_late_complete_refused(tmp_path):
+    q = queue(tmp_path)
+    q.submit('job', {'u1': {}})
+    assert q.claim('w1')[1] == 'u1'
+    assert q.claim('w2') is None          # still leased to w1
+    time.sleep(LEASE * 1.5)
+    assert q.status('job')['pending'] == 1
+    _, unit, _, attempt = q.claim('w2')
+    assert (unit, attempt) == ('u1', 2)
+
+    published = []
+    assert not q.heartbeat('job', 'u1', 'w1')
+    assert not q.complete('job', 'u1', 'w1', publish=lambda: published.append('w1'))
+    assert q.complete('job', 'u1', 'w2', publish=lambda: published.append('w2'))
+    assert published == ['w2']
+    assert q.units('job')[0]['owner'] == 'w2' and q.finished('job')
+
+
+def test_expired_lease_out_of_attempts_fails(tmp_path):
+    q = queue(tmp_path, max_attempts=1)
+    q.submit('job', {'u1': {}})
+    q.claim('w1')
+    time.sleep(LEASE * 1.5)
+    assert q.claim('w2') is None
+    unit = q.units('job')[0]
+    assert unit['status'] == 'failed' and unit['error'] == 'lease expired'
+    assert q.retry('job') == 1 and q.claim('w2')[1] == 'u1'
+
+
+def test_heartbeat_keeps_the_lease(tmp_path):
+    q = queue(tmp_path)
+    q.submit('job', {'u1': {}})
+    q.claim('w1')
+    with Heartbeat(q, 'job', 'u1', 'w1') as hb:
+        time.sleep(LEASE * 3)
+        assert q.claim('w2') is None
+    assert not hb.lost
+    assert q.complete('job', 'u1', 'w1')